@@ -29,6 +29,33 @@ This script reads the Zot upstream configuration from ONE of two sources
 The script then scans the dist/ directory for any string that starts with
 "oci.chezmoi.sh/" and reports prefixes that have no matching Zot destination.
 
+Only manifest files (see SCAN_SUFFIXES) are scanned. Each one is
+memory-mapped and searched with a bytes regex, without decoding it, and files
+are spread across a pool of worker processes when there are enough of them.
+
+With --cache, the prefixes found in each file are kept in a JSON file, keyed
+by the file's path, size and mtime (--cache-key stat), or by its git blob hash
+(--cache-key git, which survives fresh checkouts in CI). Only files without a
+cache entry are scanned again.
+
+IMAGE INDEX
+-----------
+With --index-db, every oci.chezmoi.sh reference is recorded in a SQLite
+database, with its file and line, cluster (projects/<cluster>/), app (the
+file's directory under dist/), upstream prefix, image name, tag and digest.
+Files whose key (as for --cache) hasn't changed since they were indexed are
+not scanned again, and files that no longer exist under the scanned dist
+paths are dropped from the index.
+
+The index then answers questions without rescanning any manifest:
+
+    --which ghcr.io/cloudnative-pg/postgresql   where is this image used?
+    --which 'ghcr.io/cloudnative-pg/*'          (glob patterns are accepted)
+    --images                                    every distinct image reference,
+                                                per cluster (e.g. pre-pull lists)
+
+Without --dist, these query the index as it is.
+
 USAGE
 -----
     python check-zot-coverage.py --dist projects/lungmen.akn/dist/apps/forgejo
@@ -38,18 +65,32 @@ USAGE
     python check-zot-coverage.py \
         --dist projects/lungmen.akn/dist/apps/forgejo \
         --zot-configmap projects/amiya.akn/dist/apps/zot-registry/core.v1.ConfigMap.zot-config.yaml
+    python check-zot-coverage.py --dist projects/lungmen.akn/dist --jobs 4 --timings
+    python check-zot-coverage.py --dist 'projects/*/dist/apps/*' --dist projects/amiya.akn/dist/infrastructure
+    python check-zot-coverage.py --dist 'projects/*/dist' --cache .cache/zot-coverage.json --cache-key git
+    python check-zot-coverage.py --dist 'projects/*/dist' --index-db .cache/zot-images.db --cache-key git
+    python check-zot-coverage.py --index-db .cache/zot-images.db --which 'quay.io/cilium/*'
 
 EXIT CODES
 ----------
   0  All oci.chezmoi.sh images are covered by a Zot sync entry.
-  1  One or more images reference a prefix not present in the Zot config.
+  1  One or more images reference a prefix not present in the Zot config
+     (in any of the dist paths).
   2  Usage error (bad arguments, file not found, parse failure).
+  With --which or --images, 0 once the results are printed.
 """
 
 import argparse
+import glob
 import json
+import mmap
+import os
 import re
+import sqlite3
+import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import yaml
@@ -61,10 +102,58 @@ ZOT_CONFIGMAP_DEFAULT = (
     "projects/amiya.akn/dist/apps/zot-registry/core.v1.ConfigMap.zot-config.yaml"
 )
 
-# Matches any occurrence of oci.chezmoi.sh/<segment> in a text file.
-# Captures only the first path segment after the host so that
-# "oci.chezmoi.sh/ghcr.io/foo/bar:latest" yields "ghcr.io".
-_IMAGE_RE = re.compile(r"oci\.chezmoi\.sh/([^/:@\s\"']+)")
+# Matches any occurrence of oci.chezmoi.sh/<segment>[/<path>][:<tag>][@<digest>]
+# in a text file. The first group is the first path segment after the host
+# (the registry prefix), so that "oci.chezmoi.sh/ghcr.io/foo/bar:latest"
+# yields "ghcr.io", with "/foo/bar" as image name and "latest" as tag.
+_IMAGE_RE = re.compile(
+    rb"oci\.chezmoi\.sh/([^/:@\s\"']+)"
+    rb"((?:/[^/:@\s\"']+)*)"
+    rb"(?::([\w][\w.-]{0,127}))?"
+    rb"(?:@([a-z0-9]+:[0-9a-fA-F]{32,}))?"
+)
+IMAGE_HOST = "oci.chezmoi.sh/"
+_IMAGE_HOST = IMAGE_HOST.encode()
+
+# Files that can reference images: rendered manifests and kustomize patches.
+SCAN_SUFFIXES = frozenset({".yaml", ".yml", ".json", ".patch"})
+
+# Files larger than this are skipped (with a warning); no manifest gets close.
+MAX_FILE_SIZE = 64 * 1024 * 1024
+
+# Below this many files, starting worker processes costs more than it saves.
+MIN_FILES_PER_WORKER = 64
+
+# Bump when the meaning of cached prefixes changes (e.g. _IMAGE_RE).
+CACHE_VERSION = 1
+
+# Cache entries kept, most recently used first.
+MAX_CACHE_ENTRIES = 50_000
+
+# Bump when the index schema or what is recorded in it changes.
+INDEX_VERSION = 1
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path    TEXT PRIMARY KEY,
+    key     TEXT NOT NULL,
+    cluster TEXT,
+    app     TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (
+    path    TEXT NOT NULL REFERENCES files (path) ON DELETE CASCADE,
+    line    INTEGER NOT NULL,
+    prefix  TEXT NOT NULL,
+    image   TEXT NOT NULL,
+    tag     TEXT,
+    digest  TEXT
+);
+CREATE INDEX IF NOT EXISTS refs_path ON refs (path);
+CREATE INDEX IF NOT EXISTS refs_image ON refs (prefix, image);
+"""
+
+# (prefix, image, tag, digest, line) of an image reference
+ImageRef = tuple[str, str, str | None, str | None, int]
 
 # Matches mkUpstream "host" and mkUpstreamMulti "host" [...] calls in upstreams.nix.
 # Only the first argument (host) is captured — it becomes the destination prefix.
@@ -113,19 +202,336 @@ def load_zot_destinations_from_configmap(configmap_path: Path) -> set[str]:
     return destinations
 
 
-def collect_used_prefixes(dist_path: Path) -> set[str]:
-    """Return the set of registry prefixes used in all files under dist_path."""
-    prefixes: set[str] = set()
-    for filepath in dist_path.rglob("*"):
-        if not filepath.is_file():
+def iter_scan_candidates(dist_path: Path):
+    """Yield (path, size, mtime_ns) for every manifest file under dist_path."""
+    if dist_path.is_file():
+        st = dist_path.stat()
+        yield str(dist_path), st.st_size, st.st_mtime_ns
+        return
+    for root, _dirs, files in os.walk(dist_path):
+        for name in files:
+            if os.path.splitext(name)[1] not in SCAN_SUFFIXES:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime_ns
+
+
+def scan_file(path: str) -> tuple[str, list[ImageRef], float]:
+    """Return the image references in one file, with the time taken."""
+    start = time.perf_counter()
+    refs: list[ImageRef] = []
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # find() is much cheaper than the regex, and most files have no match
+            if data.find(_IMAGE_HOST) != -1:
+                line, pos = 1, 0
+                for match in _IMAGE_RE.finditer(data):
+                    line += data[pos:match.start()].count(b"\n")
+                    pos = match.start()
+                    prefix, image, tag, digest = (
+                        g.decode(errors="replace") if g is not None else None for g in match.groups()
+                    )
+                    refs.append((prefix, image.lstrip("/"), tag, digest, line))
+    except (OSError, ValueError):
+        pass
+    return path, refs, time.perf_counter() - start
+
+
+def scan_files(paths: list[str], jobs: int | None = None) -> list[tuple[str, list[ImageRef], float]]:
+    """Scan files with up to `jobs` worker processes (default: one per CPU)."""
+    workers = min(jobs or os.cpu_count() or 1, len(paths) // MIN_FILES_PER_WORKER)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(scan_file, paths, chunksize=max(1, len(paths) // (workers * 4))))
+    return [scan_file(path) for path in paths]
+
+
+def load_cache(cache_path: Path) -> dict[str, list[str]]:
+    """Return the cached prefixes of each file, by cache key."""
+    try:
+        cache = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("files", {})
+
+
+def save_cache(cache_path: Path, entries: dict[str, list[str]]) -> None:
+    """Write cache entries, keeping only the MAX_CACHE_ENTRIES most recent."""
+    keys = list(entries)[-MAX_CACHE_ENTRIES:]
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(cache_path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": CACHE_VERSION, "files": {k: entries[k] for k in keys}}))
+    tmp.replace(cache_path)
+
+
+def git_blob_hashes(dist_paths: list[Path]) -> dict[str, str]:
+    """Return the git blob hash of each tracked, unmodified file under
+    dist_paths, by normalised path. Returns {} outside of a git work tree."""
+    pathspecs = [str(p) for p in dist_paths]
+    try:
+        staged = subprocess.run(
+            ["git", "ls-files", "--stage", "-z", "--", *pathspecs],
+            check=True, capture_output=True,
+        ).stdout
+        modified = subprocess.run(
+            ["git", "ls-files", "--modified", "-z", "--", *pathspecs],
+            check=True, capture_output=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+    changed = {os.path.normpath(p) for p in modified.decode().split("\0") if p}
+    hashes = {}
+    for entry in staged.decode().split("\0"):
+        if not entry:
             continue
-        try:
-            text = filepath.read_text(errors="replace")
-        except OSError:
+        # "<mode> <object> <stage>\t<path>"
+        info, _, path = entry.partition("\t")
+        path = os.path.normpath(path)
+        if path not in changed:
+            hashes[path] = info.split()[1]
+    return hashes
+
+
+def open_index(index_path: Path) -> sqlite3.Connection:
+    """Open (or create) the image index, emptying it if its version differs."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(index_path)
+    db.execute("PRAGMA foreign_keys = ON")
+    if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+        db.executescript("DROP TABLE IF EXISTS refs; DROP TABLE IF EXISTS files;")
+        db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    db.executescript(INDEX_SCHEMA)
+    return db
+
+
+def file_origin(path: str) -> tuple[str | None, str | None]:
+    """Return the cluster (projects/<cluster>/) and app (directory under
+    dist/) of a manifest, as far as its path tells."""
+    parts = Path(path).parts
+    cluster = app = None
+    if "projects" in parts[:-1]:
+        i = parts.index("projects")
+        cluster = parts[i + 1] if i + 2 < len(parts) else None
+    if "dist" in parts[:-1]:
+        i = parts.index("dist")
+        app = "/".join(parts[i + 1 : -1]) or None
+    return cluster, app
+
+
+def update_index(
+    db: sqlite3.Connection,
+    dist_paths: list[Path],
+    keys: dict[str, str],
+    refs_by_key: dict[str, list[ImageRef]],
+    indexed: dict[str, str],
+) -> None:
+    """Record the references of files whose key changed, and drop files
+    that are gone from the dist paths."""
+    with db:
+        for dist_path in dist_paths:
+            root = os.path.normpath(dist_path)
+            stale = [
+                (path,) for path in indexed
+                if path not in keys and (path == root or path.startswith(root + os.sep))
+            ]
+            db.executemany("DELETE FROM files WHERE path = ?", stale)
+        for path, key in keys.items():
+            if indexed.get(path) == key:
+                continue
+            db.execute("DELETE FROM files WHERE path = ?", (path,))
+            db.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (path, key, *file_origin(path)))
+            db.executemany(
+                "INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, line, prefix, image, tag, digest) for prefix, image, tag, digest, line in refs_by_key[key]],
+            )
+
+
+def collect_used_prefixes_by_dist(
+    dist_paths: list[Path],
+    jobs: int | None = None,
+    timings: list[tuple[str, float]] | None = None,
+    cache: dict[str, list[str]] | None = None,
+    blob_hashes: dict[str, str] | None = None,
+    index: sqlite3.Connection | None = None,
+) -> dict[Path, set[str]]:
+    """Return the set of registry prefixes used under each of dist_paths.
+
+    The files of all dist paths are scanned together, in one pool of up to
+    `jobs` worker processes, and a file under several of them is scanned
+    once. If `timings` is given, (path, seconds) is appended for each
+    scanned file.
+
+    If `cache` is given, files with an entry in it aren't scanned, and the
+    entries of all files are (re)inserted into it, most recent last. Files
+    are keyed by their git blob hash when it is in `blob_hashes`, or else by
+    their path, size and mtime.
+
+    If `index` is given, files indexed with the same key aren't scanned
+    either, and the index is brought up to date with the dist paths.
+    """
+    files_by_dist: dict[Path, list[str]] = {}
+    keys: dict[str, str] = {}
+    for dist_path in dist_paths:
+        files_by_dist[dist_path] = []
+        for path, size, mtime_ns in iter_scan_candidates(dist_path):
+            path = os.path.normpath(path)
+            if size == 0:
+                continue
+            if size > MAX_FILE_SIZE:
+                if path not in keys:
+                    print(f"::warning file={path}::Skipped ({size} bytes, over {MAX_FILE_SIZE})")
+                continue
+            files_by_dist[dist_path].append(path)
+            if path not in keys:
+                blob = (blob_hashes or {}).get(os.path.normpath(os.path.relpath(path)))
+                keys[path] = f"git:{blob}" if blob else f"stat:{path}:{size}:{mtime_ns}"
+
+    indexed: dict[str, str] = {}
+    if index is not None:
+        indexed = dict(index.execute("SELECT path, key FROM files"))
+
+    # Files with the same content (and so the same git blob) share a key,
+    # and only one of them is scanned.
+    refs_by_key: dict[str, list[ImageRef]] = {}
+    prefixes_by_key: dict[str, set[str]] = {}
+    to_scan: dict[str, str] = {}
+    for path, key in keys.items():
+        if key in refs_by_key or (index is None and key in prefixes_by_key):
             continue
-        for match in _IMAGE_RE.finditer(text):
-            prefixes.add(match.group(1))
-    return prefixes
+        if indexed.get(path) == key:
+            refs_by_key[key] = [
+                (prefix, image, tag, digest, line)
+                for line, prefix, image, tag, digest in index.execute(
+                    "SELECT line, prefix, image, tag, digest FROM refs WHERE path = ? ORDER BY rowid", (path,)
+                )
+            ]
+        elif index is None and cache is not None and key in cache:
+            prefixes_by_key[key] = set(cache.pop(key))
+        else:
+            to_scan.setdefault(key, path)
+
+    paths_keys = {path: key for key, path in to_scan.items()}
+    for path, refs, elapsed in scan_files(list(paths_keys), jobs):
+        refs_by_key[paths_keys[path]] = refs
+        if timings is not None:
+            timings.append((path, elapsed))
+
+    for key, refs in refs_by_key.items():
+        prefixes_by_key[key] = {ref[0] for ref in refs}
+
+    if cache is not None:
+        for key in keys.values():
+            cache.pop(key, None)
+            cache[key] = sorted(prefixes_by_key[key])
+
+    if index is not None:
+        update_index(index, dist_paths, keys, refs_by_key, indexed)
+
+    return {
+        dist_path: set().union(*(prefixes_by_key[keys[path]] for path in files))
+        for dist_path, files in files_by_dist.items()
+    }
+
+
+def collect_used_prefixes(
+    dist_path: Path,
+    jobs: int | None = None,
+    timings: list[tuple[str, float]] | None = None,
+) -> set[str]:
+    """Return the set of registry prefixes used in all files under dist_path."""
+    return collect_used_prefixes_by_dist([dist_path], jobs, timings)[dist_path]
+
+
+def expand_dist_args(values: list[str]) -> list[Path]:
+    """Expand --dist values (paths or glob patterns) into existing paths,
+    keeping their order and dropping duplicates."""
+    dist_paths: dict[Path, None] = {}
+    for value in values:
+        if glob.has_magic(value):
+            matches = sorted(glob.glob(value, recursive=True))
+            if not matches:
+                print(f"::error ::dist pattern matches nothing: {value}")
+                sys.exit(2)
+            for match in matches:
+                dist_paths[Path(match)] = None
+        else:
+            if not Path(value).exists():
+                print(f"::error ::dist path does not exist: {value}")
+                sys.exit(2)
+            dist_paths[Path(value)] = None
+    return list(dist_paths)
+
+
+def print_timings(timings: list[tuple[str, float]]) -> None:
+    """Print per-file scan times, slowest first, in a collapsed log group."""
+    print(f"::group::Scan timings ({len(timings)} files, {sum(t for _, t in timings) * 1000:.1f} ms)")
+    for path, elapsed in sorted(timings, key=lambda item: item[1], reverse=True):
+        print(f"{elapsed * 1000:9.3f} ms  {path}")
+    print("::endgroup::")
+
+
+# Full reference of an indexed image, without the oci.chezmoi.sh/ host
+_REF_SQL = "r.prefix || '/' || r.image || coalesce(':' || r.tag, '') || coalesce('@' || r.digest, '')"
+
+
+def find_image(db: sqlite3.Connection, pattern: str) -> list[tuple]:
+    """Return (cluster, app, path, line, reference) of each use of the
+    images matching a glob pattern, on the image name or full reference."""
+    pattern = pattern.removeprefix(IMAGE_HOST)
+    return db.execute(
+        f"""SELECT f.cluster, f.app, r.path, r.line, {_REF_SQL}
+            FROM refs r JOIN files f USING (path)
+            WHERE r.prefix || '/' || r.image GLOB ?1 OR {_REF_SQL} GLOB ?1
+            ORDER BY f.cluster, f.app, r.path, r.line""",
+        (pattern,),
+    ).fetchall()
+
+
+def list_images(db: sqlite3.Connection) -> list[tuple]:
+    """Return (cluster, reference) of every distinct image reference."""
+    return db.execute(
+        f"""SELECT DISTINCT f.cluster, {_REF_SQL}
+            FROM refs r JOIN files f USING (path)
+            ORDER BY 1, 2"""
+    ).fetchall()
+
+
+def load_destinations(args: argparse.Namespace) -> tuple[set[str], str]:
+    """Return the Zot destinations, and where they were read from."""
+    # Determine source for Zot destinations (explicit flag > auto-detect).
+    # Auto-detect: prefer the LXC Nix file (current deployment), fall back
+    # to the legacy Kubernetes ConfigMap.
+    if args.zot_upstreams_nix is not None:
+        if not args.zot_upstreams_nix.exists():
+            print(f"::error ::Zot upstreams Nix file not found: {args.zot_upstreams_nix}")
+            sys.exit(2)
+        return load_zot_destinations_from_nix(args.zot_upstreams_nix), str(args.zot_upstreams_nix)
+    if args.zot_configmap is not None:
+        if not args.zot_configmap.exists():
+            print(f"::error ::Zot ConfigMap file not found: {args.zot_configmap}")
+            sys.exit(2)
+        return load_zot_destinations_from_configmap(args.zot_configmap), str(args.zot_configmap)
+
+    nix_path = Path(ZOT_UPSTREAMS_NIX_DEFAULT)
+    configmap_path = Path(ZOT_CONFIGMAP_DEFAULT)
+    if nix_path.exists():
+        return load_zot_destinations_from_nix(nix_path), str(nix_path)
+    if configmap_path.exists():
+        return load_zot_destinations_from_configmap(configmap_path), str(configmap_path)
+    print(
+        f"::error ::No Zot configuration found. Tried:\n"
+        f"  {nix_path}\n"
+        f"  {configmap_path}\n"
+        f"Pass --zot-upstreams-nix or --zot-configmap explicitly."
+    )
+    sys.exit(2)
 
 
 def main() -> None:
@@ -134,9 +540,10 @@ def main() -> None:
     )
     parser.add_argument(
         "--dist",
-        required=True,
-        type=Path,
-        help="Path to the dist/ directory to scan (e.g. projects/lungmen.akn/dist/apps/forgejo)",
+        action="append",
+        help="Path or glob pattern of the dist/ directories to scan "
+        "(e.g. projects/lungmen.akn/dist/apps/forgejo, 'projects/*/dist/apps/*'); "
+        "may be repeated; required unless querying the index",
     )
     parser.add_argument(
         "--zot-upstreams-nix",
@@ -150,66 +557,133 @@ def main() -> None:
         type=Path,
         help=f"Path to the compiled Zot ConfigMap YAML (default: {ZOT_CONFIGMAP_DEFAULT})",
     )
+    parser.add_argument(
+        "--jobs",
+        default=None,
+        type=int,
+        help="Number of worker processes scanning files (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print the time spent scanning each file",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        type=Path,
+        help="JSON file caching the prefixes found in each file; only files "
+        "without a cache entry are scanned",
+    )
+    parser.add_argument(
+        "--cache-key",
+        choices=("stat", "git"),
+        default="stat",
+        help="Key cache and index entries by path, size and mtime (stat), or by "
+        "git blob hash for tracked, unmodified files (git; default: stat)",
+    )
+    parser.add_argument(
+        "--index-db",
+        default=None,
+        type=Path,
+        help="SQLite index of every oci.chezmoi.sh reference, updated from the "
+        "scanned dist paths",
+    )
+    parser.add_argument(
+        "--which",
+        metavar="IMAGE",
+        default=None,
+        help="Print where the images matching IMAGE (a glob pattern) are used, "
+        "according to --index-db",
+    )
+    parser.add_argument(
+        "--images",
+        action="store_true",
+        help="Print every distinct image reference per cluster, according to --index-db",
+    )
     args = parser.parse_args()
 
-    if not args.dist.exists():
-        print(f"::error ::dist path does not exist: {args.dist}")
-        sys.exit(2)
+    querying = args.which is not None or args.images
+    if querying and args.index_db is None:
+        parser.error("--which and --images need --index-db")
+    if not args.dist and not querying:
+        parser.error("--dist is required")
+
+    dist_paths = expand_dist_args(args.dist or [])
+    index = open_index(args.index_db) if args.index_db else None
+
+    start = time.perf_counter()
+    timings: list[tuple[str, float]] | None = [] if args.timings else None
+    cache = load_cache(args.cache) if args.cache else None
+    blob_hashes = None
+    if (cache is not None or index is not None) and args.cache_key == "git":
+        blob_hashes = git_blob_hashes(dist_paths)
+    used_by_dist = collect_used_prefixes_by_dist(
+        dist_paths, jobs=args.jobs, timings=timings, cache=cache, blob_hashes=blob_hashes, index=index
+    )
+    if cache is not None:
+        try:
+            save_cache(args.cache, cache)
+        except OSError as exc:
+            print(f"::warning ::Cannot write cache {args.cache}: {exc}")
+    if timings is not None:
+        print_timings(timings)
+        print(
+            f"Checked {len(dist_paths)} dist path(s) in {(time.perf_counter() - start) * 1000:.1f} ms "
+            f"({len(timings)} file(s) scanned"
+            f"{', the rest from cache' if cache is not None or index is not None else ''})"
+        )
 
-    # Determine source for Zot destinations (explicit flag > auto-detect).
-    # Auto-detect: prefer the LXC Nix file (current deployment), fall back
-    # to the legacy Kubernetes ConfigMap.
-    if args.zot_upstreams_nix is not None:
-        if not args.zot_upstreams_nix.exists():
-            print(f"::error ::Zot upstreams Nix file not found: {args.zot_upstreams_nix}")
-            sys.exit(2)
-        source_label = str(args.zot_upstreams_nix)
-        destinations = load_zot_destinations_from_nix(args.zot_upstreams_nix)
-    elif args.zot_configmap is not None:
-        if not args.zot_configmap.exists():
-            print(f"::error ::Zot ConfigMap file not found: {args.zot_configmap}")
-            sys.exit(2)
-        source_label = str(args.zot_configmap)
-        destinations = load_zot_destinations_from_configmap(args.zot_configmap)
-    else:
-        nix_path = Path(ZOT_UPSTREAMS_NIX_DEFAULT)
-        configmap_path = Path(ZOT_CONFIGMAP_DEFAULT)
-        if nix_path.exists():
-            source_label = str(nix_path)
-            destinations = load_zot_destinations_from_nix(nix_path)
-        elif configmap_path.exists():
-            source_label = str(configmap_path)
-            destinations = load_zot_destinations_from_configmap(configmap_path)
-        else:
+    if querying:
+        if args.which is not None:
+            for cluster, app, path, line, ref in find_image(index, args.which):
+                print(f"{path}:{line}: {IMAGE_HOST}{ref}  ({cluster or '-'}, {app or '-'})")
+        if args.images:
+            for cluster, ref in list_images(index):
+                print(f"{cluster or '-'}\t{IMAGE_HOST}{ref}")
+        return
+
+    destinations, source_label = load_destinations(args)
+
+    failed = []
+    for dist_path, used_prefixes in used_by_dist.items():
+        missing = used_prefixes - destinations
+        if missing:
+            failed.append(dist_path)
+            for prefix in sorted(missing):
+                print(
+                    f"::error ::ZOT001: registry prefix '{prefix}' is used in "
+                    f"{dist_path} but has no pull-through entry in the Zot "
+                    f"configuration ({source_label}). "
+                    f"Add a sync entry with destination '/{prefix}'."
+                )
+            continue
+
+        covered = used_prefixes & destinations
+        if covered:
             print(
-                f"::error ::No Zot configuration found. Tried:\n"
-                f"  {nix_path}\n"
-                f"  {configmap_path}\n"
-                f"Pass --zot-upstreams-nix or --zot-configmap explicitly."
+                f"✓ All {len(covered)} oci.chezmoi.sh prefix(es) in {dist_path} "
+                f"are covered by Zot: {', '.join(sorted(covered))}"
             )
-            sys.exit(2)
-
-    used_prefixes = collect_used_prefixes(args.dist)
+        else:
+            print(f"✓ No oci.chezmoi.sh images found in {dist_path} — nothing to check.")
 
-    missing = used_prefixes - destinations
-    if missing:
-        for prefix in sorted(missing):
+    if len(used_by_dist) > 1:
+        all_used = set().union(*used_by_dist.values())
+        all_missing = all_used - destinations
+        if all_missing:
             print(
-                f"::error ::ZOT001: registry prefix '{prefix}' is used in "
-                f"{args.dist} but has no pull-through entry in the Zot "
-                f"configuration ({source_label}). "
-                f"Add a sync entry with destination '/{prefix}'."
+                f"✗ {len(failed)} of {len(used_by_dist)} dist path(s) use "
+                f"{len(all_missing)} prefix(es) not covered by Zot: {', '.join(sorted(all_missing))}"
+            )
+        else:
+            print(
+                f"✓ {len(used_by_dist)} dist path(s) checked: all {len(all_used)} "
+                f"oci.chezmoi.sh prefix(es) are covered by Zot"
             )
-        sys.exit(1)
 
-    covered = used_prefixes & destinations
-    if covered:
-        print(
-            f"✓ All {len(covered)} oci.chezmoi.sh prefix(es) in {args.dist} "
-            f"are covered by Zot: {', '.join(sorted(covered))}"
-        )
-    else:
-        print(f"✓ No oci.chezmoi.sh images found in {args.dist} — nothing to check.")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
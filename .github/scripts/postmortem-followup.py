@@ -16,6 +16,9 @@ Parses docs/incidents/*.md, keeps post-mortems with `status: Open`, finds
 unchecked `- [ ] [due:: YYYY-MM-DD] ...` items whose due date has passed, and
 opens a GitHub issue for each (idempotent — checks existing issues by title).
 
+Frontmatter is parsed through the cache shared with postmortem-index.py (see
+postmortem_lib.py).
+
 Env vars:
   GITHUB_REPOSITORY   owner/repo (set automatically in GH Actions)
   DRY_RUN             "true" → print actions without creating issues
@@ -29,11 +32,9 @@ import re
 import subprocess
 import sys
 from datetime import date, datetime
-from pathlib import Path
 
-import yaml
+from postmortem_lib import INCIDENTS_DIR, load_cache, load_incidents, save_cache
 
-INCIDENTS_DIR = Path("docs/incidents")
 LABEL = "incident-followup"
 
 # Matches:  - [ ] [due:: 2026-06-15] [priority:: high] [size:: S] [owner:: Name] Action text
@@ -47,19 +48,6 @@ ITEM_RE = re.compile(
 )
 
 
-def parse_frontmatter(text: str) -> tuple[dict | None, str]:
-    if not text.startswith("---\n"):
-        return None, text
-    end = text.find("\n---\n", 4)
-    if end == -1:
-        return None, text
-    try:
-        fm = yaml.safe_load(text[4:end])
-    except yaml.YAMLError:
-        return None, text
-    return fm if isinstance(fm, dict) else None, text[end + 5:]
-
-
 def canonical_title(pm_slug: str, action: str) -> str:
     """Stable, idempotent title — used as the unique key against existing issues."""
     action_short = re.sub(r"\s+", " ", action).strip()
@@ -137,11 +125,13 @@ def main() -> int:
         print(f"no incidents directory: {INCIDENTS_DIR}", file=sys.stderr)
         return 0
 
-    for pm_path in sorted(INCIDENTS_DIR.glob("*.md")):
-        if pm_path.name in {"INDEX.md", "README.md"}:
-            continue
-        text = pm_path.read_text(encoding="utf-8")
-        fm, body = parse_frontmatter(text)
+    cache = load_cache()
+    incidents = load_incidents(cache)
+    save_cache(cache)
+
+    for incident in incidents:
+        pm_path = incident["path"]
+        fm, body = incident["frontmatter"], incident["body"]
         if fm is None or fm.get("status") != "Open":
             continue
         pm_slug = pm_path.stem
@@ -18,21 +18,33 @@ Reads every `docs/incidents/*.md` post-mortem (excluding INDEX.md, README.md),
 parses frontmatter, and writes the index sorted by family popularity then by
 date (newest first).
 
+Parsed frontmatter is cached in `.cache/postmortems.json` (see postmortem_lib.py),
+along with a digest of the inputs of the last INDEX.md written: when neither the
+post-mortems nor this script (or postmortem_lib.py) have changed, and INDEX.md
+hasn't been edited since, rendering is skipped.
+
 Usage:
     ./.github/scripts/postmortem-index.py               # write INDEX.md
     ./.github/scripts/postmortem-index.py --check       # exit 1 if INDEX.md is stale (for CI)
+    ./.github/scripts/postmortem-index.py --no-cache    # ignore and don't update the cache
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import sys
 from collections import defaultdict
 from pathlib import Path
 
-import yaml
+from postmortem_lib import (
+    INCIDENTS_DIR,
+    inputs_digest,
+    load_cache,
+    load_incidents,
+    save_cache,
+)
 
-INCIDENTS_DIR = Path("docs/incidents")
 INDEX_PATH = INCIDENTS_DIR / "INDEX.md"
 PARETO_THRESHOLD = 3
 
@@ -53,27 +65,11 @@ vocabulary.
 """
 
 
-def parse_frontmatter(text: str) -> dict | None:
-    if not text.startswith("---\n"):
-        return None
-    end = text.find("\n---\n", 4)
-    if end == -1:
-        return None
-    try:
-        fm = yaml.safe_load(text[4:end])
-    except yaml.YAMLError:
-        return None
-    return fm if isinstance(fm, dict) else None
-
-
-def load_postmortems() -> list[dict]:
+def load_postmortems(incidents: list[dict]) -> list[dict]:
     pms: list[dict] = []
-    if not INCIDENTS_DIR.exists():
-        return pms
-    for path in sorted(INCIDENTS_DIR.glob("*.md")):
-        if path.name in {"INDEX.md", "README.md"}:
-            continue
-        fm = parse_frontmatter(path.read_text(encoding="utf-8"))
+    for incident in incidents:
+        path = incident["path"]
+        fm = incident["frontmatter"]
         if fm is None:
             print(f"warn: no frontmatter in {path}", file=sys.stderr)
             continue
@@ -136,24 +132,44 @@ def main() -> int:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--check", action="store_true",
                         help="Exit 1 if INDEX.md is stale (does not write)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse every post-mortem and render the index, ignoring the cache")
     args = parser.parse_args()
 
-    pms = load_postmortems()
+    cache = {} if args.no_cache else load_cache()
+    incidents = load_incidents(cache)
+    script = Path(__file__)
+    inputs = inputs_digest(incidents, script.read_bytes(),
+                           script.with_name("postmortem_lib.py").read_bytes())
+    current = INDEX_PATH.read_text(encoding="utf-8") if INDEX_PATH.exists() else None
+
+    # Nothing to render if INDEX.md is the one last written from these inputs
+    last = cache.get("index", {})
+    if current is not None and last.get("inputs") == inputs and \
+            last.get("output") == hashlib.sha256(current.encode("utf-8")).hexdigest():
+        if not args.no_cache:
+            save_cache(cache)
+        print(f"ok: {INDEX_PATH} is up to date (inputs unchanged)", file=sys.stderr)
+        return 0
+
+    pms = load_postmortems(incidents)
     content = render_index(pms)
 
     if args.check:
-        if not INDEX_PATH.exists():
+        if current is None:
             print(f"error: {INDEX_PATH} does not exist", file=sys.stderr)
             return 1
-        current = INDEX_PATH.read_text(encoding="utf-8")
         if current != content:
             print(f"error: {INDEX_PATH} is stale — run `./.github/scripts/postmortem-index.py`", file=sys.stderr)
             return 1
         print(f"ok: {INDEX_PATH} is up to date", file=sys.stderr)
-        return 0
+    else:
+        INDEX_PATH.write_text(content, encoding="utf-8")
+        print(f"wrote {INDEX_PATH} ({len(pms)} post-mortems)", file=sys.stderr)
 
-    INDEX_PATH.write_text(content, encoding="utf-8")
-    print(f"wrote {INDEX_PATH} ({len(pms)} post-mortems)", file=sys.stderr)
+    if not args.no_cache:
+        cache["index"] = {"inputs": inputs, "output": hashlib.sha256(content.encode("utf-8")).hexdigest()}
+        save_cache(cache)
     return 0
 
 
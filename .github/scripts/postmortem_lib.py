@@ -0,0 +1,110 @@
+# Copyright (C) 2026 Alexandre Nicolaie (xunleii@users.noreply.github.com)
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#         http://www.apache.org/licenses/LICENSE-2.0
+"""Shared post-mortem loader for postmortem-index.py and postmortem-followup.py.
+
+Reads every `docs/incidents/*.md` post-mortem (excluding INDEX.md, README.md)
+and splits its frontmatter from its body. Parsed frontmatter is kept in a
+cache file keyed on the SHA-256 of each post-mortem, so only new or edited
+post-mortems go through `yaml.safe_load` again.
+
+Frontmatter is normalised to JSON types (e.g. dates become `YYYY-MM-DD`
+strings), whether it comes from the cache or not.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import yaml
+
+INCIDENTS_DIR = Path("docs/incidents")
+EXCLUDED = {"INDEX.md", "README.md"}
+CACHE_PATH = Path(".cache/postmortems.json")
+
+# Bump when what is cached (or how it is normalised) changes.
+CACHE_VERSION = 1
+
+
+def split_frontmatter(text: str) -> tuple[str | None, str]:
+    """Return the raw frontmatter (or None) and the body of a post-mortem."""
+    if not text.startswith("---\n"):
+        return None, text
+    end = text.find("\n---\n", 4)
+    if end == -1:
+        return None, text
+    return text[4:end], text[end + 5:]
+
+
+def parse_frontmatter(raw: str) -> dict | None:
+    try:
+        fm = yaml.safe_load(raw)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(fm, dict):
+        return None
+    return json.loads(json.dumps(fm, default=str))
+
+
+def load_cache(path: Path = CACHE_PATH) -> dict:
+    try:
+        cache = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"version": CACHE_VERSION}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {"version": CACHE_VERSION}
+    return cache
+
+
+def save_cache(cache: dict, path: Path = CACHE_PATH) -> None:
+    """Write the cache; failing to is not an error, only slower next time."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(cache, sort_keys=True), encoding="utf-8")
+        tmp.replace(path)
+    except OSError as exc:
+        print(f"warn: cannot write cache {path}: {exc}", file=sys.stderr)
+
+
+def load_incidents(cache: dict, incidents_dir: Path = INCIDENTS_DIR) -> list[dict]:
+    """Return {path, sha256, frontmatter, body} for each post-mortem, in
+    name order. `frontmatter` is None when missing or invalid.
+
+    The cache's frontmatter entries are replaced by those of the current
+    post-mortems, so that it doesn't grow with every edit.
+    """
+    cached = cache.get("frontmatter", {})
+    entries: dict[str, dict | None] = {}
+    incidents: list[dict] = []
+    if incidents_dir.exists():
+        for path in sorted(incidents_dir.glob("*.md")):
+            if path.name in EXCLUDED:
+                continue
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            raw, body = split_frontmatter(data.decode("utf-8"))
+            if digest in cached:
+                fm = cached[digest]
+            else:
+                fm = parse_frontmatter(raw) if raw is not None else None
+            entries[digest] = fm
+            incidents.append({"path": path, "sha256": digest, "frontmatter": fm, "body": body})
+    cache["frontmatter"] = entries
+    return incidents
+
+
+def inputs_digest(incidents: list[dict], *extra: bytes) -> str:
+    """Return a digest of the post-mortems (names and contents) and of any
+    `extra` inputs, e.g. the source of the script rendering them."""
+    h = hashlib.sha256()
+    for incident in incidents:
+        h.update(f"{incident['path'].name}\0{incident['sha256']}\n".encode())
+    for data in extra:
+        h.update(hashlib.sha256(data).digest())
+    return h.hexdigest()
@@ -0,0 +1,199 @@
+# Helpers for the bulk 'users' and 'groups' modules.
+#
+# The 'user' module looks up one user, then its primary group, then its
+# supplementary groups, and sometimes asks for the next free UID: that's
+# up to four middleware calls per user, per task. The bulk modules
+# instead load every user and group once, index them here, and work out
+# the changes for the whole list in memory.
+#
+# The rules for deciding what to create or change are the same as in
+# the 'user' and 'group' modules, for the new (22.02+) sudo API only.
+
+__metaclass__ = type
+
+from ..module_utils.query_cache import QueryCache
+
+
+class Accounts:
+    """Index of all users and groups on the host.
+
+    Attributes:
+      users_by_name: username -> user.query() entry
+      groups_by_name: group name -> group.query() entry
+      groups_by_gid: GID -> list of group.query() entries (GIDs need
+        not be unique)
+
+    If 'load_users' is false, users aren't loaded, and users_by_name
+    is empty.
+    """
+
+    def __init__(self, mw, load_users=True):
+        self.mw = mw
+        self.users = QueryCache(mw, "user.query", "username")
+        self.groups = QueryCache(mw, "group.query", "group")
+
+        self.users_by_name = {}
+        if load_users:
+            self.users_by_name = {u['username']: u
+                                  for u in self.users.all()}
+        self.groups_by_name = {g['group']: g for g in self.groups.all()}
+        self.groups_by_gid = {}
+        for g in self.groups_by_name.values():
+            self.groups_by_gid.setdefault(g['gid'], []).append(g)
+
+        self._used_uids = {u['uid'] for u in self.users_by_name.values()}
+        self._next_uid = None
+
+    def group_ids(self, names):
+        """Return the database IDs (not GIDs) of the groups 'names'.
+
+        Raise KeyError if any of them doesn't exist.
+        """
+
+        missing = [n for n in names if n not in self.groups_by_name]
+        if missing:
+            raise KeyError(f"No such group: {', '.join(missing)}")
+        return [self.groups_by_name[n]['id'] for n in names]
+
+    def reserve_uid(self, uid):
+        """Record that 'uid' was requested explicitly, so that
+        next_uid() doesn't hand it out."""
+        self._used_uids.add(uid)
+
+    def next_uid(self):
+        """Return a free UID.
+
+        user.get_next_uid() is only called once. After that, UIDs are
+        handed out locally, skipping the ones already in use, so that
+        users created in the same run don't all get the same one.
+        """
+
+        if self._next_uid is None:
+            self._next_uid = self.mw.call("user.get_next_uid")
+        while self._next_uid in self._used_uids:
+            self._next_uid += 1
+        uid = self._next_uid
+        self._used_uids.add(uid)
+        return uid
+
+    def invalidate(self):
+        """Drop the cached users and groups after changing them.
+
+        group.query() lists each group's members and user.query() embeds
+        each user's primary group, so a change to either affects both.
+        """
+
+        self.users.invalidate()
+        self.groups.invalidate()
+
+
+def user_create_args(params, accounts):
+    """Return the arguments to user.create() for the user described by
+    'params', the options of one user.
+
+    Raise KeyError if a group doesn't exist.
+    """
+
+    arg = {
+        "username": params['name'],
+        "password": params['password'],
+        "full_name": params['comment'] or "",
+    }
+
+    for opt, key in (('password_disabled', 'password_disabled'),
+                     ('email', 'email'),
+                     ('uid', 'uid'),
+                     ('smb', 'smb'),
+                     ('sudo_commands', 'sudo_commands'),
+                     ('sudo_commands_nopasswd', 'sudo_commands_nopasswd'),
+                     ('shell', 'shell')):
+        if params[opt] is not None:
+            arg[key] = params[opt]
+
+    # TrueNAS chowns the new home directory before assigning a UID, so
+    # a UID must be given along with a home directory. See the 'user'
+    # module.
+    if params['home'] is not None:
+        if params['uid'] is None:
+            arg['uid'] = accounts.next_uid()
+        arg['home'] = params['home']
+
+    if params['ssh_authorized_keys'] is not None:
+        arg['sshpubkey'] = "\n".join(params['ssh_authorized_keys']) + "\n"
+
+    if params['create_group']:
+        arg['group_create'] = True
+    elif params['group'] in accounts.groups_by_name:
+        arg['group'] = accounts.groups_by_name[params['group']]['id']
+
+    if params['groups']:
+        arg['groups'] = accounts.group_ids(params['groups'])
+
+    return arg
+
+
+def user_update_args(params, user_info, accounts):
+    """Return the arguments to user.update() needed to make the existing
+    user 'user_info' match 'params'. An empty dict means that nothing
+    needs to change.
+
+    Raise KeyError if a group doesn't exist.
+    """
+
+    arg = {}
+
+    for opt, key in (('uid', 'uid'),
+                     ('password_disabled', 'password_disabled'),
+                     ('comment', 'full_name'),
+                     ('email', 'email'),
+                     ('shell', 'shell'),
+                     ('smb', 'smb')):
+        if params[opt] is not None and user_info[key] != params[opt]:
+            arg[key] = params[opt]
+
+    # The home directory is fine if it is 'home', or 'home' followed by
+    # the username.
+    home = params['home']
+    if home is not None and \
+       user_info['home'] not in (home, f"{home}/{user_info['username']}"):
+        arg['home'] = home
+
+    # Order doesn't matter for sudo commands.
+    for opt in ('sudo_commands', 'sudo_commands_nopasswd'):
+        if params[opt] is not None and \
+           set(user_info[opt]) != set(params[opt]):
+            arg[opt] = params[opt]
+
+    if params['ssh_authorized_keys'] is not None:
+        if user_info['sshpubkey'] is None:
+            old_keys = []
+        else:
+            old_keys = user_info['sshpubkey'].rstrip().split("\n")
+        want_keys = [k.rstrip() for k in params['ssh_authorized_keys']]
+
+        if params['append_pubkeys']:
+            # Keep the existing keys in their order, and add the new
+            # ones after them in the order given, so that the file
+            # doesn't change from one run to the next.
+            old_keyset = set(old_keys)
+            new_keys = [k for k in dict.fromkeys(want_keys)
+                        if k not in old_keyset]
+            if new_keys:
+                arg['sshpubkey'] = "\n".join(old_keys + new_keys) + "\n"
+        elif set(old_keys) != set(want_keys):
+            arg['sshpubkey'] = \
+                "\n".join(params['ssh_authorized_keys']) + "\n"
+
+    group = params['group']
+    if group is not None and user_info['group']['bsdgrp_group'] != group:
+        arg['group'] = accounts.group_ids([group])[0]
+
+    if params['groups'] is not None:
+        nas_groupset = set(user_info['groups'])
+        want_groupset = set(accounts.group_ids(params['groups']))
+        if params['append']:
+            want_groupset |= nas_groupset
+        if want_groupset != nas_groupset:
+            arg['groups'] = sorted(want_groupset)
+
+    return arg
@@ -0,0 +1,143 @@
+# Host-side cache for data that is expensive to get from middlewared.
+#
+# Every Ansible task runs in a new Python process on the NAS, so
+# memoizing in a module-global variable only helps within one task.
+# This module keeps small JSON documents in a directory on the NAS
+# instead, so that later tasks in the same play (and later plays) can
+# reuse them.
+#
+# Each entry is stored with a key, typically derived from the boot ID,
+# and a timestamp. An entry whose key doesn't match, or that is older
+# than the caller's TTL, is treated as missing. Since an upgrade
+# requires a reboot, keying on the boot ID also invalidates anything
+# that depends on the installed version.
+#
+# The default directory is in /var/tmp, where any local user could
+# create it first and plant entries in it. So the cache is only used if
+# the directory belongs to the user running the module and nobody else
+# can write to it.
+
+import json
+import os
+import stat
+import tempfile
+import time
+
+# Environment variable used to override the cache directory, e.g.:
+#
+#   environment:
+#     truenas_cache_dir: /root/.cache/truenas_scale
+CACHE_DIR_ENV = "truenas_cache_dir"
+CACHE_DIR_DEFAULT = "/var/tmp/ansible-truenas_scale"
+
+# Reading this is free, unlike asking middlewared for system.boot_id.
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+
+def cache_dir():
+    """Return the directory holding the cache files."""
+    return os.environ.get(CACHE_DIR_ENV, CACHE_DIR_DEFAULT)
+
+
+def _cache_path(name):
+    return os.path.join(cache_dir(), f"{name}.json")
+
+
+def _trusted(directory):
+    """Return True if 'directory' is a directory (not a symlink to one)
+    owned by the current user, that neither its group nor other users
+    can write to."""
+    try:
+        st = os.lstat(directory)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and \
+        not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def boot_id():
+    """Return the kernel's boot ID, or None if it can't be read."""
+    try:
+        with open(BOOT_ID_PATH) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load(name, key, ttl):
+    """Return the data cached under 'name', or None.
+
+    The data is returned only if it was stored with the same 'key', and
+    less than 'ttl' seconds ago. A 'ttl' of 0 disables the cache.
+    """
+
+    if ttl <= 0 or not _trusted(cache_dir()):
+        return None
+
+    try:
+        with open(_cache_path(name)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get('key') != key:
+        return None
+    if time.time() - entry.get('time', 0) >= ttl:
+        return None
+    return entry.get('data')
+
+
+def age(name):
+    """Return the age, in seconds, of the entry 'name', or None if there
+    isn't one."""
+    if not _trusted(cache_dir()):
+        return None
+    try:
+        with open(_cache_path(name)) as f:
+            entry = json.load(f)
+        return max(0.0, time.time() - entry['time'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def store(name, key, data, timestamp=None):
+    """Cache 'data', which must be JSON-serializable, under 'name'.
+
+    'timestamp' is the time the data was fetched, for the purpose of
+    expiring it. It defaults to now.
+
+    Failing to write the cache is not an error: the next run will just
+    have to look the data up again. Neither is finding a cache
+    directory that someone else could have written to: it is left
+    alone.
+    """
+
+    if timestamp is None:
+        timestamp = time.time()
+
+    directory = cache_dir()
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not _trusted(directory):
+            return
+
+        # Write to a temporary file and rename it, so that a concurrent
+        # reader never sees a half-written file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({'key': key, 'time': timestamp, 'data': data}, f)
+            os.replace(tmp_path, _cache_path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def invalidate(name):
+    """Remove the entry 'name' from the cache."""
+    try:
+        os.unlink(_cache_path(name))
+    except OSError:
+        pass
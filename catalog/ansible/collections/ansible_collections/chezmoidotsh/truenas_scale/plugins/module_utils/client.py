@@ -0,0 +1,291 @@
+# Class to handle getting information from TrueNAS by talking to
+# middlewared directly over its websocket API.
+#
+# Unlike 'midclt', which forks a new process, re-imports its Python
+# client and re-authenticates for every single call, this backend opens
+# one connection to middlewared per module run and reuses it for every
+# call() and job().
+#
+# On the NAS itself, the client connects to the local unix socket and
+# is authenticated as root without credentials, exactly like 'midclt'.
+#
+# If the connection is lost (e.g., middlewared restarts), the call that
+# was in flight fails, and the next one opens a new connection. Failed
+# calls aren't retried: middlewared may have run them already.
+
+__metaclass__ = type
+"""
+This module adds support for a persistent middlewared client on TrueNAS.
+"""
+
+import atexit
+import errno
+import json
+import os
+from ..module_utils.exceptions \
+    import MethodNotFoundError as AnsibleMethodNotFoundError
+from ..module_utils.middleware import call_each, normalize_calls
+
+# The client library moved out of middlewared into its own package in
+# recent versions of TrueNAS SCALE. Try the new name first, then fall
+# back on the old one. If neither is there, raise ModuleNotFoundError
+# so that callers can tell that this backend can't work here, the same
+# way Midclt raises FileNotFoundError when 'midclt' is missing.
+try:
+    from truenas_api_client import Client as MWClient
+    from truenas_api_client import ClientException
+except ImportError:
+    try:
+        from middlewared.client import Client as MWClient
+        from middlewared.client import ClientException
+    except ImportError:
+        raise ModuleNotFoundError(
+            "Can't find a middlewared client library "
+            "(truenas_api_client or middlewared.client).")
+
+# Environment variable that can be used to point the client at
+# something other than the default local socket, e.g., a test server:
+#
+#   environment:
+#     middleware_uri: ws+unix:///tmp/fake-middlewared.sock
+MIDDLEWARE_URI_ENV = "middleware_uri"
+
+# Error numbers middlewared uses to say that a method doesn't exist:
+# CallError.ENOMETHOD with the legacy websocket protocol, and the
+# standard "Method not found" code with JSON-RPC 2.0.
+ENOMETHOD_ERRNOS = (201, -32601)
+
+# Error numbers the client library uses to say that the connection was
+# lost, rather than that the call failed.
+CONNECTION_ERRNOS = (errno.ECONNABORTED, errno.ECONNRESET, errno.EPIPE)
+
+# The one connection shared by every Client in this process.
+_connection = None
+_atexit_registered = False
+
+
+def _close_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            # We're exiting anyway.
+            pass
+        _connection = None
+
+
+class Client:
+
+    def __init__(self):
+        """Initialize the client, connecting to middlewared if this
+        process hasn't already done so."""
+
+        self.conn = Client._connect()
+
+    @staticmethod
+    def _connect():
+        """Return the shared middlewared connection, opening it if
+        necessary."""
+
+        global _connection, _atexit_registered
+        if _connection is None:
+            uri = os.environ.get(MIDDLEWARE_URI_ENV)
+            if uri:
+                _connection = MWClient(uri)
+            else:
+                _connection = MWClient()
+            if not _atexit_registered:
+                atexit.register(_close_connection)
+                _atexit_registered = True
+        return _connection
+
+    def _conn(self):
+        """Return the connection for the next call, opening a new one if
+        the last one was lost."""
+
+        if self.conn is None:
+            self.conn = Client._connect()
+        return self.conn
+
+    def _lost(self, conn):
+        """Forget the connection 'conn' after it was lost, so that the
+        next call opens a new one."""
+
+        if self.conn is conn:
+            self.conn = None
+        if _connection is conn:
+            _close_connection()
+
+    @staticmethod
+    def _is_connection_error(e):
+        """Return True if the exception 'e' means that the connection to
+        middlewared was lost, rather than that the call failed."""
+
+        if isinstance(e, ClientException):
+            if getattr(e, 'errno', None) in CONNECTION_ERRNOS:
+                return True
+            errmsg = str(getattr(e, 'error', None) or e).lower()
+            return "connection closed" in errmsg or \
+                "closed connection" in errmsg
+        # Errors from the socket (or websocket) itself.
+        return isinstance(e, OSError) or "Closed" in type(e).__name__
+
+    @staticmethod
+    def _is_method_not_found(e):
+        """Return True if the exception 'e' says that the method we
+        called doesn't exist."""
+
+        if getattr(e, 'errno', None) in ENOMETHOD_ERRNOS:
+            return True
+
+        # Some versions don't set an errno, so fall back on the
+        # message.
+        errmsg = str(getattr(e, 'error', None) or e)
+        return "ENOMETHOD" in errmsg or "Method not found" in errmsg
+
+    @staticmethod
+    def _to_str(value):
+        """Format 'value' the way 'midclt' prints it, for callers that
+        asked for output='str'."""
+
+        # 'midclt' prints strings and ints (including bools) as-is,
+        # and everything else as JSON.
+        if isinstance(value, (str, int)):
+            return str(value)
+        return json.dumps(value)
+
+    def call(self, func, *args, opts=[], output='json', timeout=None):
+        """Call the API function 'func', with arguments 'args'.
+
+        'opts' exists for compatibility with Midclt. The only option
+        that makes sense here is "--job", which is handled by job().
+
+        'output' specifies the format of the return value: "json"
+        returns the decoded result, "str" returns the result formatted
+        as 'midclt' would have printed it.
+
+        'timeout', if given, is the number of seconds to wait for the
+        answer before giving up.
+
+        Return the return value.
+        """
+
+        job = "--job" in opts
+
+        conn = self._conn()
+        try:
+            retval = conn.call(func, *args, job=job,
+                               **Client._timeout(timeout))
+        except Exception as e:
+            if Client._is_connection_error(e):
+                self._lost(conn)
+            if isinstance(e, ClientException):
+                raise Client._exception(func, e)
+            raise
+
+        return Client._format(retval, output)
+
+    @staticmethod
+    def _timeout(timeout):
+        """Return the keyword arguments that pass 'timeout' on to the
+        client library. Leave it out when not set, so that the library
+        uses its own default."""
+
+        return {} if timeout is None else {'timeout': timeout}
+
+    @staticmethod
+    def _exception(func, e):
+        """Return the exception that Midclt would have raised instead of
+        the ClientException 'e', raised while calling 'func'."""
+
+        if Client._is_method_not_found(e):
+            return AnsibleMethodNotFoundError(func, str(e))
+        return Exception(f"middlewared call {func} failed: \"{e}\"")
+
+    @staticmethod
+    def _format(retval, output):
+        """Format the return value of a call according to 'output'."""
+
+        if output == "str":
+            return Client._to_str(retval)
+        elif output != "json":
+            raise Exception(f"Invalid output format {output}")
+        return retval
+
+    def job(self, func, *args, **kwargs):
+        """Run the API function 'func', with arguments 'args', as a job,
+        and wait for it to complete.
+
+        Return the job's result.
+        """
+
+        return self.call(func, *args, opts=["--job"], **kwargs)
+
+    def call_many(self, calls, max_workers=None):
+        """Run each of 'calls', a list of (method, args, opts) tuples.
+
+        All of the requests are written to the connection before waiting
+        for any of the answers, so middlewared processes them in one
+        round trip instead of one round trip per call. They already
+        overlap, so 'max_workers' only matters if the client library
+        can't send calls in the background.
+
+        Return a list of (result, exception) pairs, in the same order as
+        'calls'.
+        """
+
+        calls = normalize_calls(calls)
+        conn = self._conn()
+
+        # Send everything first.
+        pending = []
+        for func, args, opts in calls:
+            job = "--job" in opts.get("opts", [])
+            try:
+                pending.append(conn.call(func, *args, job=job,
+                                         background=True))
+            except TypeError:
+                # This version of the client library can't send a call
+                # in the background. Fall back on one call at a time
+                # for whatever's left.
+                sent = len(pending)
+                return self._wait_all(conn, calls[:sent], pending) + \
+                    call_each(self.call, calls[sent:],
+                              max_workers=max_workers)
+            except Exception as e:
+                pending.append(e)
+
+        return self._wait_all(conn, calls, pending)
+
+    def _wait_all(self, conn, calls, pending):
+        """Wait for the answers to the background calls in 'pending',
+        sent over 'conn'."""
+
+        results = []
+        lost = False
+        for (func, args, opts), c in zip(calls, pending):
+            job = "--job" in opts.get("opts", [])
+            try:
+                if isinstance(c, Exception):
+                    # The call couldn't be sent.
+                    raise c
+                retval = conn.wait(
+                    c, job=job, **Client._timeout(opts.get("timeout")))
+            except Exception as e:
+                lost = lost or Client._is_connection_error(e)
+                if isinstance(e, ClientException):
+                    e = Client._exception(func, e)
+                results.append((None, e))
+                continue
+
+            try:
+                results.append((Client._format(retval,
+                                               opts.get("output", "json")),
+                                None))
+            except Exception as e:
+                results.append((None, e))
+
+        if lost:
+            self._lost(conn)
+        return results
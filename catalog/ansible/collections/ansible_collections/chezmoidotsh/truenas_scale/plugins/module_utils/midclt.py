@@ -23,6 +23,7 @@ import json
 from json.decoder import JSONDecodeError
 from ..module_utils.exceptions \
     import MethodNotFoundError as AnsibleMethodNotFoundError
+from ..module_utils.middleware import call_each
 
 MIDCLT_CMD = "midclt"
 
@@ -78,7 +79,7 @@ class Midclt:
         return json.loads(msg)
 
     @staticmethod
-    def call(func, *args, opts=[], output='json'):
+    def call(func, *args, opts=[], output='json', timeout=None):
         """Call the API function 'func', with arguments 'args'.
 
         'opts' are additional options passed to 'midclt call', not to
@@ -88,6 +89,9 @@ class Midclt:
         most commands output JSON, but some print strings. Allowed
         values are: "json", "str".
 
+        'timeout', if given, is the number of seconds after which
+        'midclt' is killed and the call fails.
+
         Return the status and return value.
         """
 
@@ -104,7 +108,10 @@ class Midclt:
         # Run 'midclt' and get its output.
         try:
             mid_out = subprocess.check_output(mid_args,
-                                              stderr=subprocess.STDOUT)
+                                              stderr=subprocess.STDOUT,
+                                              timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise Exception(f"{MIDCLT_CMD} call {func} timed out after {timeout} seconds")
         except subprocess.CalledProcessError as e:
             # Exited with a non-zero code
 
@@ -177,3 +184,18 @@ class Midclt:
             raise
 
         return retval
+
+    @staticmethod
+    def call_many(calls, max_workers=None):
+        """Run each of 'calls', a list of (method, args, opts) tuples.
+
+        'midclt' can only run one method per process. With
+        'max_workers' greater than 1, up to that many 'midclt'
+        processes run at the same time; otherwise the calls are made
+        one after the other.
+
+        Return a list of (result, exception) pairs, in the same order as
+        'calls'.
+        """
+
+        return call_each(Midclt.call, calls, max_workers=max_workers)
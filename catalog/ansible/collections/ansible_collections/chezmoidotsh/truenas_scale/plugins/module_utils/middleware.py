@@ -12,6 +12,89 @@
 # XXX - 'exceptions.py' has exceptions to use when thing fail. Use
 # that instead of generic Exceptions.
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Environment variable used to select the access method.
+MIDDLEWARE_METHOD_ENV = "middleware_method"
+
+# Environment variable giving the default number of calls call_many()
+# may run at the same time. The default, 1, runs them one at a time.
+MIDDLEWARE_MAX_WORKERS_ENV = "middleware_max_workers"
+
+# Upper bound on the number of concurrent calls, so that a typo in the
+# play doesn't fork hundreds of 'midclt' processes on the NAS.
+MAX_WORKERS_LIMIT = 16
+
+
+def normalize_calls(calls):
+    """Normalize a list of calls for call_many().
+
+    Each call is a tuple (method, args, opts), where 'args' is a list
+    of arguments to the method and 'opts' a dict of keyword arguments
+    to call(), e.g. {"output": "str"} or {"timeout": 10}. 'args' and
+    'opts' may be omitted.
+
+    Return a list of (method, args, opts) triples.
+    """
+
+    normalized = []
+    for call in calls:
+        if isinstance(call, str):
+            call = (call,)
+        func = call[0]
+        args = list(call[1]) if len(call) > 1 and call[1] is not None else []
+        opts = dict(call[2]) if len(call) > 2 and call[2] is not None else {}
+        normalized.append((func, args, opts))
+    return normalized
+
+
+def max_workers_from_env():
+    """Return the default number of concurrent calls, from the
+    environment."""
+
+    try:
+        max_workers = int(os.environ.get(MIDDLEWARE_MAX_WORKERS_ENV, 1))
+    except ValueError:
+        max_workers = 1
+    return max(1, min(max_workers, MAX_WORKERS_LIMIT))
+
+
+def call_each(call, calls, max_workers=None):
+    """Run each of 'calls' through the function 'call'.
+
+    If 'max_workers' is greater than 1, up to that many calls are run
+    at the same time in a pool of threads. Otherwise, they are run one
+    after the other. If 'max_workers' is None, the default is taken
+    from the environment; see max_workers_from_env().
+
+    Return a list of (result, exception) pairs, in the same order as
+    'calls'. Exactly one of the two is None.
+    """
+
+    def run(func, args, opts):
+        try:
+            return (call(func, *args, **opts), None)
+        except Exception as e:
+            return (None, e)
+
+    calls = normalize_calls(calls)
+    if max_workers is None:
+        max_workers = max_workers_from_env()
+    max_workers = max(1, min(max_workers, MAX_WORKERS_LIMIT, len(calls)))
+
+    if max_workers == 1:
+        return [run(func, args, opts) for func, args, opts in calls]
+
+    # Each call either blocks on its own 'midclt' process or on the
+    # network, so threads are enough to overlap them. Collecting the
+    # futures in submission order keeps the results in the same order
+    # as 'calls'.
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run, func, args, opts)
+                   for func, args, opts in calls]
+        return [f.result() for f in futures]
+
 
 class MiddleWare:
     def __init__(self):
@@ -34,23 +117,31 @@ class MiddleWare:
         # variable, which can be passed in the play, e.g.:
         #
         # - hosts: my-nas
-        #   collections: arensb.truenas
+        #   collections: chezmoidotsh.truenas_scale
         #   environment:
         #     middleware_method: client
         #   tasks:
         #     ...
-
-        # Force midclt usage - TrueNAS Scale compatibility
-        # Client method removed for this fork
+        #
+        # "midclt" (the default) forks 'midclt' for every call.
+        # "client" keeps one connection to middlewared open for the
+        # whole module run.
+        method = os.environ.get(MIDDLEWARE_METHOD_ENV, "midclt")
 
         # We import here, rather than at the top of the code, because
         # at least in theory, the desired module might not exist on
         # the remote host.
-        from ..module_utils.midclt \
-            import Midclt
-        return Midclt
+        if method == "client":
+            from ..module_utils.client \
+                import Client
+            return Client
+        elif method == "midclt":
+            from ..module_utils.midclt \
+                import Midclt
+            return Midclt
 
-        # Should never get this far.
+        raise ValueError(f"Unknown {MIDDLEWARE_METHOD_ENV} {method!r}. "
+                         "Must be one of: midclt, client.")
 
     def call(self, func, *args, **kwargs):
         return self.client.call(func, *args, **kwargs)
@@ -58,6 +149,24 @@ class MiddleWare:
     def job(self, func, *args, **kwargs):
         return self.client.job(func, *args, **kwargs)
 
+    def call_many(self, calls, max_workers=None):
+        """Run several independent calls at once.
+
+        'calls' is a list of (method, args, opts) tuples; see
+        normalize_calls(). The backend sends them in as few round trips
+        as it can.
+
+        'max_workers' is the maximum number of calls to run at the same
+        time, for backends that can only run one call per round trip.
+        It defaults to the 'middleware_max_workers' environment
+        variable, or 1 (one call at a time).
+
+        Return a list of (result, exception) pairs, in the same order as
+        'calls'. A failing call doesn't stop the others: its exception
+        (e.g., MethodNotFoundError) is returned in its slot instead.
+        """
+        return self.client.call_many(calls, max_workers=max_workers)
+
     @classmethod
     def client(cls):
         """Return a client for interfacing with middlewared."""
@@ -0,0 +1,208 @@
+# Lookup layer for NFS exports.
+#
+# Exports can only be queried efficiently by a scalar field, e.g.,
+#
+#   sharing.nfs.query [["comment", "=", "Home export"]]
+#
+# but before TrueNAS SCALE 22.12.2, an export had a 'paths' array
+# rather than a single 'path', and there's no good way to ask
+# middlewared for "the export that has this directory in 'paths'".
+# So this fetches every export with a single sharing.nfs.query, and
+# indexes the result by path (for both 'path' and 'paths') and by
+# comment. There are rarely more than a few dozen exports, so this is
+# also cheaper than one filtered query per lookup when reconciling
+# several of them.
+#
+# The list of exports goes through the query cache (see
+# query_cache.py), so later tasks can reuse it when that's enabled.
+
+__metaclass__ = type
+
+from ..module_utils.query_cache import QueryCache
+
+
+def export_paths(export):
+    """Return the list of directories exported by 'export'."""
+    if export.get('path') is not None:
+        return [export['path']]
+    return list(export.get('paths') or [])
+
+
+class NFSExports:
+    """Index of all NFS exports on the host."""
+
+    def __init__(self, mw):
+        self.mw = mw
+        self.cache = QueryCache(mw, "sharing.nfs.query", "id")
+        self._by_id = None
+
+    def _load(self):
+        if self._by_id is None:
+            self._by_id = {}
+            self._by_path = {}
+            self._by_comment = {}
+            for export in self.cache.all():
+                self._add(export)
+        return self._by_id
+
+    def _add(self, export):
+        self._by_id[export['id']] = export
+        for path in export_paths(export):
+            self._by_path[path] = export
+        # Comments need not be unique. Keep the first one, which is
+        # what a filtered query would have returned.
+        self._by_comment.setdefault(export.get('comment'), export)
+
+    def _rebuild(self):
+        exports = list(self._by_id.values())
+        self._by_id = {}
+        self._by_path = {}
+        self._by_comment = {}
+        for export in exports:
+            self._add(export)
+
+    def all(self):
+        """Return the list of all exports."""
+        return list(self._load().values())
+
+    def by_path(self, path):
+        """Return the export that exports the directory 'path', or None."""
+        self._load()
+        return self._by_path.get(path)
+
+    def by_comment(self, comment):
+        """Return the (first) export whose comment is 'comment', or
+        None."""
+        self._load()
+        return self._by_comment.get(comment)
+
+    def update(self, export):
+        """Record that 'export' was created or updated.
+
+        'export' must be the full export, as returned by
+        sharing.nfs.query, sharing.nfs.create or sharing.nfs.update.
+        """
+
+        self._load()[export['id']] = export
+        self._rebuild()
+        self.cache.update(export)
+
+    def update_many(self, exports):
+        """Record that each of 'exports' was created or updated."""
+
+        index = self._load()
+        for export in exports:
+            index[export['id']] = export
+        self._rebuild()
+        self.cache.update_many(exports)
+
+    def invalidate(self):
+        """Forget all exports, e.g., after a change whose result isn't
+        known."""
+
+        self._by_id = None
+        self.cache.invalidate()
+
+    def remove(self, export_id):
+        """Record that the export with ID 'export_id' was deleted."""
+
+        self._load().pop(export_id, None)
+        self._rebuild()
+        self.cache.remove(export_id)
+
+
+# Options of an export, for the path-based API used by TrueNAS SCALE
+# 22.12.2 and later. Each option maps onto the middleware field of the
+# same name, except as listed in EXPORT_FIELDS.
+EXPORT_OPTIONS = [
+    'alldirs',
+    'quiet',
+    'enabled',
+    'readonly',
+    'maproot_user',
+    'maproot_group',
+    'mapall_user',
+    'mapall_group',
+    'networks',
+    'hosts',
+]
+
+EXPORT_FIELDS = {
+    'readonly': 'ro',
+}
+
+# maproot_* and mapall_* are mutually exclusive: when setting one, the
+# other one must be unset.
+EXCLUSIVE_FIELDS = {
+    'maproot_user': 'mapall_user',
+    'mapall_user': 'maproot_user',
+    'maproot_group': 'mapall_group',
+    'mapall_group': 'maproot_group',
+}
+
+
+def export_argument_spec():
+    """Return the argument spec for the options of one export, for the
+    path-based API."""
+
+    return dict(
+        name=dict(type='str', aliases=['comment']),
+        path=dict(type='str', required=True),
+        state=dict(type='str', default='present',
+                   choices=['absent', 'present']),
+        alldirs=dict(type='bool'),
+        quiet=dict(type='bool'),
+        enabled=dict(type='bool'),
+        readonly=dict(type='bool'),
+        maproot_user=dict(type='str'),
+        maproot_group=dict(type='str'),
+        mapall_user=dict(type='str'),
+        mapall_group=dict(type='str'),
+        networks=dict(type='list', elements='str'),
+        hosts=dict(type='list', elements='str'),
+    )
+
+
+def create_args(params):
+    """Return the arguments to sharing.nfs.create() for the export
+    described by 'params'."""
+
+    arg = {
+        "comment": params['name'],
+        "path": params['path'],
+    }
+    for opt in EXPORT_OPTIONS:
+        if params[opt] is not None:
+            arg[EXPORT_FIELDS.get(opt, opt)] = params[opt]
+    return arg
+
+
+def update_args(params, export_info):
+    """Return the arguments to sharing.nfs.update() needed to make the
+    existing export 'export_info' match 'params'. An empty dict means
+    that nothing needs to change."""
+
+    arg = {}
+
+    if params['name'] is not None and export_info['comment'] != params['name']:
+        arg['comment'] = params['name']
+
+    for opt in EXPORT_OPTIONS:
+        want = params[opt]
+        if want is None:
+            continue
+        field = EXPORT_FIELDS.get(opt, opt)
+
+        if opt in ('networks', 'hosts'):
+            # Order doesn't matter.
+            if set(want) != set(export_info[field]):
+                arg[field] = want
+            continue
+
+        if export_info[field] != want:
+            arg[field] = want
+            other = EXCLUSIVE_FIELDS.get(field)
+            if other is not None and export_info[other] is not None:
+                arg[other] = None
+
+    return arg
@@ -0,0 +1,193 @@
+# Read-through cache for middlewared *.query methods.
+#
+# A playbook that manages hundreds of datasets, users or shares runs
+# one task per object, and each task starts by looking its object up
+# with something like
+#
+#   pool.dataset.query [["name", "=", "pool/some/dataset"]]
+#
+# which is a full middleware round trip. When the cache is enabled,
+# the first lookup fetches every object with a single unfiltered
+# query, indexes the result by one field (e.g., "name"), and writes it
+# to the on-host cache (see cache.py). Subsequent lookups, in this task
+# or in later ones, are served from that index.
+#
+# Modules that create, update or delete objects must patch the cache
+# (update() or remove()) or drop it (invalidate()), so that later tasks
+# don't see stale data. Changes made behind Ansible's back, e.g., in
+# the web UI, are only noticed once the snapshot expires, which is why
+# the cache is opt-in and short-lived:
+#
+#   environment:
+#     truenas_query_cache: true
+#     truenas_query_cache_ttl: 300
+#
+# When the cache is disabled, lookups are sent to middlewared as
+# filtered queries, exactly as before. Query options (see QueryCache)
+# only apply to the unfiltered query that fills the cache.
+
+import hashlib
+import json
+import os
+import time
+from ..module_utils import cache
+
+QUERY_CACHE_ENV = "truenas_query_cache"
+QUERY_CACHE_TTL_ENV = "truenas_query_cache_ttl"
+QUERY_CACHE_TTL_DEFAULT = 300
+
+
+def enabled():
+    """Return True if the query cache was enabled in the environment."""
+    return os.environ.get(QUERY_CACHE_ENV, "").lower() in \
+        ("1", "true", "yes", "on")
+
+
+def ttl():
+    """Return the lifetime of a query snapshot, in seconds."""
+    try:
+        return int(os.environ.get(QUERY_CACHE_TTL_ENV,
+                                  QUERY_CACHE_TTL_DEFAULT))
+    except ValueError:
+        return QUERY_CACHE_TTL_DEFAULT
+
+
+class QueryCache:
+    """Look up objects returned by the middleware method 'method' by
+    the value of their 'field' field.
+
+    'options' are the query options passed to the unfiltered query
+    that fills the cache, e.g., to leave out children that aren't
+    needed. Filtered lookups don't use them. Snapshots fetched with
+    different options are cached separately.
+    """
+
+    def __init__(self, mw, method, field, options=None):
+        self.mw = mw
+        self.method = method
+        self.field = field
+        self.options = options
+        self.enabled = enabled()
+        self.name = f"query-{method}-{field}"
+        if options is not None:
+            digest = hashlib.sha256(
+                json.dumps(options, sort_keys=True).encode()).hexdigest()
+            self.name += f"-{digest[:12]}"
+        self.key = cache.boot_id() or ""
+        self._index = None
+        self._fetched = None
+
+    @staticmethod
+    def _key(value):
+        # The snapshot is stored as JSON, which only has string keys, so
+        # index everything by string, e.g., "12" for an ID of 12.
+        return str(value)
+
+    def _query(self, filters, options=None):
+        if options is None:
+            return self.mw.call(self.method, filters)
+        return self.mw.call(self.method, filters, options)
+
+    def _load(self):
+        """Return the index of all objects, loading or fetching it if
+        necessary."""
+
+        if self._index is None:
+            snapshot = cache.load(self.name, self.key, ttl())
+            if snapshot is None:
+                snapshot = {'fetched': time.time(), 'objects': {}}
+                for obj in self._query([], self.options):
+                    snapshot['objects'][self._key(obj[self.field])] = obj
+                cache.store(self.name, self.key, snapshot)
+            self._index = snapshot['objects']
+            self._fetched = snapshot['fetched']
+        return self._index
+
+    def _save(self):
+        # Keep the time of the original query, so that patching the
+        # snapshot doesn't extend its lifetime.
+        cache.store(self.name, self.key,
+                    {'fetched': self._fetched, 'objects': self._index},
+                    timestamp=self._fetched)
+
+    def get(self, value):
+        """Return the object whose field is 'value', or None."""
+
+        if not self.enabled:
+            found = self._query([[self.field, "=", value]])
+            return found[0] if found else None
+        return self._load().get(self._key(value))
+
+    def get_many(self, values):
+        """Return the list of objects whose field is in 'values'."""
+
+        if not self.enabled:
+            return self._query([[self.field, "in", list(values)]])
+        index = self._load()
+        keys = [self._key(v) for v in values]
+        return [index[k] for k in keys if k in index]
+
+    def all(self):
+        """Return the list of all objects."""
+
+        if not self.enabled:
+            return self._query([])
+        return list(self._load().values())
+
+    def update(self, obj):
+        """Record that 'obj' was created or updated.
+
+        'obj' must be the full object, as returned by the query method.
+        """
+
+        if not self.enabled:
+            return
+        self._load()[self._key(obj[self.field])] = obj
+        self._save()
+
+    def update_many(self, objs):
+        """Record that each of 'objs' was created or updated, writing the
+        snapshot only once."""
+
+        if not self.enabled or not objs:
+            return
+        index = self._load()
+        for obj in objs:
+            index[self._key(obj[self.field])] = obj
+        self._save()
+
+    def refresh(self, value):
+        """Fetch the object whose field is 'value' from middlewared
+        again, after a create or update method that doesn't return the
+        full object.
+
+        The change has already been made, so failing to fetch the
+        object isn't an error: the snapshot is dropped instead, and the
+        next lookup fetches everything again.
+        """
+
+        if not self.enabled:
+            return
+        try:
+            found = self._query([[self.field, "=", value]])
+            if found:
+                self.update(found[0])
+            else:
+                self.remove(value)
+        except Exception:
+            self.invalidate()
+
+    def remove(self, value):
+        """Record that the object whose field is 'value' was deleted."""
+
+        if not self.enabled:
+            return
+        self._load().pop(self._key(value), None)
+        self._save()
+
+    def invalidate(self):
+        """Drop the whole snapshot, e.g., after a change that may have
+        affected several objects."""
+
+        self._index = None
+        cache.invalidate(self.name)
@@ -1,8 +1,10 @@
 # Common utility functions.
 # Code that it'd be nice to have in Ansible's 'setup' module.
 
+import os
 import re
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils import cache
 # For parsing version numbers
 from packaging import version
 
@@ -10,6 +12,14 @@ from packaging import version
 # middlewared.
 tn_version = None
 
+# Name of the on-host cache entry for tn_version, and the environment
+# variable giving its time-to-live in seconds (0 disables it). The
+# entry is keyed on the boot ID, so it is dropped on reboot, and
+# therefore on upgrade, regardless of the TTL.
+TN_VERSION_CACHE = "tn_version"
+TN_VERSION_CACHE_TTL_ENV = "truenas_version_cache_ttl"
+TN_VERSION_CACHE_TTL_DEFAULT = 86400
+
 
 def validate_truenas_scale(module=None, min_version="22.02"):
     """
@@ -70,7 +80,35 @@ def get_tn_version():
     if tn_version is not None:
         return tn_version
 
-    mw = MW.client()
+    # Otherwise, see whether an earlier task already looked it up since
+    # the last boot.
+    mw = None
+    boot_id = cache.boot_id()
+    if boot_id is None:
+        mw = MW.client()
+        try:
+            boot_id = mw.call("system.boot_id", output='str')
+        except Exception:
+            # Not worth failing over: just don't use the cache.
+            boot_id = None
+
+    if boot_id is not None:
+        cached = cache.load(TN_VERSION_CACHE, boot_id, _tn_version_cache_ttl())
+        if cached is not None:
+            try:
+                tn_version = {
+                    "name": cached["name"],
+                    "type": cached["type"],
+                    "version": version.parse(cached["version"]),
+                }
+                return tn_version
+            except (KeyError, TypeError, ValueError):
+                # A malformed entry: look the version up again, and
+                # overwrite it.
+                tn_version = None
+
+    if mw is None:
+        mw = MW.client()
 
     product_name = None
     product_type = None
@@ -122,4 +160,20 @@ def get_tn_version():
         "version": sys_version,
     }
 
+    if boot_id is not None:
+        cache.store(TN_VERSION_CACHE, boot_id, {
+            "name": product_name,
+            "type": product_type,
+            "version": str(sys_version),
+        })
+
     return tn_version
+
+
+def _tn_version_cache_ttl():
+    """Return the TTL of the tn_version cache entry, in seconds."""
+    try:
+        return int(os.environ.get(TN_VERSION_CACHE_TTL_ENV,
+                                  TN_VERSION_CACHE_TTL_DEFAULT))
+    except ValueError:
+        return TN_VERSION_CACHE_TTL_DEFAULT
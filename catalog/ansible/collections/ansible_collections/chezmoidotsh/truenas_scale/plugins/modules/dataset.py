@@ -215,129 +215,18 @@ dataset:
 
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
 from ..module_utils import setup
-
-
-# Valid recordsize values and their byte equivalents
-RECORDSIZE_VALUES = {
-    "512": 512,
-    "1K": 1024,
-    "2K": 2 * 1024,
-    "4K": 4 * 1024,
-    "8K": 8 * 1024,
-    "16K": 16 * 1024,
-    "32K": 32 * 1024,
-    "64K": 64 * 1024,
-    "128K": 128 * 1024,
-    "256K": 256 * 1024,
-    "512K": 512 * 1024,
-    "1M": 1024 * 1024,
-    "16M": 16 * 1024 * 1024,
-}
-
-
-def recordsize_to_bytes(value):
-    """Convert recordsize display value to bytes."""
-    if not value:
-        return None
-    return RECORDSIZE_VALUES.get(str(value).upper())
-
-
-def bytes_to_recordsize(byte_value):
-    """Convert bytes to recordsize display value."""
-    if not byte_value:
-        return None
-    try:
-        target_bytes = int(byte_value)
-        for display, bytes_val in RECORDSIZE_VALUES.items():
-            if bytes_val == target_bytes:
-                return display
-    except (ValueError, TypeError):
-        pass
-    return None
-
-
-def compare_recordsize(desired_val, current_raw):
-    """Compare desired recordsize with TrueNAS raw value."""
-    if not desired_val and not current_raw:
-        return True
-    if not desired_val or not current_raw:
-        return False
-    
-    # Direct string match (case insensitive)
-    if str(desired_val).upper() == str(current_raw).upper():
-        return True
-    
-    # Convert both to bytes and compare
-    desired_bytes = recordsize_to_bytes(desired_val)
-    try:
-        current_bytes = int(current_raw)
-        return desired_bytes == current_bytes
-    except (ValueError, TypeError):
-        pass
-    
-    return False
+from ..module_utils.dataset_props import (
+    build_create_args,
+    build_update_args,
+    dataset_argument_spec,
+)
 
 
 def main():
 
-    argument_spec = dict(
-        name=dict(type="str", required=True),
-        state=dict(type="str", choices=["absent", "present"], default="present"),
-        create_ancestors=dict(type="bool", default=False),
-        comments=dict(type="str"),
-        sync=dict(type="str", choices=["standard", "always", "disabled"]),
-        snapdev=dict(type="str", choices=["hidden", "visible"]),
-        compression=dict(type="str", choices=[
-            "off", "lz4", "gzip", "gzip-1", "gzip-2", "gzip-3", "gzip-4", 
-            "gzip-5", "gzip-6", "gzip-7", "gzip-8", "gzip-9", "zstd", 
-            "zstd-fast", "lzjb"
-        ]),
-        atime=dict(type="str", choices=["on", "off"]),
-        exec=dict(type="str", choices=["on", "off"]),
-        managedby=dict(type="str"),
-        quota=dict(type="int"),
-        quota_warning=dict(type="str"),
-        quota_critical=dict(type="str"),
-        refquota=dict(type="int"),
-        refquota_warning=dict(type="str"),
-        refquota_critical=dict(type="str"),
-        reservation=dict(type="int"),
-        refreservation=dict(type="int"),
-        special_small_block_size=dict(type="str"),
-        copies=dict(type="str", choices=["1", "2", "3"]),
-        snapdir=dict(type="str", choices=["hidden", "visible"]),
-        deduplication=dict(type="str", choices=[
-            "on", "off", "verify", "sha256", "sha512", "skein", "edonr"
-        ]),
-        checksum=dict(type="str", choices=[
-            "on", "off", "fletcher2", "fletcher4", "sha256", "sha512", "skein", "edonr"
-        ]),
-        readonly=dict(type="str", choices=["on", "off"]),
-        recordsize=dict(type="str", choices=list(RECORDSIZE_VALUES.keys())),
-        aclmode=dict(type="str", choices=["discard", "groupmask", "passthrough", "restricted"]),
-        acltype=dict(type="str", choices=["off", "nfsv4", "posix"]),
-        xattr=dict(type="str", choices=["on", "off", "sa"]),
-        user_properties=dict(
-            type="list",
-            elements="dict",
-            default=[],
-            options=dict(
-                key=dict(type="str", required=True),
-                value=dict(type="str", required=True),
-            ),
-        ),
-        user_properties_update=dict(
-            type="list",
-            elements="dict",
-            default=[],
-            options=dict(
-                key=dict(type="str", required=True),
-                value=dict(type="str"),
-                remove=dict(type="bool"),
-            ),
-        ),
-    )
+    argument_spec = dataset_argument_spec()
 
     module = AnsibleModule(
         argument_spec=argument_spec,
@@ -355,16 +244,13 @@ def main():
     state = p["state"]
 
     # Query if it exists
+    datasets = QueryCache(mw, "pool.dataset.query", "name",
+                          {"extra": {"retrieve_children": False}})
     try:
-        existing = mw.call("pool.dataset.query", [["name", "=", ds_name]])
+        existing_ds = datasets.get(ds_name)
     except Exception as e:
         module.fail_json(msg=f"Failed to query dataset '{ds_name}': {e}")
 
-    if existing:
-        existing_ds = existing[0]
-    else:
-        existing_ds = None
-
     if state == "absent":
         # If not found, no changes
         if not existing_ds:
@@ -376,6 +262,8 @@ def main():
             module.exit_json(changed=True, msg=f"Would delete dataset '{ds_name}'.")
         try:
             mw.call("pool.dataset.delete", ds_name, {"recursive": True})
+            # Children are gone too, so drop the whole snapshot.
+            datasets.invalidate()
             module.exit_json(changed=True, msg=f"Deleted dataset '{ds_name}'.")
         except Exception as e:
             module.fail_json(msg=f"Error deleting dataset '{ds_name}': {e}")
@@ -391,6 +279,11 @@ def main():
                 )
             try:
                 new_ds = mw.call("pool.dataset.create", create_args)
+                if create_args.get("create_ancestors"):
+                    # Missing ancestors may have been created as well.
+                    datasets.invalidate()
+                else:
+                    datasets.update(new_ds)
                 result["changed"] = True
                 result["filesystem"] = new_ds
                 result["msg"] = f"Created dataset '{ds_name}'."
@@ -414,6 +307,7 @@ def main():
                     )
                 try:
                     updated_ds = mw.call("pool.dataset.update", ds_name, update_args)
+                    datasets.update(updated_ds)
                     result["changed"] = True
                     result["filesystem"] = updated_ds
                     result["msg"] = f"Updated dataset '{ds_name}'."
@@ -422,180 +316,5 @@ def main():
                     module.fail_json(msg=f"Error updating dataset '{ds_name}': {e}")
 
 
-def build_create_args(params, module, tn_version):
-    # Always create FILESYSTEM type datasets
-    create_args = dict(name=params["name"], type="FILESYSTEM")
-
-    if params.get("create_ancestors") is not None:
-        if tn_version['type'] == "CORE":
-            # TrueNAS CORE doesn't support create_ancestors.
-            module.warn("TrueNAS CORE doesn't support create_ancestors option.")
-        else:
-            create_args["create_ancestors"] = params["create_ancestors"]
-
-    # All filesystem properties are optional
-    create_props = [
-        "comments",
-        "sync",
-        "snapdev",
-        "compression",
-        "atime",
-        "exec",
-        "managedby",
-        "quota",
-        "quota_warning",
-        "quota_critical",
-        "refquota",
-        "refquota_warning",
-        "refquota_critical",
-        "reservation",
-        "refreservation",
-        "special_small_block_size",
-        "copies",
-        "snapdir",
-        "deduplication",
-        "checksum",
-        "readonly",
-        "recordsize",
-        "aclmode",
-        "acltype",
-        "xattr",
-    ]
-    for prop in create_props:
-        val = params.get(prop)
-        if val is not None:
-            create_args[prop] = val
-
-    # user_properties
-    if params.get("user_properties"):
-        create_args["user_properties"] = params["user_properties"]
-
-    return create_args
-
-
-def build_update_args(params, existing_ds, module):
-    update_args = {}
-    ds_type = existing_ds["type"]  # Should be "FILESYSTEM" only
-
-    # Ensure we're only working with filesystem datasets
-    if ds_type != "FILESYSTEM":
-        module.fail_json(
-            msg=f"This module only handles FILESYSTEM datasets. Found type: {ds_type}. Use the zvol module for VOLUME datasets."
-        )
-
-    # For filesystem properties
-    updatable_props = [
-        "comments",
-        "sync",
-        "snapdev",
-        "compression",
-        "atime",
-        "exec",
-        "managedby",
-        "quota",
-        "quota_warning",
-        "quota_critical",
-        "refquota",
-        "refquota_warning",
-        "refquota_critical",
-        "reservation",
-        "refreservation",
-        "special_small_block_size",
-        "copies",
-        "snapdir",
-        "deduplication",
-        "checksum",
-        "readonly",
-        "recordsize",
-        "aclmode",
-        "acltype",
-        "xattr",
-    ]
-    for prop in updatable_props:
-        if params.get(prop) is None:
-            continue
-        desired_val = params[prop]
-        current_val = prop_rawvalue(existing_ds, prop)
-        if not compare_prop(prop, desired_val, current_val):
-            update_args[prop] = desired_val
-
-    # user_properties (bulk set)
-    if params.get("user_properties"):
-        if params["user_properties"]:
-            update_args["user_properties"] = params["user_properties"]
-
-    # user_properties_update
-    if params.get("user_properties_update"):
-        ups = []
-        for item in params["user_properties_update"]:
-            up = {"key": item["key"]}
-            if item.get("remove"):
-                up["remove"] = True
-            elif item.get("value") is not None:
-                up["value"] = item["value"]
-            ups.append(up)
-        if ups:
-            update_args["user_properties_update"] = ups
-
-    return update_args
-
-
-def prop_rawvalue(dataset_entry, prop_name):
-    """
-    Retrieve the 'rawvalue' from dataset_entry[prop_name].
-    Return string or None if missing. We also strip() whitespace for safety.
-    """
-    if prop_name in dataset_entry:
-        d = dataset_entry[prop_name]
-        if isinstance(d, dict):
-            rv = d.get("rawvalue")
-            if rv is not None:
-                return rv.strip()
-    return None
-
-
-def compare_prop(prop_name, desired_val, current_str):
-    """
-    Compare desired_val (from user) vs. current_str (from dataset's rawvalue)
-    in a way that avoids spurious changes (case, etc.).
-    Return True if effectively the same, False if different.
-    """
-    if current_str is None and desired_val is None:
-        return True
-    
-    # Special handling for recordsize
-    if prop_name == "recordsize":
-        return compare_recordsize(desired_val, current_str)
-    
-    desired_str = str(desired_val).strip()
-    if current_str is None:
-        current_str = ""
-
-    # known enumerations for case-insensitive compare
-    lower_enums = {
-        "on",
-        "off",
-        "inherit",
-        "standard",
-        "always",
-        "disabled",
-        "visible",
-        "hidden",
-        "lz4",
-        "zstd",
-        "nfsv4",
-        "posix",
-        "restricted",
-        "passthrough",
-        "discard",
-        "verify",
-    }
-    if desired_str.lower() in lower_enums or current_str.lower() in lower_enums:
-        return desired_str.lower() == current_str.lower()
-
-    # otherwise direct string compare
-    return desired_str == current_str
-
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,299 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: datasets
+short_description: Manage many ZFS filesystem datasets in one task
+description:
+  - Create, update, and delete a list of ZFS filesystem datasets on TrueNAS
+    using the middleware API.
+  - This is the bulk version of the M(chezmoidotsh.truenas_scale.dataset)
+    module. Each element of O(datasets) takes the same options as that
+    module, and is reconciled the same way.
+  - All of the datasets are looked up with a single middleware query, and
+    the changes are computed before any of them is applied. Parent datasets
+    are created before their children, and independent changes are sent
+    to middlewared together.
+  - This module handles only FILESYSTEM type datasets.
+options:
+  datasets:
+    description:
+      - List of datasets to manage.
+      - Each element takes the options of the
+        M(chezmoidotsh.truenas_scale.dataset) module, including C(name),
+        C(state) and C(create_ancestors).
+      - A dataset may appear only once in the list.
+    type: list
+    elements: dict
+    required: true
+seealso:
+  - module: chezmoidotsh.truenas_scale.dataset
+"""
+
+EXAMPLES = r"""
+- name: Lay out the datasets of a pool
+  datasets:
+    datasets:
+      - name: tank/media
+        compression: lz4
+        recordsize: 1M
+      - name: tank/media/movies
+        comments: "Movies"
+      - name: tank/media/music
+        comments: "Music"
+      - name: tank/old-stuff
+        state: absent
+
+- name: Manage datasets from inventory
+  datasets:
+    datasets: "{{ truenas_datasets }}"
+"""
+
+RETURN = r"""
+datasets:
+  description:
+    - What was done, or would be done in check mode, to each dataset, in
+      the same order as the O(datasets) option.
+  type: list
+  elements: dict
+  returned: always
+  contains:
+    name:
+      description: Name of the dataset.
+      type: str
+    action:
+      description: One of C(create), C(update), C(delete) or C(none).
+      type: str
+    before:
+      description:
+        - The properties that were changed, with their old raw values.
+        - Empty for datasets that were created.
+      type: dict
+    after:
+      description:
+        - The properties that were changed, with their new values, as
+          sent to middlewared.
+        - Empty for datasets that were deleted.
+      type: dict
+    error:
+      description: Error message, if the change failed.
+      type: str
+      returned: on error
+"""
+
+from ansible.module_utils.basic import AnsibleModule
+from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
+from ..module_utils import setup
+from ..module_utils.dataset_props import (
+    build_create_args,
+    build_update_args,
+    dataset_argument_spec,
+    prop_rawvalue,
+)
+
+
+def depth(ds_name):
+    """Return the depth of a dataset: 0 for the root dataset of a pool."""
+    return ds_name.count("/")
+
+
+def ancestors(ds_name):
+    """Return the names of the ancestors of a dataset, nearest first."""
+    parts = ds_name.split("/")
+    return ["/".join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            datasets=dict(
+                type="list",
+                elements="dict",
+                required=True,
+                options=dataset_argument_spec(),
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    # Validate TrueNAS Scale environment
+    tn_version = setup.validate_truenas_scale(module)
+
+    specs = module.params["datasets"]
+    names = [spec["name"] for spec in specs]
+
+    seen = set()
+    duplicates = set()
+    for ds_name in names:
+        if ds_name in seen:
+            duplicates.add(ds_name)
+        seen.add(ds_name)
+    if duplicates:
+        module.fail_json(
+            msg=f"Datasets listed more than once: "
+                f"{', '.join(sorted(duplicates))}"
+        )
+
+    mw = MW.client()
+
+    # Look up every dataset in the list at once.
+    datasets = QueryCache(mw, "pool.dataset.query", "name",
+                          {"extra": {"retrieve_children": False}})
+    try:
+        existing = {ds["name"]: ds for ds in datasets.get_many(names)}
+    except Exception as e:
+        module.fail_json(msg=f"Failed to query datasets: {e}")
+
+    # Work out what needs to be done to each dataset, before changing
+    # anything. build_update_args() fails the module if a dataset isn't
+    # a filesystem, so nothing is applied in that case.
+    results = {}
+    creates = []
+    updates = []
+    deletes = []
+    for spec in specs:
+        ds_name = spec["name"]
+        existing_ds = existing.get(ds_name)
+        result = dict(name=ds_name, action="none", before={}, after={})
+        results[ds_name] = result
+
+        if spec["state"] == "absent":
+            if existing_ds:
+                result["action"] = "delete"
+                result["before"] = dict(name=ds_name)
+                deletes.append(ds_name)
+        elif not existing_ds:
+            create_args = build_create_args(spec, module, tn_version)
+            result["action"] = "create"
+            result["after"] = create_args
+            creates.append(create_args)
+        else:
+            update_args = build_update_args(spec, existing_ds, module)
+            if update_args:
+                result["action"] = "update"
+                result["before"] = {
+                    prop: prop_rawvalue(existing_ds, prop)
+                    for prop in update_args
+                    if prop in existing_ds
+                }
+                result["after"] = update_args
+                updates.append((ds_name, update_args))
+
+    changed = bool(creates or updates or deletes)
+
+    if module.check_mode or not changed:
+        module.exit_json(
+            changed=changed,
+            datasets=[results[n] for n in names],
+            diff=make_diff(results, names),
+        )
+
+    failed = set()
+    changed_ds = []
+    stale = False
+
+    def apply(calls, ds_names):
+        """Send 'calls' together, and record the outcome for each of
+        'ds_names'. Return the list of successful results."""
+
+        done = []
+        for ds_name, (retval, exc) in zip(ds_names, mw.call_many(calls)):
+            if exc is not None:
+                results[ds_name]["error"] = str(exc)
+                failed.add(ds_name)
+            else:
+                done.append(retval)
+        return done
+
+    # Deleting a dataset recursively also deletes its descendants, so
+    # there's no need to delete those separately (and trying to would
+    # fail).
+    to_delete = set(deletes)
+    delete_roots = [n for n in deletes
+                    if not any(a in to_delete for a in ancestors(n))]
+    if delete_roots:
+        apply([("pool.dataset.delete", [n, {"recursive": True}])
+               for n in delete_roots],
+              delete_roots)
+        stale = True
+        for ds_name in deletes:
+            failed_parent = next(
+                (a for a in ancestors(ds_name) if a in failed), None)
+            if ds_name not in failed and failed_parent is not None:
+                results[ds_name]["error"] = \
+                    f"Parent dataset '{failed_parent}' could not be deleted."
+                failed.add(ds_name)
+
+    # Create datasets one level at a time, so that parents exist before
+    # their children. Datasets at the same level don't depend on each
+    # other.
+    by_depth = {}
+    for create_args in creates:
+        by_depth.setdefault(depth(create_args["name"]), []).append(create_args)
+    for level in sorted(by_depth):
+        batch = []
+        for create_args in by_depth[level]:
+            ds_name = create_args["name"]
+            failed_parent = next(
+                (a for a in ancestors(ds_name) if a in failed), None)
+            if failed_parent is not None:
+                results[ds_name]["error"] = \
+                    f"Parent dataset '{failed_parent}' could not be created."
+                failed.add(ds_name)
+                continue
+            batch.append(create_args)
+            if create_args.get("create_ancestors"):
+                # Missing ancestors may have been created as well.
+                stale = True
+        if batch:
+            changed_ds += apply(
+                [("pool.dataset.create", [create_args])
+                 for create_args in batch],
+                [create_args["name"] for create_args in batch])
+
+    if updates:
+        changed_ds += apply(
+            [("pool.dataset.update", [ds_name, update_args])
+             for ds_name, update_args in updates],
+            [ds_name for ds_name, _ in updates])
+
+    if stale:
+        datasets.invalidate()
+    else:
+        datasets.update_many(changed_ds)
+
+    output = dict(
+        changed=len(failed) < len(creates) + len(updates) + len(deletes),
+        datasets=[results[n] for n in names],
+        diff=make_diff(results, names),
+    )
+    if failed:
+        module.fail_json(
+            msg=f"Failed to apply changes to datasets: "
+                f"{', '.join(sorted(failed))}",
+            **output,
+        )
+    module.exit_json(**output)
+
+
+def make_diff(results, names):
+    """Build Ansible's --diff output from the per-dataset results."""
+
+    return [
+        dict(
+            before_header=ds_name,
+            after_header=ds_name,
+            before=results[ds_name]["before"],
+            after=results[ds_name]["after"],
+        )
+        for ds_name in names
+        if results[ds_name]["action"] != "none"
+    ]
+
+
+if __name__ == "__main__":
+    main()
@@ -59,6 +59,7 @@ EXAMPLES = '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
 from ..module_utils.setup import get_tn_version
 from packaging import version
 
@@ -148,17 +149,10 @@ def main():
     #        456
     #    ]
     # },
+    groups = QueryCache(mw, "group.query", "group")
     try:
-        group_info = mw.call("group.query",
-                             [["group", "=", group]])
-        # group_info is an array. We specified a "group=<name>"
-        # filter, so we'll get either 0 or 1 elements back.
-        if len(group_info) == 0:
-            # No such group
-            group_info = None
-        else:
-            # Group exists
-            group_info = group_info[0]
+        # This is either None, or the one group whose name is 'group'.
+        group_info = groups.get(group)
     except Exception as e:
         module.fail_json(msg=f"Error looking up group {group}: {e.stderr}")
 
@@ -201,6 +195,7 @@ def main():
                     result['msg'] = err
                 except Exception as e:
                     module.fail_json(msg=f"Error creating group {group}: {e}")
+                groups.refresh(group)
 
                 result['msg'] = err
 
@@ -254,6 +249,9 @@ def main():
                     except Exception as e:
                         # XXX
                         module.fail_json(msg=f"Error updating group {group}: {e}")
+                    groups.refresh(group)
+                    # user.query() embeds the primary group.
+                    QueryCache(mw, "user.query", "username").invalidate()
                 result['changed'] = True
         else:
             # The group isn't supposed to exist.
@@ -272,6 +270,8 @@ def main():
                 err = mw.call("group.delete",
                               group_info['id'],
                               )
+                groups.remove(group)
+                QueryCache(mw, "user.query", "username").invalidate()
                 result['msg'] = err
             result['changed'] = True
 
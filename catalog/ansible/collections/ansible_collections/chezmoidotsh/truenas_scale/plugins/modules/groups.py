@@ -0,0 +1,247 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+__metaclass__ = type
+
+# Create and manage many groups at once.
+
+DOCUMENTATION = '''
+---
+module: groups
+short_description: Manage many groups in one task
+description:
+  - Create, destroy, and manage a list of groups on a TrueNAS host.
+  - This is the bulk version of the M(chezmoidotsh.truenas_scale.group)
+    module. All groups are loaded once, the changes for every group in the
+    list are worked out in memory, and then applied together.
+options:
+  groups:
+    description:
+      - List of groups to manage.
+      - Each element takes the options of the
+        M(chezmoidotsh.truenas_scale.group) module.
+      - A group may appear only once in the list.
+    type: list
+    elements: dict
+    required: true
+    suboptions:
+      name:
+        description:
+          - Name of the group to manage.
+        type: str
+        required: true
+      gid:
+        description:
+          - Optional I(GID) to set for the group
+        type: int
+      state:
+        description:
+          - Whether the group should be present or not.
+        type: str
+        choices: [ absent, present ]
+        default: present
+      non_unique:
+        description:
+          - Allow a non-unique I(GID) for the group.
+          - If I(non_unique) is true, a I(GID) must be specified.
+          - This is ignored starting with I(SCALE 25.04), where GIDs must be unique.
+        type: bool
+        default: no
+seealso:
+- module: chezmoidotsh.truenas_scale.group
+- module: chezmoidotsh.truenas_scale.users
+notes:
+- Supports C(check_mode)
+'''
+
+EXAMPLES = '''
+- name: Make sure the team's groups exist
+  chezmoidotsh.truenas_scale.groups:
+    groups:
+      - name: staff
+      - name: media
+        gid: 8675309
+      - name: badgroup
+        state: absent
+'''
+
+RETURN = '''
+groups:
+  description:
+    - What was done, or would be done in check mode, to each group, in the
+      same order as the I(groups) option.
+  type: list
+  elements: dict
+  returned: always
+  contains:
+    name:
+      description: Name of the group.
+      type: str
+    action:
+      description: One of C(create), C(update), C(delete) or C(none).
+      type: str
+    changes:
+      description: Arguments passed to C(group.create) or C(group.update).
+      type: dict
+    error:
+      description: Error message, if the change failed.
+      type: str
+      returned: on error
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.accounts import Accounts
+from ..module_utils import setup
+from packaging import version
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            groups=dict(
+                type='list',
+                elements='dict',
+                required=True,
+                options=dict(
+                    gid=dict(type='int'),
+                    name=dict(type='str', required=True),
+                    non_unique=dict(type='bool', default=False),
+                    state=dict(type='str', default='present',
+                               choices=['absent', 'present']),
+                ),
+                required_if=[
+                    ['non_unique', True, ['gid']]
+                ],
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    # Validate TrueNAS Scale environment
+    tn_version = setup.validate_truenas_scale(module)
+
+    # TrueNAS Scale versions starting with 25.04 don't accept
+    # allow_duplicate_gid parameter
+    duplicate_gid_ok = tn_version['version'] < version.parse("25.04")
+
+    specs = module.params['groups']
+    names = [spec['name'] for spec in specs]
+    seen = set()
+    duplicates = set()
+    for group in names:
+        if group in seen:
+            duplicates.add(group)
+        seen.add(group)
+    if duplicates:
+        module.fail_json(
+            msg=f"Groups listed more than once: "
+                f"{', '.join(sorted(duplicates))}")
+
+    mw = MW.client()
+
+    try:
+        accounts = Accounts(mw, load_users=False)
+    except Exception as e:
+        module.fail_json(msg=f"Error looking up groups: {e}")
+
+    # Work out what needs to be done to each group, before changing
+    # anything.
+    results = {}
+    creates = []
+    others = []
+    errors = []
+    for spec in specs:
+        group = spec['name']
+        group_info = accounts.groups_by_name.get(group)
+        result = dict(name=group, action='none', changes={})
+        results[group] = result
+
+        if spec['state'] == 'absent':
+            if group_info is not None:
+                # The id, here, is not the Unix GID, but the group's ID
+                # in TrueNAS's own database.
+                result['action'] = 'delete'
+                others.append((group, "group.delete", [group_info['id']]))
+            continue
+
+        if group_info is None:
+            arg = {"name": group}
+            if spec['gid'] is not None:
+                arg['gid'] = spec['gid']
+        else:
+            arg = {}
+            if spec['gid'] is not None and group_info['gid'] != spec['gid']:
+                arg['gid'] = spec['gid']
+            if not arg:
+                continue
+
+        # Catch GID clashes before changing anything, rather than
+        # halfway through. Starting with 25.04, duplicate GIDs can't
+        # be allowed at all.
+        clash = [g['group'] for g in accounts.groups_by_gid.get(arg.get('gid'), [])
+                 if g['group'] != group]
+        if clash and not (duplicate_gid_ok and spec['non_unique']):
+            result['error'] = \
+                f"GID {arg['gid']} is already used by {', '.join(clash)}"
+            errors.append(group)
+            continue
+
+        # allow_duplicate_gid pertains not to the group, but to the
+        # operation.
+        if duplicate_gid_ok:
+            arg['allow_duplicate_gid'] = spec['non_unique']
+
+        result['changes'] = arg
+        if group_info is None:
+            result['action'] = 'create'
+            creates.append((group, arg))
+        else:
+            result['action'] = 'update'
+            others.append((group, "group.update", [group_info['id'], arg]))
+
+    if errors:
+        module.fail_json(
+            msg=f"Can't manage groups {', '.join(errors)}; nothing was changed.",
+            changed=False,
+            groups=[results[n] for n in names])
+
+    changed = bool(creates or others)
+    if module.check_mode or not changed:
+        module.exit_json(changed=changed, groups=[results[n] for n in names])
+
+    failed = []
+
+    # Create groups one at a time, since group.create() may allocate a
+    # GID.
+    for group, arg in creates:
+        try:
+            mw.call("group.create", arg)
+        except Exception as e:
+            results[group]['error'] = str(e)
+            failed.append(group)
+
+    # Updates and deletes are independent of each other.
+    if others:
+        calls = [(method, args) for _, method, args in others]
+        for (group, _, _), (retval, exc) in zip(others,
+                                                mw.call_many(calls)):
+            if exc is not None:
+                results[group]['error'] = str(exc)
+                failed.append(group)
+
+    accounts.invalidate()
+
+    output = dict(
+        changed=len(failed) < len(creates) + len(others),
+        groups=[results[n] for n in names],
+    )
+    if failed:
+        module.fail_json(
+            msg=f"Error applying changes to groups: {', '.join(failed)}",
+            **output)
+    module.exit_json(**output)
+
+
+# Main
+if __name__ == "__main__":
+    main()
@@ -138,6 +138,8 @@ RETURN = '''
 
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.nfs_exports import \
+    NFSExports, create_args, export_argument_spec, export_paths, update_args
 from ..module_utils import setup
 from packaging import version
 
@@ -279,20 +281,21 @@ class NFS1:
         # - Likewise, can't export a directory to different networks in
         #   different exports.
 
-        # XXX - If we're trying to remove an export, look by path, not by
-        # comment. And 'paths' is an array, so I don't think there's a
-        # good way to search by "string is member of $array", so we might
-        # need to query all of 'sharing.nfs.query()', and see if the path
-        # is in any export.
+        # NFSExports fetches all exports once and indexes them by
+        # comment and by path, so that if we're trying to remove an
+        # export that isn't found by comment, we can also look for it by
+        # path. In that case, only an export of exactly the same set of
+        # directories counts: removing /path/one shouldn't take
+        # /path/two and /path/three down with it.
+        exports = NFSExports(self.mw)
         try:
-            export_info = self.mw.call("sharing.nfs.query",
-                                       [["comment", "=", name]])
-            if len(export_info) == 0:
-                # No such export
-                export_info = None
-            else:
-                # Export exists
-                export_info = export_info[0]
+            # This is either None, or the export whose comment is 'name'.
+            export_info = exports.by_comment(name)
+            if export_info is None and state == 'absent' and paths:
+                export_info = exports.by_path(paths[0])
+                if export_info is not None and \
+                   set(export_paths(export_info)) != set(paths):
+                    export_info = None
         except Exception as e:
             self.module.fail_json(msg=f"Error looking up NFS export {name}: {e}")
 
@@ -348,6 +351,7 @@ class NFS1:
                     try:
                         err = self.mw.call("sharing.nfs.create", arg)
                         self.result['msg'] = err
+                        record_export(exports, err)
                     except Exception as e:
                         # self.result['failed_invocation'] = arg
                         self.module.fail_json(msg=f"Error creating NFS export \"{name}\": {e}")
@@ -464,6 +468,7 @@ class NFS1:
                             err = self.mw.call("sharing.nfs.update",
                                                export_info['id'],
                                                arg)
+                            record_export(exports, err)
                             self.result['status'] = err
                         except Exception as e:
                             self.module.fail_json(msg=f"Error updating NFS export \"{name}\" with {arg}: {e}")
@@ -483,6 +488,7 @@ class NFS1:
                         #
                         err = self.mw.call("sharing.nfs.delete",
                                            export_info['id'])
+                        exports.remove(export_info['id'])
                         self.result['status'] = err
                     except Exception as e:
                         self.module.fail_json(msg=f"Error deleting NFS export \"{name}\": {e}")
@@ -500,23 +506,12 @@ def nfs2():
     # directory. This makes it possible to use the path as an
     # identifier, which is a much better approach anyway. 'name' now
     # becomes an optional comment.
+    #
+    # The options, and how they map onto sharing.nfs.create() and
+    # sharing.nfs.update() arguments, are shared with the
+    # 'sharing_nfs_exports' module, in module_utils/nfs_exports.py.
     module = AnsibleModule(
-        argument_spec=dict(
-            name=dict(type='str', aliases=['comment']),
-            path=dict(type='str', required=True),
-            state=dict(type='str', default='present',
-                       choices=['absent', 'present']),
-            alldirs=dict(type='bool'),
-            quiet=dict(type='bool'),
-            enabled=dict(type='bool'),
-            readonly=dict(type='bool'),
-            maproot_user=dict(type='str'),
-            maproot_group=dict(type='str'),
-            mapall_user=dict(type='str'),
-            mapall_group=dict(type='str'),
-            networks=dict(type='list', elements='str'),
-            hosts=dict(type='list', elements='str'),
-        ),
+        argument_spec=export_argument_spec(),
         supports_check_mode=True,
         mutually_exclusive=[
             ['maproot_user', 'mapall_user'],
@@ -540,28 +535,13 @@ def nfs2():
     name = module.params['name']
     path = module.params['path']
     state = module.params['state']
-    alldirs = module.params['alldirs']
-    quiet = module.params['quiet']
-    enabled = module.params['enabled']
-    readonly = module.params['readonly']
-    maproot_user = module.params['maproot_user']
-    maproot_group = module.params['maproot_group']
-    mapall_user = module.params['mapall_user']
-    mapall_group = module.params['mapall_group']
-    networks = module.params['networks']
-    hosts = module.params['hosts']
 
     # Look up the share.
     # Use the path as an identifier.
+    exports = NFSExports(mw)
     try:
-        export_info = mw.call("sharing.nfs.query",
-                              [["path", "=", path]])
-        if len(export_info) == 0:
-            # No such export
-            export_info = None
-        else:
-            # Export exists
-            export_info = export_info[0]
+        # This is either None, or the export of 'path'.
+        export_info = exports.by_path(path)
     except Exception as e:
         module.fail_json(msg=f"Error looking up NFS export {name}: {e}")
 
@@ -573,40 +553,7 @@ def nfs2():
             # Export is supposed to exist, so create it.
 
             # Collect arguments to pass to sharing.nfs.create()
-            arg = {
-                "comment": name,
-                "path": path,
-            }
-
-            if alldirs is not None:
-                arg['alldirs'] = alldirs
-
-            if quiet is not None:
-                arg['quiet'] = quiet
-
-            if enabled is not None:
-                arg['enabled'] = enabled
-
-            if readonly is not None:
-                arg['ro'] = readonly
-
-            if maproot_user is not None:
-                arg['maproot_user'] = maproot_user
-
-            if maproot_group is not None:
-                arg['maproot_group'] = maproot_group
-
-            if mapall_user is not None:
-                arg['mapall_user'] = mapall_user
-
-            if mapall_group is not None:
-                arg['mapall_group'] = mapall_group
-
-            if networks is not None:
-                arg['networks'] = networks
-
-            if hosts is not None:
-                arg['hosts'] = hosts
+            arg = create_args(module.params)
 
             if module.check_mode:
                 result['msg'] = f"Would have created NFS export \"{name}\" with {arg}"
@@ -617,6 +564,7 @@ def nfs2():
                 try:
                     err = mw.call("sharing.nfs.create", arg)
                     result['msg'] = err
+                    record_export(exports, err)
                 except Exception as e:
                     # result['failed_invocation'] = arg
                     module.fail_json(msg=f"Error creating NFS export \"{name}\": {e}")
@@ -639,70 +587,7 @@ def nfs2():
 
             # Make list of differences between what is and what should
             # be.
-            arg = {}
-
-            if name is not None and export_info['comment'] != name:
-                arg['comment'] = name
-
-            if alldirs is not None and export_info['alldirs'] != alldirs:
-                arg['alldirs'] = alldirs
-
-            if quiet is not None and export_info['quiet'] != quiet:
-                arg['quiet'] = quiet
-
-            if enabled is not None and export_info['enabled'] != enabled:
-                arg['enabled'] = enabled
-
-            if readonly is not None and export_info['ro'] != readonly:
-                arg['ro'] = readonly
-
-            if maproot_user is not None and \
-               export_info['maproot_user'] != maproot_user:
-                arg['maproot_user'] = maproot_user
-
-                # maproot_user and mapall_user are mutually exclusive.
-                # If setting one, make sure to unset the other.
-                if export_info['mapall_user'] is not None:
-                    arg['mapall_user'] = None
-
-            if maproot_group is not None and \
-               export_info['maproot_group'] != maproot_group:
-                arg['maproot_group'] = maproot_group
-
-                # maproot_group and mapall_group are mutually exclusive.
-                # If setting one, make sure to unset the other.
-                if export_info['mapall_group'] is not None:
-                    arg['mapall_group'] = None
-
-            if mapall_user is not None and \
-               export_info['mapall_user'] != mapall_user:
-                arg['mapall_user'] = mapall_user
-
-                # maproot_user and mapall_user are mutually exclusive.
-                # If setting one, make sure to unset the other.
-                if export_info['maproot_user'] is not None:
-                    arg['maproot_user'] = None
-
-            if mapall_group is not None and \
-               export_info['mapall_group'] != mapall_group:
-                arg['mapall_group'] = mapall_group
-
-                # maproot_group and mapall_group are mutually exclusive.
-                # If setting one, make sure to unset the other.
-                if export_info['maproot_group'] is not None:
-                    arg['maproot_group'] = None
-
-            # Check whether the new set of networks is the same as the
-            # old set.
-            if networks is not None and \
-               set(networks) != set(export_info['networks']):
-                arg['networks'] = networks
-
-            # Check whether the new set of hosts is the same as the
-            # old set.
-            if hosts is not None and \
-               set(hosts) != set(export_info['hosts']):
-                arg['hosts'] = hosts
+            arg = update_args(module.params, export_info)
 
             # If there are any changes, sharing.nfs.update()
             if len(arg) == 0:
@@ -719,12 +604,10 @@ def nfs2():
                         err = mw.call("sharing.nfs.update",
                                       export_info['id'],
                                       arg)
+                        record_export(exports, err)
                         result['status'] = err
                     except Exception as e:
                         module.fail_json(msg=f"Error updating NFS export \"{name}\" with {arg}: {e}")
-                        # Returns a structure similar to sharing.nfs.query(),
-                        # with all the information about the export.
-                        result['status'] = err['status']
                 result['changed'] = True
         else:
             # NFS export is not supposed to exist
@@ -738,6 +621,7 @@ def nfs2():
                     #
                     err = mw.call("sharing.nfs.delete",
                                   export_info['id'])
+                    exports.remove(export_info['id'])
                     result['status'] = err
                 except Exception as e:
                     module.fail_json(msg=f"Error deleting NFS export \"{name}\": {e}")
@@ -746,6 +630,20 @@ def nfs2():
     module.exit_json(**result)
 
 
+def record_export(exports, retval):
+    """Record the result of sharing.nfs.create() or sharing.nfs.update()
+    in 'exports'.
+
+    Both return the full export, but if this version of middlewared
+    doesn't, forget what we know instead of guessing.
+    """
+
+    if isinstance(retval, dict) and 'id' in retval:
+        exports.update(retval)
+    else:
+        exports.invalidate()
+
+
 def main():
     # Validate TrueNAS Scale compatibility
     tn_version = setup.validate_truenas_scale()
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+__metaclass__ = type
+
+# Create and manage many NFS shares at once.
+
+DOCUMENTATION = '''
+---
+module: sharing_nfs_exports
+short_description: Manage many NFS exports in one task
+description:
+  - Create, manage, and delete a list of NFS exports.
+  - This is the bulk version of the M(chezmoidotsh.truenas_scale.sharing_nfs)
+    module. All exports are fetched with a single query, and identified by
+    path. The changes for every export in the list are worked out in
+    memory, and then applied together.
+  - Requires TrueNAS SCALE 22.12.2 or later, where each export has a single
+    path.
+options:
+  exports:
+    description:
+      - List of exports to manage.
+      - Each element takes the options of the
+        M(chezmoidotsh.truenas_scale.sharing_nfs) module, except for the
+        deprecated I(paths).
+      - An export may appear only once in the list.
+    type: list
+    elements: dict
+    required: true
+seealso:
+- module: chezmoidotsh.truenas_scale.sharing_nfs
+notes:
+- Supports C(check_mode)
+'''
+
+EXAMPLES = '''
+- name: Export home and media directories
+  chezmoidotsh.truenas_scale.sharing_nfs_exports:
+    exports:
+      - name: Home export
+        path: /mnt/pool0/home
+        networks:
+          - 192.168.0.0/16
+      - name: Media export
+        path: /mnt/pool0/media
+        readonly: true
+      - path: /mnt/pool0/old
+        state: absent
+'''
+
+RETURN = '''
+exports:
+  description:
+    - What was done, or would be done in check mode, to each export, in
+      the same order as the I(exports) option.
+  type: list
+  elements: dict
+  returned: always
+  contains:
+    path:
+      description: Exported directory.
+      type: str
+    action:
+      description: One of C(create), C(update), C(delete) or C(none).
+      type: str
+    changes:
+      description:
+        - Arguments passed to C(sharing.nfs.create) or C(sharing.nfs.update).
+      type: dict
+    error:
+      description: Error message, if the change failed.
+      type: str
+      returned: on error
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.nfs_exports import \
+    NFSExports, create_args, export_argument_spec, update_args
+from ..module_utils import setup
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            exports=dict(
+                type='list',
+                elements='dict',
+                required=True,
+                options=export_argument_spec(),
+                mutually_exclusive=[
+                    ['maproot_user', 'mapall_user'],
+                    ['maproot_group', 'mapall_group'],
+                ],
+                required_by=dict(
+                    # Can't have map*_group without its corresponding
+                    # map*_user.
+                    maproot_group=('maproot_user'),
+                    mapall_group=('mapall_user'),
+                ),
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    # TrueNAS SCALE 22.12.2 is when middlewared switched the NFS
+    # parameter from 'paths' to 'path'.
+    setup.validate_truenas_scale(module, min_version="22.12.2")
+
+    specs = module.params['exports']
+    paths = [spec['path'] for spec in specs]
+    seen = set()
+    duplicates = set()
+    for path in paths:
+        if path in seen:
+            duplicates.add(path)
+        seen.add(path)
+    if duplicates:
+        module.fail_json(
+            msg=f"Exports listed more than once: "
+                f"{', '.join(sorted(duplicates))}")
+
+    mw = MW.client()
+
+    exports = NFSExports(mw)
+    try:
+        exports.all()
+    except Exception as e:
+        module.fail_json(msg=f"Error looking up NFS exports: {e}")
+
+    # Work out what needs to be done to each export, before changing
+    # anything.
+    results = {}
+    changes = []
+    for spec in specs:
+        path = spec['path']
+        export_info = exports.by_path(path)
+        result = dict(path=path, action='none', changes={})
+        results[path] = result
+
+        if spec['state'] == 'absent':
+            if export_info is not None:
+                result['action'] = 'delete'
+                changes.append((path, "sharing.nfs.delete",
+                                [export_info['id']]))
+        elif export_info is None:
+            arg = create_args(spec)
+            result['action'] = 'create'
+            result['changes'] = arg
+            changes.append((path, "sharing.nfs.create", [arg]))
+        else:
+            arg = update_args(spec, export_info)
+            if arg:
+                result['action'] = 'update'
+                result['changes'] = arg
+                changes.append((path, "sharing.nfs.update",
+                                [export_info['id'], arg]))
+
+    if module.check_mode or not changes:
+        module.exit_json(changed=bool(changes),
+                         exports=[results[p] for p in paths])
+
+    # Each export is a separate object, so all of the changes can be
+    # sent together.
+    failed = []
+    updated = []
+    calls = [(method, args) for _, method, args in changes]
+    for (path, method, args), (retval, exc) in zip(changes,
+                                                   mw.call_many(calls)):
+        if exc is not None:
+            results[path]['error'] = str(exc)
+            failed.append(path)
+        elif method == "sharing.nfs.delete":
+            exports.remove(args[0])
+        elif isinstance(retval, dict) and 'id' in retval:
+            updated.append(retval)
+        else:
+            # See record_export() in the sharing_nfs module.
+            exports.invalidate()
+
+    if updated:
+        exports.update_many(updated)
+
+    output = dict(
+        changed=len(failed) < len(changes),
+        exports=[results[p] for p in paths],
+    )
+    if failed:
+        module.fail_json(
+            msg=f"Error applying changes to NFS exports: {', '.join(failed)}",
+            **output)
+    module.exit_json(**output)
+
+
+# Main
+if __name__ == "__main__":
+    main()
@@ -167,6 +167,7 @@ status:
 
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
 from ..module_utils import setup
 
 
@@ -248,15 +249,10 @@ def main():
     fsrvp = module.params['fsrvp']
 
     # Look up the share
+    shares = QueryCache(mw, "sharing.smb.query", "path")
     try:
-        share_info = mw.call("sharing.smb.query",
-                             [["path", "=", path]])
-        if len(share_info) == 0:
-            # No such share
-            share_info = None
-        else:
-            # share exists
-            share_info = share_info[0]
+        # This is either None, or the share of 'path'.
+        share_info = shares.get(path)
     except Exception as e:
         module.fail_json(msg=f"Error looking up share {name}: {e}")
 
@@ -342,6 +338,7 @@ def main():
                 try:
                     err = mw.call("sharing.smb.create", arg)
                     result['msg'] = err
+                    shares.refresh(path)
                 except Exception as e:
                     result['failed_invocation'] = arg
                     module.fail_json(msg=f"Error creating share {name}: {e}")
@@ -466,6 +463,7 @@ def main():
                         err = mw.call("sharing.smb.update",
                                       share_info['id'],
                                       arg)
+                        shares.refresh(path)
                     except Exception as e:
                         module.fail_json(msg=f"Error updating share {name} with {arg}: {e}")
                         # Return any interesting bits from err
@@ -483,6 +481,7 @@ def main():
                     #
                     err = mw.call("sharing.smb.delete",
                                   share_info['id'])
+                    shares.remove(path)
                 except Exception as e:
                     module.fail_json(msg=f"Error deleting share {name}: {e}")
             result['changed'] = True
@@ -0,0 +1,364 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+__metaclass__ = type
+
+# Extract everything the audit report needs, in one task.
+#
+# The audit_report role used to run one 'midclt call' task per query,
+# plus two per dataset (its properties, and its ACL). On a NAS with
+# thousands of datasets, that's thousands of SSH round trips and
+# 'midclt' forks. This module runs on the NAS instead: it fetches every
+# dataset, with its properties, in a single query, sends the other
+# queries together with call_many(), and writes the lot to one
+# compressed JSON file for the controller to fetch.
+
+DOCUMENTATION = '''
+---
+module: truenas_audit_extract
+short_description: Extract the state of a TrueNAS host for auditing
+description:
+  - Fetch the system information, pools, datasets (with their ZFS
+    properties), filesystem ACLs, disks, shares, users, groups, network
+    interfaces, services and data protection tasks of a TrueNAS host.
+  - Write them to a single gzip-compressed JSON file on the host, to be
+    fetched and processed by the C(truenas.audit_report) role.
+  - All datasets are fetched with a single C(pool.dataset.query). The other
+    queries are sent together, and the ACLs of mounted filesystems are
+    fetched with up to I(acl_workers) calls in flight at a time.
+options:
+  dest:
+    description:
+      - Path of the file to write on the host.
+    type: path
+    required: true
+  properties:
+    description:
+      - Extra ZFS properties to fetch for each dataset, in addition to those
+        the report always shows (compression, quota, reservation,
+        mountpoint, ACL type and mode).
+    type: list
+    elements: str
+    default: [ description, recordsize, atime, readonly, deduplication,
+               sync, snapdir, copies, refquota, refreservation ]
+  acls:
+    description:
+      - Whether to fetch the filesystem ACL of each mounted dataset.
+    type: bool
+    default: true
+  acl_fingerprints:
+    description:
+      - ACL fingerprints returned by an earlier run, as a dict of dataset
+        name to fingerprint. The ACL of a dataset whose fingerprint hasn't
+        changed isn't fetched again, and its entry is marked as reused.
+      - A fingerprint covers the dataset's ZFS C(guid) and C(createtxg),
+        its C(acltype) and C(aclmode), its mountpoint, and the change time
+        of the mountpoint directory, which is updated whenever its ACL is.
+    type: dict
+    default: {}
+  acl_workers:
+    description:
+      - Maximum number of C(filesystem.getacl) calls in flight at a time.
+      - With the C(client) middleware method, the calls are sent over the
+        module's one connection to middlewared. With C(midclt), this is
+        the number of C(midclt) processes run at the same time.
+    type: int
+    default: 8
+  timeout:
+    description:
+      - Maximum time, in seconds, to wait for each middleware call.
+    type: int
+    default: 60
+notes:
+  - Supports C(check_mode). Nothing is changed on the host, apart from
+    writing I(dest).
+  - Optional queries that fail, e.g., C(cloudsync.query) when cloud sync is
+    unavailable, only cause a warning, and their section is left empty.
+seealso:
+- module: chezmoidotsh.truenas_scale.truenas_facts
+'''
+
+EXAMPLES = '''
+- name: Extract the host's state
+  chezmoidotsh.truenas_scale.truenas_audit_extract:
+    dest: /tmp/truenas-audit.json.gz
+  register: extract
+
+- name: Copy it to the controller
+  ansible.builtin.fetch:
+    src: "{{ extract.dest }}"
+    dest: "output/{{ inventory_hostname }}.json.gz"
+    flat: true
+'''
+
+RETURN = '''
+dest:
+  description: Path of the file that was written.
+  type: str
+  returned: success
+size:
+  description: Size of the compressed file, in bytes.
+  type: int
+  returned: success
+counts:
+  description:
+    - Number of objects extracted, for each section of the file, e.g.,
+      C(datasets) or C(dataset_acls).
+    - C(acls_reused) is the number of ACLs that weren't fetched again,
+      because their fingerprint hadn't changed.
+  type: dict
+  returned: success
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule
+from ..module_utils.middleware import MiddleWare as MW, MAX_WORKERS_LIMIT
+from ..module_utils import setup
+
+# Properties the report always uses, on top of the 'properties' option.
+REPORT_PROPERTIES = [
+    'mountpoint',
+    'compression',
+    'quota',
+    'reservation',
+    'acltype',
+    'aclmode',
+]
+
+# Properties that, along with the mountpoint directory, determine whether
+# a dataset's ACL may have changed. See acl_fingerprint().
+FINGERPRINT_PROPERTIES = [
+    'guid',
+    'createtxg',
+    'acltype',
+    'aclmode',
+]
+
+# Sections of the artifact, and the query that fills each one. Optional
+# queries may fail (e.g., on a host without cloud sync): their section is
+# left empty instead of failing the module.
+QUERIES = [
+    # (section, method, optional)
+    ('system', "system.info", False),
+    ('pools', "pool.query", False),
+    ('disks', "disk.query", False),
+    ('smb_shares', "sharing.smb.query", False),
+    ('nfs_shares', "sharing.nfs.query", False),
+    ('users', "user.query", False),
+    ('groups', "group.query", False),
+    ('network', "interface.query", False),
+    ('services', "service.query", False),
+    ('snapshot_tasks', "pool.snapshottask.query", False),
+    ('replication_tasks', "replication.query", False),
+    ('cloudsync_tasks', "cloudsync.query", True),
+    ('rsync_tasks', "rsynctask.query", True),
+]
+
+
+def has_acl(dataset):
+    """Return True if the ACL of 'dataset' should be fetched."""
+    mountpoint = dataset.get('mountpoint') or ''
+    return dataset.get('type') == "FILESYSTEM" and \
+        mountpoint.startswith("/mnt/")
+
+
+def report_fields(dataset):
+    """Make sure the properties in REPORT_PROPERTIES are top-level fields
+    of 'dataset', as in an unfiltered query."""
+
+    props = dataset.get('properties') or {}
+    for name in REPORT_PROPERTIES + FINGERPRINT_PROPERTIES:
+        if name not in dataset and name in props:
+            dataset[name] = props[name]
+
+
+def dataset_properties(dataset, names):
+    """Return the extended properties 'names' of 'dataset', as the report
+    expects them: a dict of {'value': ..., 'parsed': ...} per property."""
+
+    # Depending on the version, extra properties are either returned in a
+    # 'properties' dict, or alongside the standard fields.
+    props = dataset.get('properties') or {}
+    return {name: props[name] if name in props else dataset[name]
+            for name in names
+            if name in props or isinstance(dataset.get(name), dict)}
+
+
+def acl_fingerprint(dataset):
+    """Return a fingerprint of what the ACL of 'dataset' depends on, or
+    None if the mountpoint can't be examined.
+
+    A dataset that is destroyed and recreated under the same name gets a
+    new guid and createtxg. Changing the ACL itself updates the change
+    time of the mountpoint directory, which is a lot cheaper to look up
+    than the ACL.
+    """
+
+    mountpoint = dataset['mountpoint']
+    try:
+        ctime = os.stat(mountpoint).st_ctime_ns
+    except OSError:
+        return None
+
+    values = []
+    for name in FINGERPRINT_PROPERTIES:
+        value = dataset.get(name)
+        if isinstance(value, dict):
+            value = value.get('rawvalue', value.get('value'))
+        values.append(value)
+    values += [mountpoint, ctime]
+    return hashlib.sha256(to_json(values).encode("utf-8")).hexdigest()[:16]
+
+
+def to_json(value):
+    """Serialize 'value' to JSON.
+
+    With middleware_method=client, middlewared's results hold datetime
+    objects (e.g., in system.info), which JSON can't represent: they are
+    written as strings.
+    """
+    return json.dumps(value, default=str)
+
+
+def write_artifact(dest, state):
+    """Write 'state' to 'dest' as compressed JSON, atomically. Return the
+    size of the file."""
+
+    dirname = os.path.dirname(os.path.abspath(dest))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".truenas-audit-")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(to_json(state).encode("utf-8"))
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, dest)
+    except Exception:
+        os.unlink(tmp)
+        raise
+    return os.path.getsize(dest)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            dest=dict(type='path', required=True),
+            properties=dict(type='list', elements='str',
+                            default=['description', 'recordsize', 'atime',
+                                     'readonly', 'deduplication', 'sync',
+                                     'snapdir', 'copies', 'refquota',
+                                     'refreservation']),
+            acls=dict(type='bool', default=True),
+            acl_fingerprints=dict(type='dict', default={}),
+            acl_workers=dict(type='int', default=8),
+            timeout=dict(type='int', default=60),
+        ),
+        supports_check_mode=True,
+    )
+
+    setup.validate_truenas_scale(module)
+
+    timeout = module.params['timeout']
+    extra_props = module.params['properties']
+    acl_workers = max(1, min(module.params['acl_workers'],
+                             MAX_WORKERS_LIMIT))
+
+    mw = MW.client()
+    state = {}
+
+    # Every dataset, with all of the properties the report needs, in one
+    # query.
+    wanted = list(dict.fromkeys(REPORT_PROPERTIES + FINGERPRINT_PROPERTIES +
+                                extra_props))
+    calls = [("pool.dataset.query",
+              [[], {"extra": {"properties": wanted}}],
+              {"timeout": timeout})]
+    calls += [(method, [], {"timeout": timeout})
+              for _, method, _ in QUERIES]
+
+    results = mw.call_many(calls)
+    datasets, exc = results[0]
+    if exc is not None:
+        module.fail_json(msg=f"Error looking up datasets: {exc}")
+
+    for (section, method, optional), (retval, exc) in zip(QUERIES,
+                                                          results[1:]):
+        if exc is None:
+            state[section] = retval
+        elif optional:
+            module.warn(f"Error calling {method}: {exc}")
+            state[section] = []
+        else:
+            module.fail_json(msg=f"Error calling {method}: {exc}")
+
+    for dataset in datasets:
+        report_fields(dataset)
+        dataset['properties'] = dataset_properties(dataset, extra_props)
+    state['datasets'] = datasets
+
+    # ACLs, one call per mounted filesystem. A dataset whose ACL can't be
+    # read (e.g., it's locked) is left out, as before.
+    state['dataset_acls'] = []
+    reused = 0
+    if module.params['acls']:
+        known = module.params['acl_fingerprints']
+        acl_datasets = []
+        fingerprints = {}
+        for dataset in datasets:
+            if not has_acl(dataset):
+                continue
+            fingerprint = acl_fingerprint(dataset)
+            fingerprints[dataset['name']] = fingerprint
+            if fingerprint is not None and \
+               known.get(dataset['name']) == fingerprint:
+                # Unchanged since the last run: the caller already has
+                # this ACL.
+                state['dataset_acls'].append({
+                    'dataset': dataset['name'],
+                    'mountpoint': dataset['mountpoint'],
+                    'fingerprint': fingerprint,
+                    'reused': True,
+                })
+                reused += 1
+            else:
+                acl_datasets.append(dataset)
+
+        # Send the calls in batches of 'acl_workers', so that no more
+        # than that many are in flight, whatever the backend.
+        for start in range(0, len(acl_datasets), acl_workers):
+            batch = acl_datasets[start:start + acl_workers]
+            acl_calls = [("filesystem.getacl", [d['mountpoint']],
+                          {"timeout": timeout})
+                         for d in batch]
+            for dataset, (retval, exc) in zip(
+                    batch, mw.call_many(acl_calls, max_workers=acl_workers)):
+                if exc is None:
+                    state['dataset_acls'].append({
+                        'dataset': dataset['name'],
+                        'mountpoint': dataset['mountpoint'],
+                        'fingerprint': fingerprints[dataset['name']],
+                        'getacl': retval,
+                    })
+
+    try:
+        size = write_artifact(module.params['dest'], state)
+    except Exception as e:
+        module.fail_json(msg=f"Error writing {module.params['dest']}: {e}")
+
+    module.exit_json(
+        changed=False,
+        dest=module.params['dest'],
+        size=size,
+        counts=dict(
+            {section: len(value) for section, value in state.items()
+             if isinstance(value, list)},
+            acls_reused=reused),
+    )
+
+
+# Main
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ __metaclass__ = type
 # 1 second using client api, and 7 seconds(!) using midclt. It might
 # be useful to profile the different calls, and see if there are any
 # that are slow and less-useful.
+#
+# All of the calls are independent, so they are sent together with
+# call_many(): with the 'client' middleware method, that's a single
+# round trip. Use 'gather_subset' to skip the facts a play doesn't need.
 
 # XXX - Currently, this module skips any time something goes wrong, on
 # the assumption that it's on a non-TrueNAS system, so it shouldn't
@@ -40,6 +44,54 @@ description:
   - |
     This module may be used on non-TrueNAS hosts: it should simply fail
     gracefully and do nothing.
+options:
+  gather_subset:
+    description:
+      - If supplied, restrict the facts collected to the given subsets.
+      - C(min) is the host and boot IDs, product type and system state. It
+        is always gathered, and takes at most two middleware calls.
+      - C(version) is the product name, environment, version and build time.
+      - C(hardware) is C(truenas_system_info).
+      - C(features) is C(truenas_features).
+      - C(pools) is C(truenas_pools), the output of C(pool.query).
+      - C(datasets) is C(truenas_datasets), the output of
+        C(pool.dataset.query). This can be large.
+      - C(shares) is C(truenas_nfs_shares) and C(truenas_smb_shares).
+      - C(all) is all of the above.
+      - A subset may be prefixed with C(!) to exclude it, e.g.,
+        C(!hardware). If only exclusions are given, all other subsets are
+        gathered.
+    type: list
+    elements: str
+    default: [ min, version, hardware, features ]
+  gather_timeout:
+    description:
+      - Maximum time, in seconds, to wait for each middleware call.
+    type: int
+    default: 10
+  fact_cache:
+    description:
+      - If true, keep the facts gathered for each subset on the host (in
+        the directory given by the C(truenas_cache_dir) environment
+        variable, C(/var/tmp/ansible-truenas_scale) by default), and
+        return them on later runs instead of asking middlewared again.
+      - C(min), C(version) and C(features) are reused until the next
+        reboot.
+      - C(hardware) is reused for at most I(fact_cache_ttl) seconds, so
+        the uptime, load average and time in C(truenas_system_info) may
+        be that much out of date.
+      - C(pools), C(datasets) and C(shares) are reused for at most
+        I(fact_cache_ttl) seconds, and only as long as the configuration
+        database hasn't changed since.
+    type: bool
+    default: false
+  fact_cache_ttl:
+    description:
+      - Maximum age, in seconds, of cached C(hardware), C(pools),
+        C(datasets) and C(shares) facts.
+      - C(0) disables caching for those subsets.
+    type: int
+    default: 300
 notes:
   - Supports C(check_mode).
   - Should run correctly on non-TrueNAS hosts.
@@ -59,9 +111,29 @@ EXAMPLES = '''
       chezmoidotsh.truenas_scale.truenas_facts:
     # ansible_facts should have TrueNAS facts mixed in with the usual ones.
     - debug: var=ansible_facts
+
+- name: Only gather what's needed to tell what kind of system this is
+  chezmoidotsh.truenas_scale.truenas_facts:
+    gather_subset: min
+
+- name: Gather everything but hardware information
+  chezmoidotsh.truenas_scale.truenas_facts:
+    gather_subset: "!hardware"
+
+- name: Gather pools and shares as well as the default facts
+  chezmoidotsh.truenas_scale.truenas_facts:
+    gather_subset: [ min, version, hardware, features, pools, shares ]
+    gather_timeout: 30
 '''
 
 RETURN = '''
+cache_age:
+  description:
+    - For each subset that was gathered, the age in seconds of its facts:
+      C(0) if they were just looked up, more if they came from the cache.
+  returned: always
+  type: dict
+  sample: { "features": 5123.4, "min": 5123.4, "pools": 0 }
 ansible_facts.truenas_boot_id:
   description:
     - The host's unique boot identifier. Changes every time the
@@ -155,6 +227,39 @@ ansible_facts.truenas_system_info:
     "system_manufacturer": "To be filled by O.E.M.",
     "ecc_memory": false
   }
+ansible_facts.truenas_version:
+  description:
+    - The version of TrueNAS, without the product name.
+  type: str
+  returned: when C(version) is in I(gather_subset)
+  sample: 24.10.2
+ansible_facts.truenas_pools:
+  description:
+    - The list of pools, as returned by C(pool.query).
+  type: list
+  returned: when C(pools) is in I(gather_subset)
+ansible_facts.truenas_datasets:
+  description:
+    - The list of datasets, as returned by C(pool.dataset.query), without
+      their children.
+  type: list
+  returned: when C(datasets) is in I(gather_subset)
+ansible_facts.truenas_nfs_shares:
+  description:
+    - The list of NFS shares, as returned by C(sharing.nfs.query).
+  type: list
+  returned: when C(shares) is in I(gather_subset)
+ansible_facts.truenas_smb_shares:
+  description:
+    - The list of SMB shares, as returned by C(sharing.smb.query).
+  type: list
+  returned: when C(shares) is in I(gather_subset)
+ansible_facts.truenas_gather_subset:
+  description:
+    - The subsets that were gathered.
+  type: list
+  returned: always
+  sample: [ features, hardware, min, version ]
 ansible_facts.truenas_build_time:
   description:
     - The system build time, when the OS was built.
@@ -167,13 +272,277 @@ ansible_facts.truenas_build_time:
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.exceptions \
     import MethodNotFoundError as AnsibleMethodNotFoundError
+from ..module_utils import cache
 from ..module_utils import setup
-from datetime import datetime
+from datetime import date, datetime
+import json
+import os
+
+# Subsets of facts that can be asked for with 'gather_subset'.
+SUBSETS = ('min', 'version', 'hardware', 'features', 'pools', 'datasets',
+           'shares')
+DEFAULT_SUBSET = ['min', 'version', 'hardware', 'features']
+
+FEATURES = ('DEDUP', 'FIBRECHANNEL', 'JAILS', 'VM')
+
+# The middleware calls needed by each subset, as
+# (key, method, args, opts) tuples. 'key' is the name of the fact the
+# call fills in, or a (fact, item) tuple for facts that are dicts.
+#
+# 'min' also includes the product type, which doesn't need a call: see
+# gather().
+SUBSET_CALLS = {
+    'min': [
+        ('truenas_boot_id', "system.boot_id", [], {'output': 'str'}),
+        ('truenas_host_id', "system.host_id", [], {'output': 'str'}),
+        ('truenas_state', "system.state", [], {'output': 'str'}),
+    ],
+    'version': [
+        ('truenas_product_name', "system.product_name", [],
+         {'output': 'str'}),
+        ('truenas_environment', "system.environment", [], {'output': 'str'}),
+        ('truenas_build_time', "system.build_time", [], {}),
+    ],
+    'hardware': [
+        ('truenas_system_info', "system.info", [], {}),
+    ],
+    'features': [
+        (('truenas_features', feat), "system.feature_enabled", [feat],
+         {'output': 'str'})
+        for feat in FEATURES
+    ],
+    'pools': [
+        ('truenas_pools', "pool.query", [], {}),
+    ],
+    'datasets': [
+        ('truenas_datasets', "pool.dataset.query",
+         [[], {"extra": {"retrieve_children": False}}], {}),
+    ],
+    'shares': [
+        ('truenas_nfs_shares', "sharing.nfs.query", [], {}),
+        ('truenas_smb_shares', "sharing.smb.query", [], {}),
+    ],
+}
+
+
+# How long the facts in each subset can be reused from the cache:
+# - "boot": until the next reboot (or upgrade, which needs one).
+# - "ttl": for at most 'fact_cache_ttl' seconds.
+# - "config": for at most 'fact_cache_ttl' seconds, and only until the
+#   configuration database changes.
+SUBSET_LIFETIME = {
+    'min': "boot",
+    'version': "boot",
+    'features': "boot",
+    'hardware': "ttl",
+    'pools': "config",
+    'datasets': "config",
+    'shares': "config",
+}
+
+# Facts that are valid until the next reboot are still refreshed once
+# a day, just in case.
+BOOT_FACTS_TTL = 86400
+
+# middlewared keeps its configuration in this SQLite database. Any
+# change made through middlewared (creating a share, a dataset, ...)
+# writes to it, so its mtime and size are a cheap way to tell whether
+# anything changed.
+CONFIG_DB_PATH = "/data/freenas-v1.db"
+
+
+def config_revision():
+    """Return a string that changes whenever the configuration
+    database does, or None if it can't be read."""
+    try:
+        st = os.stat(CONFIG_DB_PATH)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def cache_name(subset):
+    return f"facts-{subset}"
+
+
+def cache_key(subset, boot_id, revision):
+    """Return the key under which the facts in 'subset' are cached, or
+    None if they can't be cached."""
+
+    if boot_id is None:
+        return None
+    if SUBSET_LIFETIME[subset] == "config":
+        if revision is None:
+            return None
+        return f"{boot_id}:{revision}"
+    return boot_id
+
+
+def cache_ttl(subset, ttl):
+    """Return how long the facts in 'subset' can be reused, in
+    seconds."""
+
+    if SUBSET_LIFETIME[subset] == "boot":
+        return BOOT_FACTS_TTL
+    return ttl
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_cache(subset_facts):
+    """Convert facts to something that can be stored as JSON.
+
+    With the client backend, facts hold datetime objects (the build time,
+    or the times in system.info). They are stored in ISO format, which is
+    also how Ansible returns them.
+    """
+
+    return json.loads(json.dumps(subset_facts, default=_json_default))
+
+
+def from_cache(subset_facts):
+    """Undo to_cache()."""
+
+    build_time = subset_facts.get('truenas_build_time')
+    if isinstance(build_time, str):
+        try:
+            subset_facts['truenas_build_time'] = \
+                datetime.fromisoformat(build_time)
+        except ValueError:
+            pass
+    return subset_facts
+
+
+def resolve_subsets(gather_subset):
+    """Turn the 'gather_subset' option into the set of subsets to
+    gather, the same way the 'setup' module does.
+
+    Raise ValueError if a subset is unknown.
+    """
+
+    include = set()
+    exclude = set()
+    for item in gather_subset:
+        negate = item.startswith('!')
+        name = item[1:] if negate else item
+        if name == 'all':
+            names = set(SUBSETS)
+        elif name in SUBSETS:
+            names = {name}
+        else:
+            raise ValueError(f"Bad subset {name!r}. Must be one of: "
+                             f"{', '.join(('all',) + SUBSETS)}.")
+        (exclude if negate else include).update(names)
+
+    if not include:
+        include = set(SUBSETS)
+    # 'min' is always gathered.
+    return (include - exclude) | {'min'}
+
+
+def convert_build_time(module, build_time):
+    """Convert the value of system.build_time to a datetime."""
+
+    # The build time is a timestamp, but it's returned in different
+    # ways by different middlewared APIs.
+    #
+    # Also, different Ansible modules deal with timestamps
+    # differently: some use time_t, others use human-readable strings.
+    # So for now at least, let's return a datetime.datetime
+    if isinstance(build_time, datetime):
+        # The direct Python connection to middlewared returns
+        # a datetime.datetime object, so just return that.
+        return build_time
+    if isinstance(build_time, dict) and '$date' in build_time:
+        # 'midclt' returns a dict of the form
+        #   {"$date": 1234567890000}
+        # which is the number of milliseconds since the epoch.
+        # Convert that to a datetime.
+        return datetime.fromtimestamp(build_time['$date']/1000)
+
+    # This is unexpected. Add a warning message, return the
+    # supplied value, and hope for the best.
+    module.warn(f'Unexpected type or build_time: {type(build_time)}.')
+    return build_time
+
+
+def gather(module, mw, tn_version, subsets, timeout):
+    """Gather the facts in each of 'subsets'.
+
+    Return a dict mapping each subset to a dict of the facts in it.
+    Raise an exception if a required call fails.
+    """
+
+    facts = {subset: {} for subset in subsets}
+
+    if 'min' in subsets:
+        # The product type is part of the (cached) version information.
+        facts['min']['truenas_product_type'] = tn_version['type']
+    if 'version' in subsets:
+        facts['version']['truenas_version'] = str(tn_version['version'])
+    if 'features' in subsets:
+        facts['features']['truenas_features'] = {}
+
+    keys = []
+    calls = []
+    for subset in sorted(subsets):
+        for key, method, args, opts in SUBSET_CALLS[subset]:
+            keys.append((subset, key))
+            calls.append((method, args, dict(opts, timeout=timeout)))
+
+    # None of these calls depend on each other, so send them all in one
+    # batch instead of one middleware round trip per fact.
+    product_type = tn_version['type']
+    for (subset, key), (value, err) in zip(keys, mw.call_many(calls)):
+        if isinstance(key, tuple):
+            # Features
+            fact, feat = key
+            if err is None:
+                facts[subset][fact][feat] = value
+            elif "Invalid choice" in str(err):
+                # SCALE doesn't have "JAILS". This is expected, so
+                # don't throw an error.
+                pass
+            else:
+                module.warn(f"Error looking up feature {feat}: {err}")
+            continue
+
+        if key in ('truenas_product_name', 'truenas_environment'):
+            # These don't exist on SCALE (anymore).
+            what = key[len('truenas_'):]
+            if isinstance(err, AnsibleMethodNotFoundError):
+                # We expect this to fail on TrueNAS SCALE, but not CORE.
+                if product_type == "CORE":
+                    module.warn(f"No method system.{what}.")
+                # Do nothing. Carry on.
+                continue
+            elif err is not None:
+                module.warn(f"Error looking up {what}: {err}")
+
+        # The others are required: if they failed, something is wrong.
+        if err is not None:
+            raise err
+
+        if key == 'truenas_build_time':
+            value = convert_build_time(module, value)
+        facts[subset][key] = value
+
+    return facts
 
 
 def main():
     module = AnsibleModule(
-        argument_spec=dict(),
+        argument_spec=dict(
+            gather_subset=dict(type='list', elements='str',
+                               default=DEFAULT_SUBSET),
+            gather_timeout=dict(type='int', default=10),
+            fact_cache=dict(type='bool', default=False),
+            fact_cache_ttl=dict(type='int', default=300),
+        ),
         supports_check_mode=True,
     )
 
@@ -183,6 +552,11 @@ def main():
         ansible_facts=dict(),
     )
 
+    try:
+        subsets = resolve_subsets(module.params['gather_subset'])
+    except ValueError as e:
+        module.fail_json(msg=str(e))
+
     try:
         # We don't actually expect this to fail, since the MiddleWare
         # module comes with this module, and should therefore be
@@ -205,99 +579,66 @@ def main():
         result['msg'] = f'Got file not found exeption {e}'
         result['skipped'] = True
         module.exit_json(**result)
-    
+
     # Validate TrueNAS Scale environment (skip if middleware couldn't load)
     try:
-        setup.validate_truenas_scale(module)
+        tn_version = setup.validate_truenas_scale(module)
     except Exception as e:
         result['msg'] = f'TrueNAS Scale validation failed: {e}'
         result['skipped'] = True
         module.exit_json(**result)
 
-    try:
-        result['ansible_facts']['truenas_boot_id'] = \
-            mw.call("system.boot_id", output='str')
-        result['ansible_facts']['truenas_host_id'] = \
-            mw.call("system.host_id", output='str')
-
-        # Get the product type first, so that we can decide whether to
-        # print error messages or not.
-        product_type = mw.call("system.product_type", output='str')
-        result['ansible_facts']['truenas_product_type'] = \
-            product_type
-
-        # system.product_name doesn't exist on SCALE (anymore).
-        try:
-            result['ansible_facts']['truenas_product_name'] = \
-                mw.call("system.product_name", output='str')
-        except AnsibleMethodNotFoundError:
-            # We expect this to fail on TrueNAS SCALE, but not CORE.
-            if product_type == "CORE":
-                module.warn("No method system.product_name.")
-            # Do nothing. Carry on.
-        except Exception as e:
-            module.warn(f"Error looking up product_name: {e}")
-            raise
+    # Reuse whichever subsets were cached by an earlier run. The cache
+    # keys are the kernel's boot ID and the configuration revision,
+    # neither of which needs a middleware call.
+    facts = {}
+    result['cache_age'] = {}
+    keys = {}
+    if module.params['fact_cache']:
+        boot_id = cache.boot_id()
+        revision = config_revision()
+        for subset in subsets:
+            keys[subset] = cache_key(subset, boot_id, revision)
+            if keys[subset] is None:
+                continue
+            cached = cache.load(cache_name(subset), keys[subset],
+                                cache_ttl(subset,
+                                          module.params['fact_cache_ttl']))
+            if cached is not None:
+                facts[subset] = from_cache(cached)
+                result['cache_age'][subset] = \
+                    cache.age(cache_name(subset)) or 0
 
-        # system.environment doesn't exist on SCALE (anymore).
+    missing = subsets - set(facts)
+    if missing:
         try:
-            result['ansible_facts']['truenas_environment'] = \
-                mw.call("system.environment", output='str')
-        except AnsibleMethodNotFoundError:
-            # We expect this to fail on TrueNAS SCALE, but not CORE.
-            if product_type == "CORE":
-                module.warn("No method system.environment.")
-            # Do nothing. Carry on.
+            fresh = gather(module, mw, tn_version, missing,
+                           module.params['gather_timeout'])
         except Exception as e:
-            module.warn(f"Error looking up environment: {e}")
-            raise
-
-        result['ansible_facts']['truenas_state'] = \
-            mw.call("system.state", output='str')
-        result['ansible_facts']['truenas_system_info'] = \
-            mw.call("system.info")
-
-        # The build time is a timestamp, but it's returned in different
-        # ways by different middlewared APIs.
-        #
-        # Also, different Ansible modules deal with timestamps
-        # differently: some use time_t, others use human-readable strings.
-        # So for now at least, let's return a datetime.datetime
-        build_time = mw.call("system.build_time")
-        if isinstance(build_time, datetime):
-            # The direct Python connection to middlewared returns
-            # a datetime.datetime object, so just return that.
-            result['ansible_facts']['truenas_build_time'] = build_time
-        elif isinstance(build_time, dict) and '$date' in build_time:
-            # 'midclt' returns a dict of the form
-            #   {"$date": 1234567890000}
-            # which is the number of milliseconds since the epoch.
-            # Convert that to a datetime.
-            result['ansible_facts']['truenas_build_time'] = \
-                datetime.fromtimestamp(build_time['$date']/1000)
-        else:
-            # This is unexpected. Add a warning message, return the
-            # supplied value, and hope for the best.
-            module.warn(f'Unexpected type or build_time: {type(build_time)}.')
-            result['ansible_facts']['truenas_build_time'] = build_time
-
-        # Get the set of features and whether they're enabled.
-        result['truenas_features'] = {}
-        for feat in ('DEDUP', 'FIBRECHANNEL', 'JAILS', 'VM'):
-            try:
-                feat_set = mw.call("system.feature_enabled", feat, output='str')
-                result['truenas_features'][feat] = feat_set
-            except Exception as e:
-                # SCALE doesn't have "JAILS". This is expected, so
-                # don't throw an error.
-                if "Invalid choice" in str(e):
-                    pass
-                else:
-                    module.warn(f"Error looking up feature {feat}: {e}")
-    except Exception as e:
-        result['skipped'] = True
-        result['msg'] = f"Error looking up facts: {e}"
-        module.exit_json(**result)
+            result['skipped'] = True
+            result['msg'] = f"Error looking up facts: {e}"
+            module.exit_json(**result)
+
+        for subset, subset_facts in fresh.items():
+            facts[subset] = subset_facts
+            result['cache_age'][subset] = 0
+            if keys.get(subset) is None:
+                continue
+            if subset == 'min' and subset_facts.get('truenas_state') != "READY":
+                # Don't remember that the system is booting or shutting
+                # down.
+                continue
+            cache.store(cache_name(subset), keys[subset],
+                        to_cache(subset_facts))
+
+    for subset_facts in facts.values():
+        result['ansible_facts'].update(subset_facts)
+    result['ansible_facts']['truenas_gather_subset'] = sorted(subsets)
+
+    # Earlier versions returned the features outside of ansible_facts.
+    # Keep them there as well, for playbooks that register the result.
+    if 'truenas_features' in result['ansible_facts']:
+        result['truenas_features'] = result['ansible_facts']['truenas_features']
 
     module.exit_json(**result)
 
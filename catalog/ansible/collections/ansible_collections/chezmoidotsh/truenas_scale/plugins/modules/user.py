@@ -230,6 +230,7 @@ user_id:
 import sys
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
 from ..module_utils import setup
 # For parsing version numbers
 from packaging import version
@@ -465,17 +466,11 @@ def main():
     # I suspect that get_user_obj() just looks up an entry in
     # /etc/passwd, while query() has a more generalized notion of what
     # a user is.
+    users = QueryCache(mw, "user.query", "username")
+    groups_cache = QueryCache(mw, "group.query", "group")
     try:
-        user_info = mw.call("user.query",
-                            [["username", "=", username]])
-        # user.query() returns an array of results, but the query
-        # above can only return 0 or 1 results.
-        if len(user_info) == 0:
-            # No such user
-            user_info = None
-        else:
-            # User exists
-            user_info = user_info[0]
+        # This is either None, or the one user named 'username'.
+        user_info = users.get(username)
     except Exception as e:
         module.fail_json(msg=f"Error looking up user {username}: {e}")
 
@@ -599,27 +594,21 @@ def main():
                 arg['group_create'] = True
             else:
                 try:
-                    group_info = mw.call("group.query",
-                                         [["group", "=", group]])
+                    group_info = groups_cache.get(group)
                 except Exception as e:
                     module.fail_json(msg=f"Error looking up group {group}: {e}")
 
-                if len(group_info) == 0:
-                    # No such group.
-                    # If we got here, presumably it's because a primary
-                    # group was set through 'group', but 'create_group'
-                    # was not set.
-                    group_info = None
-                else:
-                    group_info = group_info[0]
+                # If group_info is None, presumably it's because a
+                # primary group was set through 'group', but
+                # 'create_group' was not set.
+                if group_info is not None:
                     arg['group'] = group_info['id']
 
             if groups is not None and len(groups) > 0:
                 # Look up the groups in the list. Get their IDs.
                 # Add argument arg['groups'] with the list of IDs.
                 try:
-                    grouplist_info = mw.call("group.query",
-                                             [["group", "in", groups]])
+                    grouplist_info = groups_cache.get_many(groups)
                 except Exception as e:
                     module.fail_json(msg=f"Error looking up groups: {e}")
 
@@ -638,6 +627,10 @@ def main():
                 except Exception as e:
                     result['failed_invocation'] = arg
                     module.fail_json(msg=f"Error creating user {username}: {e}")
+                users.refresh(username)
+                # group.query() lists each group's members, and the
+                # user may have gotten a new group as well.
+                groups_cache.invalidate()
 
                 # user.create() only returns the new user ID, but
                 # return that.
@@ -875,17 +868,15 @@ def main():
             if group is not None and user_info['group']['bsdgrp_group'] != group:
                 # Look up primary group information.
                 try:
-                    grp = mw.call("group.query",
-                                  [["group", "=", group]])
+                    grp = groups_cache.get(group)
                 except Exception as e:
                     module.fail_json(msg=f"Error looking up group {group}: {e}")
 
-                # As above, 'grp' is an array of 0 or 1 elements.
-                if len(grp) == 0:
+                if grp is None:
                     # The lookup was successful, and successfully
                     # found that there's no such group.
                     module.fail_json(msg=f"No such group: {group}")
-                arg['group'] = grp[0]['id']
+                arg['group'] = grp['id']
 
             # XXX - Add 'groups', 'append'
             # user_info['groups'] is a list of ints. Each one is a group
@@ -949,8 +940,7 @@ def main():
                     grouplist_info = []
                 else:
                     try:
-                        grouplist_info = mw.call("group.query",
-                                                 [["group", "in", groups]])
+                        grouplist_info = groups_cache.get_many(groups)
                     except Exception as e:
                         module.fail_json(msg=f"Error looking up groups {groups}: {e}")
 
@@ -995,6 +985,9 @@ def main():
                                       arg)
                     except Exception as e:
                         module.fail_json(msg=f"Error updating user {username} with {arg}: {e}")
+                    users.refresh(username)
+                    if 'group' in arg or 'groups' in arg:
+                        groups_cache.invalidate()
                     # user.update() doesn't return anything
                     # interesting: just the numeric user ID.
                     # Otherwise, we'd want to include that in
@@ -1017,6 +1010,8 @@ def main():
                                   {"delete_group": delete_group})
                 except Exception as e:
                     module.fail_json(msg=f"Error deleting user {username}: {e}")
+                users.remove(username)
+                groups_cache.invalidate()
             result['changed'] = True
 
     module.exit_json(**result)
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+__metaclass__ = type
+
+# Create and manage many users at once.
+
+DOCUMENTATION = '''
+---
+module: users
+short_description: Manage many user accounts in one task
+description:
+  - Add, change, and delete a list of user accounts.
+  - This is the bulk version of the M(chezmoidotsh.truenas_scale.user)
+    module. All users and groups are loaded once, the changes for every
+    user in the list are worked out in memory, and then applied together.
+  - If any user refers to a group that doesn't exist, nothing is changed.
+options:
+  users:
+    description:
+      - List of users to manage.
+      - Each element takes the options of the
+        M(chezmoidotsh.truenas_scale.user) module, except for the
+        deprecated I(sudo) and I(sudo_nopasswd).
+      - A user may appear only once in the list.
+    type: list
+    elements: dict
+    required: true
+seealso:
+- module: chezmoidotsh.truenas_scale.user
+- module: chezmoidotsh.truenas_scale.groups
+notes:
+- Supports C(check_mode)
+'''
+
+EXAMPLES = '''
+- name: Onboard a team
+  chezmoidotsh.truenas_scale.users:
+    users:
+      - name: alice
+        comment: "Alice"
+        group: staff
+        create_group: false
+        password_disabled: true
+        smb: false
+        ssh_authorized_keys:
+          - "ssh-ed25519 AAAA... alice@laptop"
+      - name: bob
+        comment: "Bob"
+        groups: [ staff, media ]
+        password: "<encrypted password string>"
+      - name: mallory
+        state: absent
+'''
+
+RETURN = '''
+users:
+  description:
+    - What was done, or would be done in check mode, to each user, in the
+      same order as the I(users) option.
+  type: list
+  elements: dict
+  returned: always
+  contains:
+    name:
+      description: Name of the user.
+      type: str
+    action:
+      description: One of C(create), C(update), C(delete) or C(none).
+      type: str
+    changes:
+      description:
+        - Arguments passed to C(user.create) or C(user.update), except
+          for the password.
+      type: dict
+    user_id:
+      description: Database ID of a newly-created user.
+      type: int
+      returned: when a user was created
+    error:
+      description: Error message, if the change failed.
+      type: str
+      returned: on error
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.accounts import \
+    Accounts, user_create_args, user_update_args
+from ..module_utils import setup
+
+
+def main():
+    user_options = dict(
+        uid=dict(type='int'),
+        name=dict(type='str', required=True, aliases=['user']),
+        create_group=dict(type='bool', default=True),
+        password=dict(type='str', default='', no_log=True),
+        # See the 'user' module for why no_log is False.
+        password_disabled=dict(type='bool', no_log=False),
+        ssh_authorized_keys=dict(type='list', elements='str',
+                                 aliases=['pubkeys']),
+        append_pubkeys=dict(type='bool', default=False),
+        groups=dict(type='list', elements='str'),
+        home=dict(type='path'),
+        smb=dict(type='bool', default=True),
+        sudo_commands=dict(type='list', elements='str'),
+        sudo_commands_nopasswd=dict(type='list', elements='str'),
+        comment=dict(type='str'),
+        email=dict(type='str'),
+        group=dict(type='str'),
+        append=dict(type='bool', default=False),
+        shell=dict(type='str'),
+        state=dict(type='str', default='present',
+                   choices=['absent', 'present']),
+        delete_group=dict(type='bool', default=True),
+    )
+
+    module = AnsibleModule(
+        argument_spec=dict(
+            users=dict(
+                type='list',
+                elements='dict',
+                required=True,
+                options=user_options,
+                required_if=[
+                    ['password_disabled', False, ['password']],
+                ],
+            ),
+        ),
+        supports_check_mode=True,
+    )
+
+    # Validate TrueNAS Scale environment
+    setup.validate_truenas_scale(module)
+
+    specs = module.params['users']
+    names = [spec['name'] for spec in specs]
+    seen = set()
+    duplicates = set()
+    for username in names:
+        if username in seen:
+            duplicates.add(username)
+        seen.add(username)
+    if duplicates:
+        module.fail_json(
+            msg=f"Users listed more than once: "
+                f"{', '.join(sorted(duplicates))}")
+
+    mw = MW.client()
+
+    try:
+        accounts = Accounts(mw)
+    except Exception as e:
+        module.fail_json(msg=f"Error looking up users and groups: {e}")
+
+    # UIDs given explicitly must not be handed out to other new users.
+    for spec in specs:
+        if spec['state'] == 'present' and spec['uid'] is not None:
+            accounts.reserve_uid(spec['uid'])
+
+    # Work out what needs to be done to each user, before changing
+    # anything.
+    results = {}
+    creates = []
+    updates = []
+    deletes = []
+    errors = []
+    for spec in specs:
+        username = spec['name']
+        user_info = accounts.users_by_name.get(username)
+        result = dict(name=username, action='none', changes={})
+        results[username] = result
+
+        try:
+            if spec['state'] == 'absent':
+                if user_info is not None:
+                    result['action'] = 'delete'
+                    deletes.append((username, [user_info['id'],
+                                    {"delete_group": spec['delete_group']}]))
+            elif user_info is None:
+                # TrueNAS needs a UID along with a home directory (see
+                # user_create_args()).
+                if spec['home'] is not None and spec['uid'] is None:
+                    try:
+                        spec = dict(spec, uid=accounts.next_uid())
+                    except Exception as e:
+                        module.fail_json(
+                            msg=f"Error getting next available UID: {e}")
+                arg = user_create_args(spec, accounts)
+                result['action'] = 'create'
+                creates.append((username, [arg]))
+            else:
+                arg = user_update_args(spec, user_info, accounts)
+                if arg:
+                    result['action'] = 'update'
+                    updates.append((username, [user_info['id'], arg]))
+        except KeyError as e:
+            result['error'] = e.args[0]
+            errors.append(username)
+            continue
+
+        if result['action'] in ('create', 'update'):
+            result['changes'] = {k: v for k, v in arg.items()
+                                 if k != 'password'}
+
+    if errors:
+        module.fail_json(
+            msg=f"Can't manage users {', '.join(errors)}; nothing was changed.",
+            changed=False,
+            users=[results[n] for n in names])
+
+    changed = bool(creates or updates or deletes)
+    if module.check_mode or not changed:
+        module.exit_json(changed=changed, users=[results[n] for n in names])
+
+    failed = []
+
+    # Create users one at a time: user.create() allocates group IDs
+    # when it creates a user's primary group, so concurrent creates
+    # could race with each other.
+    for username, args in creates:
+        try:
+            results[username]['user_id'] = mw.call("user.create", *args)
+        except Exception as e:
+            results[username]['error'] = str(e)
+            failed.append(username)
+
+    # Updates and deletes are independent of each other.
+    others = updates + deletes
+    if others:
+        calls = [("user.update" if results[username]['action'] == 'update'
+                  else "user.delete", args)
+                 for username, args in others]
+        for (username, _), (retval, exc) in zip(others, mw.call_many(calls)):
+            if exc is not None:
+                results[username]['error'] = str(exc)
+                failed.append(username)
+
+    accounts.invalidate()
+
+    output = dict(
+        changed=len(failed) < len(creates) + len(others),
+        users=[results[n] for n in names],
+    )
+    if failed:
+        module.fail_json(
+            msg=f"Error applying changes to users: {', '.join(failed)}",
+            **output)
+    module.exit_json(**output)
+
+
+# Main
+if __name__ == "__main__":
+    main()
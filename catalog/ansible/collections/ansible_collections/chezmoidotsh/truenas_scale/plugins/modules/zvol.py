@@ -216,6 +216,7 @@ zvol:
 import re
 from ansible.module_utils.basic import AnsibleModule
 from ..module_utils.middleware import MiddleWare as MW
+from ..module_utils.query_cache import QueryCache
 from ..module_utils import setup
 
 
@@ -308,16 +309,13 @@ def main():
         module.fail_json(msg=f"Invalid type '{module.params['type']}'. This module only handles VOLUME datasets.")
 
     # Query if it exists
+    datasets = QueryCache(mw, "pool.dataset.query", "name",
+                          {"extra": {"retrieve_children": False}})
     try:
-        existing = mw.call("pool.dataset.query", [["name", "=", ds_name]])
+        existing_ds = datasets.get(ds_name)
     except Exception as e:
         module.fail_json(msg=f"Failed to query dataset '{ds_name}': {e}")
 
-    if existing:
-        existing_ds = existing[0]
-    else:
-        existing_ds = None
-
     if state == "absent":
         # If not found, no changes
         if not existing_ds:
@@ -329,6 +327,8 @@ def main():
             module.exit_json(changed=True, msg=f"Would delete volume '{ds_name}'.")
         try:
             mw.call("pool.dataset.delete", ds_name, {"recursive": True})
+            # Children are gone too, so drop the whole snapshot.
+            datasets.invalidate()
             module.exit_json(changed=True, msg=f"Deleted volume '{ds_name}'.")
         except Exception as e:
             module.fail_json(msg=f"Error deleting volume '{ds_name}': {e}")
@@ -346,6 +346,11 @@ def main():
                 )
             try:
                 new_ds = mw.call("pool.dataset.create", create_args)
+                if create_args.get("create_ancestors"):
+                    # Missing ancestors may have been created as well.
+                    datasets.invalidate()
+                else:
+                    datasets.update(new_ds)
                 result["changed"] = True
                 result["zvol"] = new_ds
                 result["msg"] = f"Created volume '{ds_name}'."
@@ -373,6 +378,7 @@ def main():
                     )
                 try:
                     updated_ds = mw.call("pool.dataset.update", ds_name, update_args)
+                    datasets.update(updated_ds)
                     result["changed"] = True
                     result["zvol"] = updated_ds
                     result["msg"] = f"Updated volume '{ds_name}'."
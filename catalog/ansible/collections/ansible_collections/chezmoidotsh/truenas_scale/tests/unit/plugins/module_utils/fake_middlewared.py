@@ -0,0 +1,142 @@
+__metaclass__ = type
+
+# A fake middlewared, for testing the 'client' backend off the NAS.
+#
+# FakeMiddlewared listens on a unix socket and answers calls with the
+# functions in its 'methods' dict. The protocol is one JSON object per
+# line: {"id": ..., "method": ..., "params": [...]} for a call, and
+# {"id": ..., "result": ...} or {"id": ..., "error": {...}} for its
+# answer.
+#
+# client_library() returns a module that stands in for
+# truenas_api_client: a Client class with the same call(), wait() and
+# close() methods, speaking that protocol to the fake server.
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import threading
+import types
+
+# Answer of a method that makes the server drop the connection, as when
+# middlewared restarts.
+DROP = object()
+
+
+class FakeMiddlewared:
+
+    def __init__(self, path, methods):
+        self.path = path
+        self.methods = dict(methods)
+        self.connections = 0
+        self.calls = []
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.connections += 1
+                for line in self.rfile:
+                    request = json.loads(line)
+                    server.calls.append(request['method'])
+                    answer = server.answer(request)
+                    if answer is DROP:
+                        return
+                    self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+        self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05},
+                                       daemon=True)
+
+    @property
+    def uri(self):
+        return f"ws+unix://{self.path}"
+
+    def answer(self, request):
+        method = self.methods.get(request['method'])
+        if method is None:
+            return {'id': request['id'],
+                    'error': {'errno': -32601,
+                              'reason': "Method not found"}}
+        try:
+            result = method(*request['params'])
+        except Exception as e:
+            return {'id': request['id'],
+                    'error': {'errno': errno.EINVAL, 'reason': str(e)}}
+        if result is DROP:
+            return DROP
+        return {'id': request['id'], 'result': result}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def client_library(default_path):
+    """Return a stand-in for the truenas_api_client module, whose Client
+    connects to 'default_path' unless given a URI."""
+
+    lib = types.ModuleType("truenas_api_client")
+
+    class ClientException(Exception):
+        def __init__(self, error, errno=None):
+            super().__init__(error)
+            self.error = error
+            self.errno = errno
+
+    class Client:
+        def __init__(self, uri=None):
+            path = uri[len("ws+unix://"):] if uri else default_path
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+            self.rfile = self.sock.makefile("rb")
+            self.next_id = 0
+            self.answers = {}
+            self.closed = False
+
+        def call(self, method, *params, job=False, timeout=None,
+                 background=False):
+            if self.closed:
+                raise ClientException("Connection closed",
+                                      errno.ECONNABORTED)
+            self.next_id += 1
+            request = {'id': self.next_id, 'method': method,
+                       'params': list(params)}
+            self.sock.sendall(json.dumps(request).encode() + b"\n")
+            if background:
+                return self.next_id
+            return self.wait(self.next_id, job=job, timeout=timeout)
+
+        def wait(self, call_id, job=False, timeout=None):
+            while call_id not in self.answers:
+                line = self.rfile.readline()
+                if not line:
+                    self.closed = True
+                    raise ClientException("Connection closed",
+                                          errno.ECONNABORTED)
+                answer = json.loads(line)
+                self.answers[answer['id']] = answer
+            answer = self.answers.pop(call_id)
+            if 'error' in answer:
+                raise ClientException(answer['error']['reason'],
+                                      answer['error']['errno'])
+            return answer['result']
+
+        def close(self):
+            self.closed = True
+            self.rfile.close()
+            self.sock.close()
+
+    lib.Client = Client
+    lib.ClientException = ClientException
+    return lib
@@ -0,0 +1,95 @@
+__metaclass__ = type
+
+import json
+import os
+
+import pytest
+from packaging import version
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils \
+    import cache, setup
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils.middleware \
+    import MiddleWare
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    directory = tmp_path / "cache"
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(directory))
+    return directory
+
+
+def plant(directory, name, key, data):
+    """Write a cache entry without going through cache.store()."""
+    with open(directory / f"{name}.json", "w") as f:
+        json.dump({'key': key, 'time': 0, 'data': data}, f)
+
+
+def test_store_and_load(cache_dir):
+    cache.store("facts", "boot", {'hostname': "nas"})
+    assert cache.load("facts", "boot", 60) == {'hostname': "nas"}
+    assert cache.load("facts", "other boot", 60) is None
+    assert cache.load("facts", "boot", 0) is None
+    assert cache_dir.stat().st_mode & 0o777 == 0o700
+
+
+def test_writable_by_others(cache_dir):
+    cache.store("facts", "boot", {'hostname': "nas"})
+    os.chmod(cache_dir, 0o777)
+    assert cache.load("facts", "boot", 60) is None
+    assert cache.age("facts") is None
+
+    cache.store("facts", "boot", {'hostname': "changed"})
+    os.chmod(cache_dir, 0o700)
+    assert cache.load("facts", "boot", 60) == {'hostname': "nas"}
+
+
+def test_owned_by_another_user(monkeypatch, cache_dir):
+    # Someone else created the directory before us.
+    cache_dir.mkdir(mode=0o700)
+    plant(cache_dir, "facts", "boot", {'hostname': "planted"})
+    monkeypatch.setattr(cache.os, "getuid",
+                        lambda: cache_dir.stat().st_uid + 1)
+
+    assert cache.load("facts", "boot", 10**10) is None
+    cache.store("facts", "boot", {'hostname': "nas"})
+    assert json.loads((cache_dir / "facts.json").read_text())['data'] == \
+        {'hostname': "planted"}
+
+
+def test_symlink(monkeypatch, tmp_path):
+    target = tmp_path / "target"
+    target.mkdir(mode=0o700)
+    plant(target, "facts", "boot", {'hostname': "planted"})
+    os.symlink(target, tmp_path / "cache")
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path / "cache"))
+
+    assert cache.load("facts", "boot", 10**10) is None
+
+
+class FakeMiddleWare:
+    def call(self, func, *args, **kwargs):
+        return {
+            "system.product_type": "SCALE",
+            "system.version": "TrueNAS-SCALE-25.04.2",
+        }[func]
+
+
+@pytest.mark.parametrize("entry", [
+    {'type': "SCALE", 'version': "25.04.2"},
+    {'name': "TrueNAS", 'type': "SCALE", 'version': None},
+    {'name': "TrueNAS", 'type': "SCALE", 'version': "not a version"},
+    ["TrueNAS", "SCALE", "25.04.2"],
+])
+def test_malformed_tn_version(monkeypatch, cache_dir, entry):
+    monkeypatch.setattr(setup, "tn_version", None)
+    monkeypatch.setattr(cache, "boot_id", lambda: "boot")
+    monkeypatch.setattr(MiddleWare, "client",
+                        staticmethod(lambda: FakeMiddleWare()))
+    cache.store(setup.TN_VERSION_CACHE, "boot", entry)
+
+    tn_version = setup.get_tn_version()
+    assert tn_version['type'] == "SCALE"
+    assert tn_version['version'] == version.parse("25.04.2")
+    assert cache.load(setup.TN_VERSION_CACHE, "boot", 60) == \
+        {'name': "TrueNAS", 'type': "SCALE", 'version': "25.4.2"}
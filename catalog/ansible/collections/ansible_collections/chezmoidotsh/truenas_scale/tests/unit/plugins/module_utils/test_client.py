@@ -0,0 +1,176 @@
+__metaclass__ = type
+
+import importlib
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils \
+    import middleware
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils.exceptions \
+    import MethodNotFoundError
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.module_utils.fake_middlewared \
+    import DROP, FakeMiddlewared, client_library
+
+CLIENT_MODULE = \
+    "ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils.client"
+
+
+def fail(*args):
+    raise ValueError("no such pool")
+
+
+METHODS = {
+    'system.info': lambda: {'hostname': "nas"},
+    'system.version': lambda: "TrueNAS-SCALE-25.04.2",
+    'system.boot_id': lambda: "1234",
+    'pool.query': lambda *args: [{'name': "tank"}],
+    'pool.get_instance': fail,
+    'system.restart_middlewared': lambda: DROP,
+}
+
+
+@pytest.fixture
+def server():
+    # Unix socket paths are limited to about 100 characters, which
+    # pytest's tmp_path may exceed.
+    tmpdir = tempfile.mkdtemp(prefix="mw-")
+    try:
+        with FakeMiddlewared(f"{tmpdir}/middlewared.sock", METHODS) as fake:
+            yield fake
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@pytest.fixture
+def client(monkeypatch, server):
+    """Import the 'client' backend with the fake client library, and
+    return the module."""
+
+    monkeypatch.setitem(sys.modules, "truenas_api_client",
+                        client_library(server.path))
+    monkeypatch.delitem(sys.modules, CLIENT_MODULE, raising=False)
+    module = importlib.import_module(CLIENT_MODULE)
+    yield module
+    module._close_connection()
+    sys.modules.pop(CLIENT_MODULE, None)
+
+
+def test_connect_once(client, server):
+    first = client.Client()
+    second = client.Client()
+
+    assert first.call("system.info") == {'hostname': "nas"}
+    assert second.call("system.version") == "TrueNAS-SCALE-25.04.2"
+    assert server.connections == 1
+
+
+def test_middleware_uri(monkeypatch, client, server):
+    monkeypatch.setenv(client.MIDDLEWARE_URI_ENV, server.uri)
+    assert client.Client().call("system.boot_id") == "1234"
+
+
+def test_call_output(client):
+    c = client.Client()
+    assert c.call("system.boot_id", output='str') == "1234"
+    assert c.call("pool.query", [], output='str') == '[{"name": "tank"}]'
+    assert c.job("pool.query") == [{'name': "tank"}]
+
+
+def test_call_errors(client):
+    c = client.Client()
+    with pytest.raises(MethodNotFoundError):
+        c.call("system.product_name")
+    with pytest.raises(Exception, match="no such pool"):
+        c.call("pool.get_instance", 1)
+
+
+def test_call_many(client, server):
+    results = client.Client().call_many([
+        ("system.info",),
+        ("pool.get_instance", [1]),
+        ("system.product_name",),
+        ("system.boot_id", [], {'output': 'str'}),
+    ])
+
+    assert results[0] == ({'hostname': "nas"}, None)
+    assert results[1][0] is None and "no such pool" in str(results[1][1])
+    assert isinstance(results[2][1], MethodNotFoundError)
+    assert results[3] == ("1234", None)
+    assert server.connections == 1
+
+
+def test_reconnect_after_connection_lost(client, server):
+    c = client.Client()
+    assert c.call("system.boot_id") == "1234"
+
+    # The call in flight fails, and isn't retried.
+    with pytest.raises(Exception, match="Connection closed"):
+        c.call("system.restart_middlewared")
+    assert server.calls.count("system.restart_middlewared") == 1
+
+    assert c.call("system.boot_id") == "1234"
+    assert client.Client().call("system.info") == {'hostname': "nas"}
+    assert server.connections == 2
+
+
+def test_call_many_reconnect_after_connection_lost(client, server):
+    c = client.Client()
+    results = c.call_many([("system.restart_middlewared",),
+                           ("system.boot_id",)])
+    assert all(exc is not None for _, exc in results)
+
+    assert c.call_many([("system.boot_id",)]) == [("1234", None)]
+    assert server.connections == 2
+
+
+def test_pick_method(monkeypatch, client):
+    # Midclt checks that 'midclt' is installed when it is imported.
+    monkeypatch.setattr(shutil, 'which', lambda cmd: f"/usr/bin/{cmd}")
+
+    monkeypatch.setenv(middleware.MIDDLEWARE_METHOD_ENV, "client")
+    assert middleware.MiddleWare._pick_method() is client.Client
+    assert isinstance(middleware.MiddleWare.client(), client.Client)
+
+    monkeypatch.setenv(middleware.MIDDLEWARE_METHOD_ENV, "midclt")
+    assert middleware.MiddleWare._pick_method().__name__ == "Midclt"
+
+    monkeypatch.delenv(middleware.MIDDLEWARE_METHOD_ENV)
+    assert middleware.MiddleWare._pick_method().__name__ == "Midclt"
+
+    monkeypatch.setenv(middleware.MIDDLEWARE_METHOD_ENV, "rest")
+    with pytest.raises(ValueError):
+        middleware.MiddleWare._pick_method()
+
+
+def test_library_fallback(monkeypatch, server):
+    """Without truenas_api_client, the client library is taken from
+    middlewared.client, as on older versions."""
+
+    lib = client_library(server.path)
+    monkeypatch.setitem(sys.modules, "truenas_api_client", None)
+    monkeypatch.setitem(sys.modules, "middlewared", lib)
+    monkeypatch.setitem(sys.modules, "middlewared.client", lib)
+    monkeypatch.delitem(sys.modules, CLIENT_MODULE, raising=False)
+    try:
+        module = importlib.import_module(CLIENT_MODULE)
+        assert module.MWClient is lib.Client
+        assert module.Client().call("system.boot_id") == "1234"
+        module._close_connection()
+    finally:
+        sys.modules.pop(CLIENT_MODULE, None)
+
+
+def test_no_library(monkeypatch):
+    monkeypatch.setitem(sys.modules, "truenas_api_client", None)
+    monkeypatch.setitem(sys.modules, "middlewared", None)
+    monkeypatch.setitem(sys.modules, "middlewared.client", None)
+    monkeypatch.delitem(sys.modules, CLIENT_MODULE, raising=False)
+    monkeypatch.setenv(middleware.MIDDLEWARE_METHOD_ENV, "client")
+    try:
+        with pytest.raises(ModuleNotFoundError):
+            middleware.MiddleWare.client()
+    finally:
+        sys.modules.pop(CLIENT_MODULE, None)
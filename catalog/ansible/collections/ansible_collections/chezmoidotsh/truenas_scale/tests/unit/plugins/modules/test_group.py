@@ -0,0 +1,90 @@
+__metaclass__ = type
+
+import pytest
+from packaging import version
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils \
+    import cache, query_cache
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.modules \
+    import group
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.modules.utils \
+    import AnsibleFailJson, run_module
+
+TN_VERSION = {'name': "TrueNAS", 'type': "SCALE",
+              'version': version.parse("25.04.2")}
+
+
+class FakeMiddleWare:
+    """Has the groups in 'groups', and fails to look them up one at a
+    time if 'query_fails'."""
+
+    def __init__(self, groups, query_fails=False):
+        self.groups = list(groups)
+        self.query_fails = query_fails
+        self.calls = []
+
+    def call(self, method, *args, **kwargs):
+        self.calls.append(method)
+        if method == "group.query":
+            if args[0] and self.query_fails:
+                raise Exception("middlewared call group.query failed")
+            return [g for g in self.groups
+                    if all(g[field] == value for field, op, value in args[0])]
+        if method == "group.create":
+            if any(g['group'] == args[0]['name'] for g in self.groups):
+                raise Exception("group already exists")
+            self.groups.append({'id': len(self.groups) + 1,
+                                'group': args[0]['name'],
+                                'gid': args[0].get('gid', 3000)})
+            return len(self.groups)
+        if method == "group.update":
+            for g in self.groups:
+                if g['id'] == args[0]:
+                    g.update(args[1])
+            return args[0]
+        raise AssertionError(f"unexpected call {method}")
+
+
+@pytest.fixture(autouse=True)
+def host(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    monkeypatch.setenv(query_cache.QUERY_CACHE_ENV, "true")
+    monkeypatch.setattr(cache, 'boot_id', lambda: "boot")
+    monkeypatch.setattr(group, 'get_tn_version', lambda: TN_VERSION)
+
+
+def run(monkeypatch, args, mw):
+    return run_module(group, monkeypatch, args, mw)
+
+
+@pytest.mark.parametrize("args", [
+    {'name': "media", 'state': "present"},
+    {'name': "users", 'gid': 2001, 'state': "present"},
+])
+def test_failed_refresh(monkeypatch, args):
+    mw = FakeMiddleWare([{'id': 1, 'group': "users", 'gid': 2000}],
+                        query_fails=True)
+
+    # The change is made, and the failed lookup afterwards only drops
+    # the cached groups.
+    result = run(monkeypatch, args, mw)
+    assert result['changed']
+    assert cache.age("query-group.query-group") is None
+
+    # So that the next run sees the change.
+    mw.query_fails = False
+    mw.calls.clear()
+    assert not run(monkeypatch, args, mw)['changed']
+    assert mw.calls == ["group.query"]
+
+
+def test_failed_create(monkeypatch):
+    # Cache the groups while "media" doesn't exist yet.
+    run(monkeypatch, {'name': "media", 'state': "absent"},
+        FakeMiddleWare([]))
+
+    mw = FakeMiddleWare([{'id': 1, 'group': "media", 'gid': 2000}])
+    with pytest.raises(AnsibleFailJson) as e:
+        run(monkeypatch, {'name': "media", 'state': "present"}, mw)
+    assert e.value.result['msg'] == \
+        "Error creating group media: group already exists"
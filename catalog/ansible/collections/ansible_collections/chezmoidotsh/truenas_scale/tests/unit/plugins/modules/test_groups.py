@@ -0,0 +1,69 @@
+__metaclass__ = type
+
+import pytest
+from packaging import version
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.modules \
+    import groups
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.modules.utils \
+    import AnsibleFailJson, run_module
+
+GROUPS = [
+    {'id': 1, 'group': "staff", 'gid': 2000},
+    {'id': 2, 'group': "media", 'gid': 2001},
+]
+
+
+def group(name, gid=None, non_unique=False):
+    return {'name': name, 'gid': gid, 'non_unique': non_unique,
+            'state': 'present'}
+
+
+class FakeMiddleWare:
+
+    def __init__(self):
+        self.changes = []
+
+    def call(self, method, *args, **kwargs):
+        if method == "group.query":
+            return [dict(g) for g in GROUPS]
+        self.changes.append(method)
+        return 3
+
+    def call_many(self, calls, max_workers=None):
+        return [(self.call(method, *args), None) for method, args in calls]
+
+
+def run(monkeypatch, specs, tn_version, mw):
+    return run_module(groups, monkeypatch, {'groups': specs}, mw,
+                      tn_version={'version': version.parse(tn_version)})
+
+
+@pytest.mark.parametrize("tn_version", ["24.10.2", "25.04.2"])
+def test_gid_clash(monkeypatch, tn_version):
+    mw = FakeMiddleWare()
+    with pytest.raises(AnsibleFailJson) as e:
+        run(monkeypatch, [group("staff", gid=2002), group("backup", gid=2001)],
+            tn_version, mw)
+    assert e.value.result['msg'] == \
+        "Can't manage groups backup; nothing was changed."
+    assert e.value.result['groups'][1]['error'] == \
+        "GID 2001 is already used by media"
+    assert mw.changes == []
+
+
+def test_non_unique_before_25_04(monkeypatch):
+    mw = FakeMiddleWare()
+    result = run(monkeypatch, [group("backup", gid=2001, non_unique=True)],
+                 "24.10.2", mw)
+    assert result['groups'][0]['changes'] == \
+        {'name': "backup", 'gid': 2001, 'allow_duplicate_gid': True}
+    assert mw.changes == ["group.create"]
+
+
+def test_non_unique_since_25_04(monkeypatch):
+    mw = FakeMiddleWare()
+    with pytest.raises(AnsibleFailJson):
+        run(monkeypatch, [group("backup", gid=2001, non_unique=True)],
+            "25.04.2", mw)
+    assert mw.changes == []
@@ -0,0 +1,73 @@
+__metaclass__ = type
+
+import datetime
+import gzip
+import json
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.modules \
+    import truenas_audit_extract
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.modules.utils \
+    import run_module
+
+BOOT_TIME = datetime.datetime(2026, 10, 18, 6, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeClient:
+    """Answers calls the way the 'client' backend does: with the decoded
+    results of middlewared, including datetime objects."""
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+
+    def call_many(self, calls, max_workers=None):
+        results = []
+        for method, args, opts in calls:
+            if method == "pool.dataset.query":
+                results.append((self.datasets, None))
+            elif method == "system.info":
+                results.append(({'hostname': 'nas',
+                                 'datetime': BOOT_TIME,
+                                 'boottime': BOOT_TIME}, None))
+            elif method == "filesystem.getacl":
+                results.append(({'acltype': 'NFS4', 'trivial': True,
+                                 'acl': []}, None))
+            else:
+                results.append(([], None))
+        return results
+
+
+def test_client_backend_datetimes(monkeypatch, tmp_path):
+    mountpoint = tmp_path / "tank"
+    mountpoint.mkdir()
+    datasets = [{
+        'id': 'tank',
+        'name': 'tank',
+        'type': 'FILESYSTEM',
+        'mountpoint': str(mountpoint),
+        'guid': {'rawvalue': '1234'},
+        'createtxg': {'rawvalue': '1'},
+        'creation': {'parsed': BOOT_TIME},
+    }]
+    monkeypatch.setattr(truenas_audit_extract, 'has_acl', lambda d: True)
+    dest = tmp_path / "extract.json.gz"
+
+    result = run_module(truenas_audit_extract, monkeypatch,
+                        {'dest': str(dest)}, FakeClient(datasets))
+
+    assert result['counts']['datasets'] == 1
+    assert result['counts']['dataset_acls'] == 1
+    with gzip.open(dest, 'rt', encoding='utf-8') as f:
+        artifact = json.load(f)
+    assert artifact['system']['datetime'] == str(BOOT_TIME)
+    assert artifact['dataset_acls'][0]['fingerprint']
+
+
+def test_acl_fingerprint_datetimes(tmp_path):
+    dataset = {
+        'mountpoint': str(tmp_path),
+        'guid': {'rawvalue': BOOT_TIME},
+        'createtxg': '1',
+    }
+    fingerprint = truenas_audit_extract.acl_fingerprint(dataset)
+    assert fingerprint == truenas_audit_extract.acl_fingerprint(dict(dataset))
+    assert len(fingerprint) == 16
@@ -0,0 +1,77 @@
+__metaclass__ = type
+
+import datetime
+
+import pytest
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils \
+    import cache
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.modules \
+    import truenas_facts
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.modules.utils \
+    import run_module
+
+TN_VERSION = {'type': "SCALE", 'version': "25.04.2"}
+NOW = datetime.datetime(2026, 10, 18, 6, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeClient:
+    """Answers calls the way the 'client' backend does, counting them."""
+
+    def __init__(self):
+        self.calls = []
+
+    def call_many(self, calls, max_workers=None):
+        results = []
+        for method, args, opts in calls:
+            self.calls.append(method)
+            if method == "system.boot_id":
+                results.append(("middlewared-boot-id", None))
+            elif method == "system.state":
+                results.append(("READY", None))
+            elif method == "system.info":
+                results.append(({'uptime_seconds': 12.5, 'datetime': NOW},
+                                None))
+            else:
+                results.append(("x", None))
+        return results
+
+
+@pytest.fixture(autouse=True)
+def host(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    monkeypatch.setattr(cache, 'boot_id', lambda: "kernel-boot-id")
+    config_db = tmp_path / "freenas-v1.db"
+    config_db.write_text("")
+    monkeypatch.setattr(truenas_facts, 'CONFIG_DB_PATH', str(config_db))
+    return tmp_path
+
+
+def test_boot_id_from_middlewared(monkeypatch, host):
+    mw = FakeClient()
+    result = run_module(truenas_facts, monkeypatch,
+                        {'gather_subset': ['min']}, mw,
+                        tn_version=TN_VERSION)
+
+    assert result['ansible_facts']['truenas_boot_id'] == \
+        "middlewared-boot-id"
+    assert "system.boot_id" in mw.calls
+    # The cache is opt-in.
+    assert not (host / "cache").exists()
+
+
+def test_fact_cache_client_datetimes(monkeypatch):
+    args = {'gather_subset': ['hardware'], 'fact_cache': True}
+    first = run_module(truenas_facts, monkeypatch, args, FakeClient(),
+                       tn_version=TN_VERSION)
+    mw = FakeClient()
+    second = run_module(truenas_facts, monkeypatch, args, mw,
+                        tn_version=TN_VERSION)
+
+    assert first['ansible_facts']['truenas_system_info']['datetime'] == NOW
+    assert "system.info" not in mw.calls
+    assert "system.boot_id" not in mw.calls
+    assert second['ansible_facts']['truenas_system_info'] == \
+        {'uptime_seconds': 12.5, 'datetime': NOW.isoformat()}
+    assert second['ansible_facts']['truenas_boot_id'] == \
+        "middlewared-boot-id"
@@ -0,0 +1,95 @@
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.modules \
+    import users
+from ansible_collections.chezmoidotsh.truenas_scale.tests.unit.plugins.modules.utils \
+    import AnsibleFailJson, run_module
+
+ALICE = {
+    'id': 1, 'uid': 3000, 'username': "alice", 'full_name': "Alice",
+    'email': None, 'shell': "/usr/bin/bash", 'smb': True,
+    'password_disabled': False, 'home': "/mnt/tank/home/alice",
+    'sudo_commands': [], 'sudo_commands_nopasswd': [],
+    'sshpubkey': "ssh-ed25519 BBBB alice@laptop\nssh-ed25519 AAAA alice@desktop\n",
+    'group': {'bsdgrp_group': "alice"}, 'groups': [],
+}
+
+
+def user(name, **options):
+    """Return the options of the user 'name', as the module would get
+    them with their defaults."""
+
+    spec = dict(
+        uid=None, name=name, create_group=True, password="",
+        password_disabled=None, ssh_authorized_keys=None,
+        append_pubkeys=False, groups=None, home=None, smb=True,
+        sudo_commands=None, sudo_commands_nopasswd=None, comment=None,
+        email=None, group=None, append=False, shell=None,
+        state='present', delete_group=True,
+    )
+    spec.update(options)
+    return spec
+
+
+class FakeMiddleWare:
+
+    def __init__(self, next_uid=3001):
+        self.next_uid = next_uid
+
+    def call(self, method, *args, **kwargs):
+        if method == "user.query":
+            return [dict(ALICE)]
+        if method == "group.query":
+            return [{'id': 10, 'group': "alice", 'gid': 3000}]
+        if method == "user.get_next_uid":
+            if isinstance(self.next_uid, Exception):
+                raise self.next_uid
+            return self.next_uid
+        raise AssertionError(f"unexpected call {method}")
+
+
+def run(monkeypatch, specs, mw=None):
+    return run_module(users, monkeypatch, {'users': specs},
+                      mw or FakeMiddleWare(), check_mode=True)
+
+
+def test_append_pubkeys_keeps_order(monkeypatch):
+    keys = ["ssh-ed25519 DDDD alice@phone", "ssh-ed25519 AAAA alice@desktop",
+            "ssh-ed25519 CCCC alice@tablet"]
+    result = run(monkeypatch, [user("alice", ssh_authorized_keys=keys,
+                                    append_pubkeys=True)])
+    assert result['users'][0]['changes'] == {'sshpubkey': (
+        "ssh-ed25519 BBBB alice@laptop\n"
+        "ssh-ed25519 AAAA alice@desktop\n"
+        "ssh-ed25519 DDDD alice@phone\n"
+        "ssh-ed25519 CCCC alice@tablet\n")}
+
+
+def test_append_pubkeys_unchanged(monkeypatch):
+    keys = ["ssh-ed25519 AAAA alice@desktop"]
+    result = run(monkeypatch, [user("alice", ssh_authorized_keys=keys,
+                                    append_pubkeys=True)])
+    assert not result['changed']
+
+
+def test_next_uid(monkeypatch):
+    result = run(monkeypatch, [user("bob", home="/mnt/tank/home"),
+                               user("carol", home="/mnt/tank/home")])
+    assert [r['changes']['uid'] for r in result['users']] == [3001, 3002]
+
+
+def test_next_uid_fails(monkeypatch):
+    mw = FakeMiddleWare(next_uid=Exception("middlewared is down"))
+    with pytest.raises(AnsibleFailJson) as e:
+        run(monkeypatch, [user("bob", home="/mnt/tank/home")], mw)
+    assert e.value.result['msg'] == \
+        "Error getting next available UID: middlewared is down"
+
+
+def test_other_errors_are_not_about_uids(monkeypatch):
+    # A malformed user entry is a bug, not a failed UID lookup.
+    monkeypatch.setitem(ALICE, 'sshpubkey', 42)
+    with pytest.raises(AttributeError):
+        run(monkeypatch, [user("alice", ssh_authorized_keys=[])])
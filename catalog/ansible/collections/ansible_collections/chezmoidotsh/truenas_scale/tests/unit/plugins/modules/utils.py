@@ -0,0 +1,71 @@
+__metaclass__ = type
+
+# Helpers to run a module's main() in a test, without Ansible's argument
+# passing: the module's AnsibleModule is replaced with FakeModule, whose
+# exit_json() and fail_json() raise instead of exiting.
+
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils \
+    import setup
+from ansible_collections.chezmoidotsh.truenas_scale.plugins.module_utils.middleware \
+    import MiddleWare
+
+
+class AnsibleExitJson(Exception):
+    """Raised by FakeModule.exit_json(), with the module's result."""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+class AnsibleFailJson(Exception):
+    """Raised by FakeModule.fail_json(), with the module's result."""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+def fake_module(args, check_mode=False):
+    """Return a stand-in for AnsibleModule that takes its parameters from
+    'args', and the defaults of the argument spec."""
+
+    class FakeModule:
+        def __init__(self, argument_spec, **kwargs):
+            self.params = {name: spec.get('default')
+                           for name, spec in argument_spec.items()}
+            self.params.update(args)
+            self.check_mode = check_mode
+            self.warnings = []
+
+        def warn(self, msg):
+            self.warnings.append(msg)
+
+        def exit_json(self, **kwargs):
+            raise AnsibleExitJson(kwargs)
+
+        def fail_json(self, **kwargs):
+            kwargs['failed'] = True
+            raise AnsibleFailJson(kwargs)
+
+    return FakeModule
+
+
+def run_module(module, monkeypatch, args, mw, check_mode=False,
+               tn_version=None):
+    """Run 'module' with 'args', talking to 'mw' instead of middlewared,
+    on a system whose version information is 'tn_version'.
+
+    Return the result passed to exit_json(), or raise AnsibleFailJson.
+    """
+
+    monkeypatch.setattr(module, 'AnsibleModule',
+                        fake_module(args, check_mode=check_mode))
+    monkeypatch.setattr(MiddleWare, 'client', staticmethod(lambda: mw))
+    monkeypatch.setattr(setup, 'validate_truenas_scale',
+                        lambda *args, **kwargs: tn_version or {})
+    try:
+        module.main()
+    except AnsibleExitJson as e:
+        return e.result
+    raise AssertionError("the module didn't call exit_json()")
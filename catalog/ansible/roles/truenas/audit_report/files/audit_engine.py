@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Build the TrueNAS state report from raw extract files in a single pass.
+
+The input is either the compressed artifact written by the
+chezmoidotsh.truenas_scale.truenas_audit_extract module, or a work directory
+with the output of each middleware query in its own file. This script reads
+it once, runs every processing stage (disks, pools, dataset trees, ACLs) in
+memory, and writes the report with report_writer.py (or, without --output,
+prints the report data as JSON).
+
+With --state-dir, the report data is also compared with the previous audit
+(see audit_state.py): the differences are added under 'delta', and ACLs the
+extract module didn't fetch again are taken from the previous audit.
+
+With --dedup-acls, each distinct ACL is stored once in an 'acls' table, and
+datasets refer to it by id, or as 'inherit' when it is their parent's ACL.
+
+With --export-dir, the dataset, disk, ACL entry and share tables are also
+written there as line-delimited JSON or CSV (see columnar_export.py).
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+import audit_state
+import columnar_export
+from audit_io import iter_json, write_file
+from build_dataset_tree import build_dataset_trees
+from build_disk_info import build_disk_info
+from build_pool_info import build_pool_info
+from merge_acls_datasets import dedup_acls, merge_acls_into_tree
+from pool_topology import index_topology
+from report_writer import FORMATS, write_delta, write_report
+from simplify_acls import iter_simplified_acls
+
+
+# Raw extract files, relative to the work directory, and the value to use
+# when a file is missing or empty (e.g. an optional query that failed).
+RAW_FILES = {
+    'system': ('system.json', {}),
+    'pools': ('pools.json', []),
+    'datasets': ('datasets.json', []),
+    'dataset_properties': ('dataset_properties.json', []),
+    'dataset_acls': ('dataset_acls.json', []),
+    'disks': ('disks.json', []),
+    'users': ('users.json', []),
+    'groups': ('groups.json', []),
+    'smb_shares': ('smb_shares.json', []),
+    'nfs_shares': ('nfs_shares.json', []),
+    'network': ('network.json', []),
+    'services': ('services.json', []),
+    'snapshot_tasks': ('snapshot_tasks.json', []),
+    'replication_tasks': ('replication_tasks.json', []),
+    'cloudsync_tasks': ('cloudsync_tasks.json', []),
+    'rsync_tasks': ('rsync_tasks.json', []),
+}
+
+# Per-dataset extracts, which grow with the number of datasets. These are
+# parsed one element at a time while they are consumed, rather than loaded
+# up front.
+STREAMED_FILES = {'dataset_properties', 'dataset_acls'}
+
+
+def load_artifact(path: str) -> Dict[str, Any]:
+    """Load the sections of an extract artifact (gzip-compressed JSON).
+
+    The artifact is a single JSON object, so it is loaded whole: unlike
+    the files of a work directory, none of its sections are streamed.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        artifact = json.load(f)
+    return {key: artifact.get(key, default) for key, (_, default) in RAW_FILES.items()}
+
+
+def load_extract(work_dir: str) -> Dict[str, Any]:
+    """Load every raw extract file from the work directory, or the extract
+    artifact if given a file.
+
+    Files in STREAMED_FILES are returned as iterators, which can only be
+    consumed once.
+    """
+    if os.path.isfile(work_dir):
+        return load_artifact(work_dir)
+    raw = {}
+    for key, (filename, default) in RAW_FILES.items():
+        path = os.path.join(work_dir, filename)
+        if key in STREAMED_FILES:
+            raw[key] = _iter_file(path)
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ''
+        raw[key] = json.loads(content) if content.strip() else default
+    return raw
+
+
+def _iter_file(path: str) -> Iterator[Any]:
+    """Yield the elements of a JSON array file, or nothing if it is missing
+    or empty."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    yield from iter_json(path)
+
+
+def enrich_datasets(datasets: List[Dict], properties: Iterable[Any]) -> List[Dict]:
+    """Attach the extended ZFS properties to each dataset, matching by id.
+    
+    Datasets that already carry their properties (from the extract
+    artifact) keep them.
+    """
+    # Each properties entry is the result of a filtered pool.dataset.query,
+    # i.e. a list holding (at most) one dataset.
+    properties_by_id = {}
+    for result in properties:
+        for dataset in (result if isinstance(result, list) else [result]):
+            if dataset and 'id' in dataset:
+                properties_by_id[dataset['id']] = dataset.get('properties', {})
+
+    enriched = []
+    for dataset in datasets:
+        enhanced = dict(dataset)
+        enhanced['properties'] = properties_by_id.get(dataset.get('id'), dataset.get('properties', {}))
+        enriched.append(enhanced)
+    return enriched
+
+
+def collect_acls(dataset_acls: Iterable[Dict]) -> Iterator[Dict]:
+    """Convert filesystem.getacl results into the input of simplify_acls."""
+    for item in dataset_acls:
+        getacl = item.get('getacl') or {}
+        if 'acl' not in getacl:
+            continue
+        yield {
+            'dataset': item.get('dataset', ''),
+            'mountpoint': item.get('mountpoint', ''),
+            'acltype': getacl.get('acltype') or 'posix',
+            'trivial': getacl.get('trivial', True),
+            'entries': getacl.get('acl') or [],
+        }
+
+
+def reuse_acls(dataset_acls: Iterable[Dict], previous: Dict[str, Dict[str, Any]],
+               store: Dict[str, Dict[str, Any]]) -> Iterator[Dict]:
+    """Fill in the ACLs the extract module reused from the previous audit,
+    and record every ACL (with its fingerprint) in 'store'.
+    
+    Raises ValueError if a reused ACL isn't in 'previous', rather than
+    leaving it out of the report.
+    """
+    for item in dataset_acls:
+        name = item.get('dataset', '')
+        if item.get('reused'):
+            entry = previous.get(name)
+            if entry is None or entry.get('fingerprint') != item.get('fingerprint'):
+                raise ValueError(f"no stored ACL for {name}; rerun with audit_reuse_acls: false")
+            item = dict(item, getacl=entry['getacl'])
+        store[name] = {'fingerprint': item.get('fingerprint'), 'getacl': item.get('getacl')}
+        yield item
+
+
+def build_report(raw: Dict[str, Any], hostname: str, timestamp: str) -> Dict[str, Any]:
+    """Run every processing stage and return the report data."""
+    topology = index_topology(raw['pools'])
+    disks = build_disk_info(raw['disks'], raw['pools'], topology)
+    zpools = build_pool_info(raw['pools'], raw['disks'], topology)
+
+    enriched = enrich_datasets(raw['datasets'], raw['dataset_properties'])
+    trees = build_dataset_trees(enriched, [pool['name'] for pool in raw['pools']])
+
+    acls = iter_simplified_acls(collect_acls(raw['dataset_acls']), raw['users'], raw['groups'])
+    acls_by_dataset = {acl['dataset']: acl for acl in acls}
+    datasets = merge_acls_into_tree(trees, acls_by_dataset)
+
+    return {
+        'timestamp': timestamp,
+        'hostname': hostname,
+        'system': raw['system'],
+        'disks': disks,
+        'zpools': zpools,
+        'datasets': datasets,
+        'smb_shares': raw['smb_shares'],
+        'nfs_shares': raw['nfs_shares'],
+        'users': raw['users'],
+        'groups': raw['groups'],
+        'network': raw['network'],
+        'services': raw['services'],
+        'backup_config': {
+            'snapshot_tasks': raw['snapshot_tasks'],
+            'replication_tasks': raw['replication_tasks'],
+            'cloudsync_tasks': raw['cloudsync_tasks'],
+            'rsync_tasks': raw['rsync_tasks'],
+        },
+    }
+
+
+def summary(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the counts shown at the end of an audit."""
+    delta = report.get('delta')
+    return {
+        'disks': len(report['disks']),
+        'pools': len(report['zpools']),
+        'datasets': len(report['datasets']),
+        'smb_shares': len(report['smb_shares']),
+        'nfs_shares': len(report['nfs_shares']),
+        'delta': {'previous': delta['previous']['timestamp'], 'changed': delta['changed']} if delta else None,
+    }
+
+
+def main():
+    """Main function to build the report from the extracted data."""
+    parser = argparse.ArgumentParser(description="Build the TrueNAS state report data.")
+    parser.add_argument('input', help="extract artifact (.json.gz) or work directory")
+    parser.add_argument('hostname')
+    parser.add_argument('timestamp')
+    parser.add_argument('--state-dir', help="directory holding the state of previous audits of this host")
+    parser.add_argument('--dedup-acls', action='store_true',
+                        help="store each distinct ACL once, in an 'acls' table the datasets refer to")
+    parser.add_argument('--output', help="write the report to this file, and print a summary instead")
+    parser.add_argument('--delta-output', help="write the delta report (with --state-dir) to this file")
+    parser.add_argument('--format', choices=FORMATS, default='yaml', help="format of the written reports")
+    parser.add_argument('--export-dir', help="also write the report data as tables to this directory")
+    parser.add_argument('--export-format', choices=columnar_export.FORMATS, default='ndjson',
+                        help="format of the exported tables")
+    args = parser.parse_args()
+
+    try:
+        raw = load_extract(args.input)
+        if args.state_dir:
+            acl_store = {}
+            raw['dataset_acls'] = reuse_acls(raw['dataset_acls'], audit_state.load_acls(args.state_dir), acl_store)
+        report = build_report(raw, args.hostname, args.timestamp)
+        if args.state_dir:
+            latest, previous = audit_state.load_previous(args.state_dir)
+            if previous is not None:
+                report['delta'] = audit_state.compute_delta(previous, latest, report)
+            audit_state.save_report(args.state_dir, report)
+            audit_state.save_acls(args.state_dir, acl_store)
+        if args.dedup_acls:
+            # After the state is saved, so that it always holds full ACLs
+            report['acls'] = dedup_acls(report['datasets'])
+        exported = None
+        if args.export_dir:
+            exported = columnar_export.export_tables(report, args.export_dir, args.export_format)
+        if not args.output:
+            print(json.dumps(report))
+            return
+        write_file(args.output, lambda f: write_report(report, f, args.format))
+        if args.delta_output and 'delta' in report:
+            write_file(args.delta_output, lambda f: write_delta(report['delta'], f, args.format))
+        print(json.dumps(dict(summary(report), exported=exported)))
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Input/output helpers shared by the audit report scripts.
+
+Each JSON argument of the scripts may be a file path, `-` for stdin, or
+(for compatibility) the JSON document itself. Arrays read with iter_json()
+are parsed one element at a time, so memory use grows with the largest
+element rather than with the whole array.
+"""
+import json
+import os
+import sys
+from typing import Any, Callable, IO, Iterable, Iterator
+
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters that may continue a JSON number
+_NUMBER_CHARS = '0123456789+-.eE'
+
+
+def _is_inline(arg: str) -> bool:
+    """Return True if the argument is a JSON document rather than a path."""
+    return arg != '-' and not os.path.exists(arg) and arg.lstrip()[:1] in ('[', '{')
+
+
+def open_input(arg: str) -> IO[str]:
+    """Open the input named by a script argument for reading."""
+    if arg == '-':
+        return sys.stdin
+    return open(arg, 'r', encoding='utf-8')
+
+
+def load_json(arg: str) -> Any:
+    """Load a whole JSON document from a script argument."""
+    if _is_inline(arg):
+        return json.loads(arg)
+    stream = open_input(arg)
+    try:
+        return json.load(stream)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def iter_json_array(stream: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of the JSON array read from a stream, one at a time.
+
+    Only the element being decoded (plus the unread input) is held in
+    memory. While an element is incomplete, at least as much input again
+    as is buffered is read before decoding it again, so that decoding a
+    large element takes linear time.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill(size: int = 1) -> bool:
+        """Read at least 'size' characters (or up to EOF) into the buffer.
+        Return False if there was nothing left to read."""
+        nonlocal buf, pos, eof
+        chunks = []
+        read = 0
+        while not eof and read < size:
+            chunk = stream.read(max(chunk_size, size - read))
+            if not chunk:
+                eof = True
+                break
+            chunks.append(chunk)
+            read += len(chunk)
+        if not chunks:
+            return False
+        # Drop what has already been decoded before growing the buffer.
+        buf = buf[pos:] + ''.join(chunks)
+        pos = 0
+        return True
+
+    def skip_whitespace() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ''
+
+    if skip_whitespace() != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+
+    if skip_whitespace() == ']':
+        return
+
+    while True:
+        skip_whitespace()
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            # The element may continue in the next chunks.
+            if fill(len(buf) - pos):
+                continue
+            raise
+        if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                and (end == len(buf) or buf[end] in _NUMBER_CHARS) and fill()):
+            # A number may be cut short at the end of the buffer (e.g.
+            # "12" of "12.5"): decode it again with more input.
+            continue
+        pos = end
+        yield value
+
+        delimiter = skip_whitespace()
+        pos += 1
+        if delimiter == ']':
+            return
+        if delimiter != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {delimiter!r}")
+
+
+def iter_json(arg: str) -> Iterator[Any]:
+    """Yield the elements of the JSON array named by a script argument."""
+    if _is_inline(arg):
+        yield from json.loads(arg)
+        return
+    stream = open_input(arg)
+    try:
+        yield from iter_json_array(stream)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def dump_json_array(items: Iterable[Any], out: IO[str] = sys.stdout) -> None:
+    """Write items as a JSON array, one element at a time."""
+    out.write('[')
+    for i, item in enumerate(items):
+        if i:
+            out.write(',\n')
+        out.write(json.dumps(item))
+    out.write(']\n')
+
+
+def write_file(path: str, write: Callable[[IO[str]], None]) -> None:
+    """Call write() with a stream on path, replacing the file only once it
+    is complete."""
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as f:
+            write(f)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
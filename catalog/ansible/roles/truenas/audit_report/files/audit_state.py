@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Keep the state of the previous audit, and compute what changed since.
+
+The state directory of a host holds:
+
+  objects/<sha256>.json.gz  report data, addressed by the hash of its content
+                            (without the timestamp), so an unchanged host
+                            doesn't store a new copy
+  latest.json               hash and timestamp of the latest report
+  acls.json.gz              raw filesystem ACL of each dataset, with the
+                            fingerprint it was fetched for
+
+The fingerprints are passed to the truenas_audit_extract module, which skips
+filesystem.getacl for datasets whose fingerprint hasn't changed; the engine
+then reuses the ACL stored here.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+
+LATEST_FILE = 'latest.json'
+ACLS_FILE = 'acls.json.gz'
+OBJECTS_DIR = 'objects'
+
+# Number of report objects kept; older ones are removed
+HISTORY = 10
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write data to path, replacing it atomically."""
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def _read_gzip_json(path: str) -> Any:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def content_hash(report: Dict[str, Any]) -> str:
+    """Return the content address of report data, ignoring its timestamp."""
+    content = {k: v for k, v in report.items() if k not in ('timestamp', 'delta')}
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def load_previous(state_dir: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Return the latest entry ({'hash', 'timestamp'}) and report data of
+    the previous audit, or (None, None) if there isn't one."""
+    try:
+        with open(os.path.join(state_dir, LATEST_FILE), 'r', encoding='utf-8') as f:
+            latest = json.load(f)
+        report = _read_gzip_json(os.path.join(state_dir, OBJECTS_DIR, f"{latest['hash']}.json.gz"))
+    except (OSError, ValueError, KeyError):
+        return None, None
+    return latest, report
+
+
+def save_report(state_dir: str, report: Dict[str, Any]) -> str:
+    """Store report data as the latest audit, and return its hash."""
+    digest = content_hash(report)
+    path = os.path.join(state_dir, OBJECTS_DIR, f"{digest}.json.gz")
+    if not os.path.exists(path):
+        content = {k: v for k, v in report.items() if k not in ('timestamp', 'delta')}
+        _write_atomic(path, gzip.compress(json.dumps(content).encode('utf-8')))
+    else:
+        # Mark it as the most recent, for prune_objects()
+        os.utime(path)
+    latest = {'hash': digest, 'timestamp': report.get('timestamp')}
+    _write_atomic(os.path.join(state_dir, LATEST_FILE), json.dumps(latest).encode('utf-8'))
+    prune_objects(state_dir)
+    return digest
+
+
+def prune_objects(state_dir: str, keep: int = HISTORY) -> None:
+    """Remove all but the 'keep' most recently stored report objects."""
+    objects_dir = os.path.join(state_dir, OBJECTS_DIR)
+    paths = [os.path.join(objects_dir, name) for name in os.listdir(objects_dir)
+             if name.endswith('.json.gz')]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        os.unlink(path)
+
+
+def load_acls(state_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Return the stored ACLs: dataset name -> {'fingerprint', 'getacl'}."""
+    try:
+        return _read_gzip_json(os.path.join(state_dir, ACLS_FILE))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_acls(state_dir: str, acls: Dict[str, Dict[str, Any]]) -> None:
+    """Store the raw ACLs of this audit."""
+    _write_atomic(os.path.join(state_dir, ACLS_FILE), gzip.compress(json.dumps(acls).encode('utf-8')))
+
+
+def acl_fingerprints(state_dir: str) -> Dict[str, str]:
+    """Return the fingerprint of each stored ACL, for the extract module."""
+    return {name: entry['fingerprint'] for name, entry in load_acls(state_dir).items()
+            if entry.get('fingerprint')}
+
+
+def flatten_datasets(trees: Dict[str, Any]) -> Tuple[Dict[str, Dict], Dict[str, Any]]:
+    """Flatten the dataset trees into name -> properties and name -> ACL.
+
+    The tree of a pool without a root dataset is the dict of its first
+    level of datasets (see build_dataset_tree.py).
+    """
+    properties = {}
+    acls = {}
+
+    def walk(name: str, node: Dict) -> None:
+        properties[name] = {k: v for k, v in node.items() if k not in ('datasets', 'acl')}
+        if 'acl' in node:
+            acls[name] = node['acl']
+        for child_name, child in (node.get('datasets') or {}).items():
+            walk(f"{name}/{child_name}", child)
+
+    for pool_name, tree in trees.items():
+        if 'datasets' in tree:
+            walk(pool_name, tree)
+        else:
+            for child_name, child in tree.items():
+                walk(f"{pool_name}/{child_name}", child)
+    return properties, acls
+
+
+def diff_fields(old: Dict, new: Dict) -> Dict[str, Dict[str, Any]]:
+    """Return {field: {'old', 'new'}} for each field that differs."""
+    changes = {}
+    for key in list(old) + [k for k in new if k not in old]:
+        if old.get(key) != new.get(key):
+            changes[key] = {'old': old.get(key), 'new': new.get(key)}
+    return changes
+
+
+def diff_objects(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict[str, Any]:
+    """Compare two collections of objects keyed by name."""
+    changed = {}
+    for name in new:
+        if name in old:
+            changes = diff_fields(old[name], new[name])
+            if changes:
+                changed[name] = changes
+    return {
+        'added': [name for name in new if name not in old],
+        'removed': [name for name in old if name not in new],
+        'changed': changed,
+    }
+
+
+def _shares_by_key(shares: Any, key: str) -> Dict[str, Dict]:
+    by_key = {}
+    for share in shares or []:
+        name = share.get(key)
+        if name is None and key == 'path':
+            # Exports from before TrueNAS SCALE 22.12.2 have 'paths'
+            name = ','.join(share.get('paths') or [])
+        by_key[str(name)] = share
+    return by_key
+
+
+def compute_delta(previous: Dict[str, Any], previous_latest: Dict[str, Any],
+                  current: Dict[str, Any]) -> Dict[str, Any]:
+    """Return what changed between the previous and current report data."""
+    old_props, old_acls = flatten_datasets(previous.get('datasets') or {})
+    new_props, new_acls = flatten_datasets(current.get('datasets') or {})
+
+    datasets = diff_objects(old_props, new_props)
+    # ACLs of added and removed datasets are part of those datasets
+    acls = {
+        name: {'old': old_acls.get(name), 'new': new_acls.get(name)}
+        for name in new_props
+        if name in old_props and old_acls.get(name) != new_acls.get(name)
+    }
+    smb = diff_objects(_shares_by_key(previous.get('smb_shares'), 'name'),
+                       _shares_by_key(current.get('smb_shares'), 'name'))
+    nfs = diff_objects(_shares_by_key(previous.get('nfs_shares'), 'path'),
+                       _shares_by_key(current.get('nfs_shares'), 'path'))
+
+    def any_change(diff: Dict) -> bool:
+        return bool(diff['added'] or diff['removed'] or diff['changed'])
+
+    return {
+        'previous': {
+            'hash': previous_latest.get('hash'),
+            'timestamp': previous_latest.get('timestamp'),
+        },
+        'changed': any_change(datasets) or bool(acls) or any_change(smb) or any_change(nfs),
+        'datasets': datasets,
+        'acls': {'changed': acls},
+        'smb_shares': smb,
+        'nfs_shares': nfs,
+    }
+
+
+def main():
+    """Print the stored ACL fingerprints of a host."""
+    if len(sys.argv) != 3 or sys.argv[1] != 'fingerprints':
+        print("Usage: audit_state.py fingerprints <state_dir>", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        print(json.dumps(acl_fingerprints(sys.argv[2])))
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
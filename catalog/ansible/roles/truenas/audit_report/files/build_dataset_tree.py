@@ -4,7 +4,9 @@ Build recursive dataset tree structure from TrueNAS dataset list.
 """
 import json
 import sys
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable
+
+from audit_io import iter_json
 
 
 def format_size(size_bytes: str) -> str:
@@ -51,174 +53,140 @@ def clean_properties(props: dict) -> dict:
     return cleaned
 
 
-def build_dataset_tree(datasets: List[Dict], pool_name: str) -> Dict[str, Any]:
-    """Build recursive tree structure for datasets in a pool."""
+def dataset_properties(dataset_info: Dict, default_mountpoint: str = 'none') -> Dict[str, Any]:
+    """Extract the report properties of a dataset, with size formatting."""
+    # Extract core properties
+    dataset_props = {
+        'type': dataset_info.get('type', 'filesystem'),
+        'mountpoint': dataset_info.get('mountpoint', default_mountpoint),
+    }
     
-    def add_dataset_to_tree(tree: Dict, dataset: Dict, path_parts: List[str], full_path: str) -> None:
-        """Recursively add dataset to tree structure."""
-        if not path_parts:
-            return
-            
-        current_name = path_parts[0]
-        remaining_parts = path_parts[1:]
-        
-        if current_name not in tree:
-            # Find the dataset info for this path
-            dataset_info = None
-            if remaining_parts:
-                # This is an intermediate path, find the dataset
-                intermediate_path = pool_name + '/' + '/'.join(path_parts[:len(path_parts) - len(remaining_parts)])
-                for d in datasets:
-                    if d['name'] == intermediate_path:
-                        dataset_info = d
-                        break
-            else:
-                # This is the final dataset
-                dataset_info = dataset
-            
-            if dataset_info:
-                # Extract core properties with size formatting
-                dataset_props = {
-                    'type': dataset_info.get('type', 'filesystem'),
-                    'mountpoint': dataset_info.get('mountpoint', 'none'),
-                }
-                
-                # Add compression if not inherit
-                compression = dataset_info.get('compression', {}).get('value', 'inherit')
-                if compression != 'inherit':
-                    dataset_props['compression'] = compression
-                
-                # Add quota if not none/inherit
-                quota = format_size(dataset_info.get('quota', {}).get('parsed', 'none'))
-                if quota:
-                    dataset_props['quota'] = quota
-                    
-                # Add reservation if not none/inherit
-                reservation = format_size(dataset_info.get('reservation', {}).get('parsed', 'none'))
-                if reservation:
-                    dataset_props['reservation'] = reservation
-                
-                # Add extended properties if available
-                if 'properties' in dataset_info:
-                    props = dataset_info['properties']
-                    extended_props = {
-                        'description': props.get('description', {}).get('value', ''),
-                        'recordsize': props.get('recordsize', {}).get('value', 'inherit'),
-                        'atime': props.get('atime', {}).get('value', 'inherit'),
-                        'readonly': props.get('readonly', {}).get('value', 'inherit'),
-                        'deduplication': props.get('deduplication', {}).get('value', 'inherit'),
-                        'sync': props.get('sync', {}).get('value', 'inherit'),
-                        'snapdir': props.get('snapdir', {}).get('value', 'inherit'),
-                        'copies': props.get('copies', {}).get('value', 'inherit'),
-                        'refquota': format_size(props.get('refquota', {}).get('parsed', 'none')),
-                        'refreservation': format_size(props.get('refreservation', {}).get('parsed', 'none')),
-                    }
-                    dataset_props.update(clean_properties(extended_props))
-                
-                # Note: ACLs are extracted separately in the process.yml task
-                
-                dataset_props['datasets'] = {}
-                tree[current_name] = dataset_props
-            else:
-                # Placeholder for intermediate paths - only show type and datasets
-                tree[current_name] = {
-                    'type': 'filesystem',
-                    'datasets': {}
-                }
+    # Add compression if not inherit
+    compression = dataset_info.get('compression', {}).get('value', 'inherit')
+    if compression != 'inherit':
+        dataset_props['compression'] = compression
+    
+    # Add quota if not none/inherit
+    quota = format_size(dataset_info.get('quota', {}).get('parsed', 'none'))
+    if quota:
+        dataset_props['quota'] = quota
         
-        if remaining_parts:
-            add_dataset_to_tree(tree[current_name]['datasets'], dataset, remaining_parts, full_path)
-    
-    # Filter datasets for this pool
-    pool_datasets = [d for d in datasets if d.get('pool') == pool_name]
-    
-    tree = {}
-    
-    # Find root dataset
-    root_dataset = None
-    for dataset in pool_datasets:
-        if dataset['name'] == pool_name:
-            root_dataset = dataset
-            break
-    
-    if root_dataset:
-        # Extract core properties for root with size formatting
-        root_props = {
-            'type': root_dataset.get('type', 'filesystem'),
-            'mountpoint': root_dataset.get('mountpoint', f'/mnt/{pool_name}'),
+    # Add reservation if not none/inherit
+    reservation = format_size(dataset_info.get('reservation', {}).get('parsed', 'none'))
+    if reservation:
+        dataset_props['reservation'] = reservation
+    
+    # Add extended properties if available
+    if 'properties' in dataset_info:
+        props = dataset_info['properties']
+        extended_props = {
+            'description': props.get('description', {}).get('value', ''),
+            'recordsize': props.get('recordsize', {}).get('value', 'inherit'),
+            'atime': props.get('atime', {}).get('value', 'inherit'),
+            'readonly': props.get('readonly', {}).get('value', 'inherit'),
+            'deduplication': props.get('deduplication', {}).get('value', 'inherit'),
+            'sync': props.get('sync', {}).get('value', 'inherit'),
+            'snapdir': props.get('snapdir', {}).get('value', 'inherit'),
+            'copies': props.get('copies', {}).get('value', 'inherit'),
+            'refquota': format_size(props.get('refquota', {}).get('parsed', 'none')),
+            'refreservation': format_size(props.get('refreservation', {}).get('parsed', 'none')),
         }
-        
-        # Add compression if not inherit
-        compression = root_dataset.get('compression', {}).get('value', 'inherit')
-        if compression != 'inherit':
-            root_props['compression'] = compression
-        
-        # Add quota if not none/inherit
-        quota = format_size(root_dataset.get('quota', {}).get('parsed', 'none'))
-        if quota:
-            root_props['quota'] = quota
-            
-        # Add reservation if not none/inherit
-        reservation = format_size(root_dataset.get('reservation', {}).get('parsed', 'none'))
-        if reservation:
-            root_props['reservation'] = reservation
-        
-        # Add extended properties if available
-        if 'properties' in root_dataset:
-            props = root_dataset['properties']
-            extended_props = {
-                'description': props.get('description', {}).get('value', ''),
-                'recordsize': props.get('recordsize', {}).get('value', 'inherit'),
-                'atime': props.get('atime', {}).get('value', 'inherit'),
-                'readonly': props.get('readonly', {}).get('value', 'inherit'),
-                'deduplication': props.get('deduplication', {}).get('value', 'inherit'),
-                'sync': props.get('sync', {}).get('value', 'inherit'),
-                'snapdir': props.get('snapdir', {}).get('value', 'inherit'),
-                'copies': props.get('copies', {}).get('value', 'inherit'),
-                'refquota': format_size(props.get('refquota', {}).get('parsed', 'none')),
-                'refreservation': format_size(props.get('refreservation', {}).get('parsed', 'none')),
+        dataset_props.update(clean_properties(extended_props))
+    
+    # Note: ACLs are merged in separately (see merge_acls_datasets.py)
+    
+    dataset_props['datasets'] = {}
+    return dataset_props
+
+
+def build_dataset_trees(datasets: Iterable[Dict], pool_names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Build the recursive dataset tree of each pool in a single pass.
+    
+    Datasets are indexed by name first, so that intermediate nodes are
+    looked up rather than searched for, and each node is created once.
+    Children appear in the order of their first dataset in the input.
+    """
+    pool_names = list(pool_names)
+    wanted = set(pool_names)
+    
+    # Index the datasets of the requested pools by name, keeping input order
+    by_name = {}
+    for dataset in datasets:
+        if dataset.get('pool') in wanted:
+            by_name[dataset['name']] = dataset
+    
+    # Build each pool's root node. Without a root dataset, the tree starts
+    # from the first level of datasets.
+    trees = {}
+    containers = {}
+    for pool_name in pool_names:
+        root_dataset = by_name.get(pool_name)
+        if root_dataset is not None:
+            trees[pool_name] = dataset_properties(root_dataset, f'/mnt/{pool_name}')
+            containers[pool_name] = trees[pool_name]['datasets']
+        else:
+            trees[pool_name] = {}
+            containers[pool_name] = trees[pool_name]
+    
+    # Full dataset name -> child dict of that node
+    children = dict(containers)
+    
+    def node_children(name: str) -> Dict:
+        """Return the child dict of the node for 'name', creating the node
+        (and its missing ancestors) if needed."""
+        found = children.get(name)
+        if found is not None:
+            return found
+        parent, _, leaf = name.rpartition('/')
+        parent_children = node_children(parent)
+        dataset_info = by_name.get(name)
+        if dataset_info is not None:
+            node = dataset_properties(dataset_info)
+        else:
+            # Placeholder for intermediate paths - only show type and datasets
+            node = {
+                'type': 'filesystem',
+                'datasets': {}
             }
-            root_props.update(clean_properties(extended_props))
-        
-        # Note: ACLs are extracted separately in the process.yml task
-        
-        root_props['datasets'] = {}
-        
-        # Don't use 'root' key, return the properties directly as the pool level
-        tree = root_props
-    
-    # Process all other datasets
-    for dataset in pool_datasets:
-        if dataset['name'] == pool_name:
-            continue  # Skip root, already processed
-            
-        # Get relative path
-        if dataset['name'].startswith(pool_name + '/'):
-            relative_path = dataset['name'][len(pool_name) + 1:]
-            path_parts = relative_path.split('/')
-            
-            if root_dataset:
-                add_dataset_to_tree(tree['datasets'], dataset, path_parts, dataset['name'])
-            else:
-                # No root dataset, create tree from first level
-                add_dataset_to_tree(tree, dataset, path_parts, dataset['name'])
+        parent_children[leaf] = node
+        children[name] = node['datasets']
+        return node['datasets']
+    
+    for name, dataset in by_name.items():
+        if name != dataset['pool'] and name.startswith(dataset['pool'] + '/'):
+            node_children(name)
     
-    return tree
+    return trees
+
+
+def build_dataset_tree(datasets: Iterable[Dict], pool_name: str) -> Dict[str, Any]:
+    """Build recursive tree structure for datasets in a pool."""
+    return build_dataset_trees(datasets, [pool_name])[pool_name]
 
 
 def main():
-    """Main function to process datasets and build tree."""
-    if len(sys.argv) != 3:
-        print("Usage: build_dataset_tree.py <datasets_json> <pool_name>", file=sys.stderr)
+    """Main function to process datasets and build trees."""
+    if len(sys.argv) < 2:
+        print("Usage: build_dataset_tree.py <datasets_json|file|-> [pool_name ...]", file=sys.stderr)
         sys.exit(1)
     
-    datasets_json = sys.argv[1]
-    pool_name = sys.argv[2]
+    datasets_arg = sys.argv[1]
+    pool_names = sys.argv[2:]
     
     try:
-        datasets = json.loads(datasets_json)
-        tree = build_dataset_tree(datasets, pool_name)
-        print(json.dumps(tree, indent=2))
+        if len(pool_names) == 1:
+            # A single pool prints that pool's tree
+            tree = build_dataset_tree(iter_json(datasets_arg), pool_names[0])
+            print(json.dumps(tree, indent=2))
+            return
+        
+        # Otherwise print the trees of the given pools, or of every pool,
+        # keyed by pool name
+        datasets = list(iter_json(datasets_arg))
+        if not pool_names:
+            pool_names = list(dict.fromkeys(d['pool'] for d in datasets if d.get('pool')))
+        trees = build_dataset_trees(datasets, pool_names)
+        print(json.dumps(trees, indent=2))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -4,7 +4,10 @@ Build disk information with links to zpools.
 """
 import json
 import sys
-from typing import Dict, List
+from typing import Any, Dict, Iterable, List, Optional
+
+from audit_io import iter_json
+from pool_topology import index_topology
 
 
 def format_size(size_bytes: str) -> str:
@@ -42,31 +45,22 @@ def format_size(size_bytes: str) -> str:
     return f"{size}B"
 
 
-def find_disk_pools(disk_name: str, pools_data: List[Dict]) -> List[str]:
-    """Find which pools use a specific disk."""
-    pools = []
-    
-    for pool in pools_data:
-        topology = pool.get('topology', {})
-        for _vdev_type, vdevs in topology.items():
-            if vdevs:
-                for vdev in vdevs:
-                    if 'children' in vdev and vdev['children']:
-                        for disk in vdev['children']:
-                            if disk.get('name') == disk_name:
-                                pools.append(pool['name'])
-                                break
+def build_disk_info(disks_data: Iterable[Dict], pools_data: List[Dict],
+                    topology: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Build disk information list with pool associations.
     
-    return list(set(pools))  # Remove duplicates
-
-
-def build_disk_info(disks_data: List[Dict], pools_data: List[Dict]) -> List[Dict]:
-    """Build disk information list with pool associations."""
+    'topology' is the result of index_topology(pools_data), if the caller
+    already has it.
+    """
+    if topology is None:
+        topology = index_topology(pools_data)
     disks = []
     
     for disk in disks_data:
-        # Find which pools use this disk
-        pools = find_disk_pools(disk.get('name', ''), pools_data)
+        # Find which pools (and vdev roles) use this disk
+        usages = topology['disks'].get(disk.get('name', ''), [])
+        pools = sorted({usage['pool'] for usage in usages})
+        roles = sorted({usage['role'] for usage in usages})
         
         # Calculate formatted size
         size_gb = None
@@ -81,9 +75,13 @@ def build_disk_info(disks_data: List[Dict], pools_data: List[Dict]) -> List[Dict
             'size': disk.get('size', ''),
             'type': disk.get('type', ''),
             'model': disk.get('model', 'Unknown'),
-            'pools': pools  # List of pools using this disk
+            'pools': pools,  # List of pools using this disk
         }
         
+        # Add vdev roles unless the disk is only used for data
+        if roles and roles != ['data']:
+            disk_info['roles'] = roles
+        
         # Add size_formatted if we have a valid size
         if size_gb is not None:
             disk_info['size_formatted'] = f"{size_gb}GB"
@@ -107,15 +105,15 @@ def build_disk_info(disks_data: List[Dict], pools_data: List[Dict]) -> List[Dict
 def main():
     """Main function to process disks and build info."""
     if len(sys.argv) != 3:
-        print("Usage: build_disk_info.py <disks_json> <pools_json>", file=sys.stderr)
+        print("Usage: build_disk_info.py <disks_json|file|-> <pools_json|file|->", file=sys.stderr)
         sys.exit(1)
     
-    disks_json = sys.argv[1]
-    pools_json = sys.argv[2]
+    disks_arg = sys.argv[1]
+    pools_arg = sys.argv[2]
     
     try:
-        disks_data = json.loads(disks_json)
-        pools_data = json.loads(pools_json)
+        pools_data = list(iter_json(pools_arg))
+        disks_data = iter_json(disks_arg)
         disks_info = build_disk_info(disks_data, pools_data)
         print(json.dumps(disks_info, indent=2))
     except Exception as e:
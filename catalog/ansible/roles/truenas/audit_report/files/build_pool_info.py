@@ -4,19 +4,28 @@ Build pool information with topology and disk details.
 """
 import json
 import sys
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable, List, Optional
 
+from audit_io import iter_json
+from pool_topology import index_topology
 
-def build_pool_info(pools_data: List[Dict], disks_data: List[Dict]) -> Dict[str, Any]:
-    """Build pool information dictionary."""
+
+def build_pool_info(pools_data: List[Dict], disks_data: Iterable[Dict],
+                    topology: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build pool information dictionary.
+    
+    'topology' is the result of index_topology(pools_data), if the caller
+    already has it.
+    """
+    if topology is None:
+        topology = index_topology(pools_data)
     pools = {}
     
-    # Create mapping from UUID/path to disk info
+    # Create mapping from device name to disk info
     disk_map = {}
     for disk in disks_data:
-        disk_map[disk.get('name', '')] = disk
-        if disk.get('serial'):
-            disk_map[disk['serial']] = disk
+        if disk.get('name'):
+            disk_map[disk['name']] = disk
     
     for pool in pools_data:
         pool_name = pool['name']
@@ -28,57 +37,45 @@ def build_pool_info(pools_data: List[Dict], disks_data: List[Dict]) -> Dict[str,
         }
         
         # Add topology information
-        topology = pool.get('topology', {})
-        if topology:
+        roles = topology['pools'].get(pool_name, {})
+        if pool.get('topology'):
             pool_info['topology'] = {}
             
-            for vdev_type, vdevs in topology.items():
-                if vdevs:  # Only add if there are vdevs
-                    pool_info['topology'][vdev_type] = []
+            for vdev_role, vdevs in roles.items():
+                pool_info['topology'][vdev_role] = []
+                
+                for vdev in vdevs:
+                    vdev_info = {
+                        'type': vdev['type']
+                    }
+                    
+                    # Add leaf disks, including those of nested vdevs
+                    if vdev['leaves']:
+                        vdev_info['disks'] = []
+                        for leaf in vdev['leaves']:
+                            disk_identifier = leaf.get('disk') or ''
+                            
+                            disk_info = {
+                                'uuid': leaf.get('name', 'unknown'),
+                                'path': leaf.get('path', ''),
+                                'status': leaf.get('status', 'UNKNOWN')
+                            }
+                            
+                            # Add physical disk identifier if found
+                            physical_disk = disk_map.get(disk_identifier)
+                            if physical_disk:
+                                disk_info['device'] = physical_disk.get('name', disk_identifier)
+                                if physical_disk.get('serial'):
+                                    disk_info['serial'] = physical_disk['serial']
+                            else:
+                                disk_info['device'] = disk_identifier
+                            
+                            # Only add non-empty values
+                            clean_disk = {k: v for k, v in disk_info.items() if v}
+                            if clean_disk:
+                                vdev_info['disks'].append(clean_disk)
                     
-                    for vdev in vdevs:
-                        vdev_info = {
-                            'type': vdev.get('type', 'unknown')
-                        }
-                        
-                        # Add children (disks) if available
-                        if 'children' in vdev and vdev['children']:
-                            vdev_info['disks'] = []
-                            for disk in vdev['children']:
-                                disk_name = disk.get('name', 'unknown')
-                                disk_path = disk.get('path', '')
-                                
-                                # Try to find corresponding physical disk
-                                physical_disk = None
-                                disk_identifier = disk.get('disk', '')
-                                
-                                # Look for physical disk by name or identifier
-                                for phys_disk in disks_data:
-                                    if (phys_disk.get('name') == disk_identifier or 
-                                        disk_identifier in phys_disk.get('name', '')):
-                                        physical_disk = phys_disk
-                                        break
-                                
-                                disk_info = {
-                                    'uuid': disk_name,
-                                    'path': disk_path,
-                                    'status': disk.get('status', 'UNKNOWN')
-                                }
-                                
-                                # Add physical disk identifier if found
-                                if physical_disk:
-                                    disk_info['device'] = physical_disk.get('name', disk_identifier)
-                                    if physical_disk.get('serial'):
-                                        disk_info['serial'] = physical_disk['serial']
-                                else:
-                                    disk_info['device'] = disk_identifier
-                                
-                                # Only add non-empty values
-                                clean_disk = {k: v for k, v in disk_info.items() if v}
-                                if clean_disk:
-                                    vdev_info['disks'].append(clean_disk)
-                        
-                        pool_info['topology'][vdev_type].append(vdev_info)
+                    pool_info['topology'][vdev_role].append(vdev_info)
         
         pools[pool_name] = pool_info
     
@@ -88,15 +85,15 @@ def build_pool_info(pools_data: List[Dict], disks_data: List[Dict]) -> Dict[str,
 def main():
     """Main function to process pools and build info."""
     if len(sys.argv) != 3:
-        print("Usage: build_pool_info.py <pools_json> <disks_json>", file=sys.stderr)
+        print("Usage: build_pool_info.py <pools_json|file|-> <disks_json|file|->", file=sys.stderr)
         sys.exit(1)
     
-    pools_json = sys.argv[1]
-    disks_json = sys.argv[2]
+    pools_arg = sys.argv[1]
+    disks_arg = sys.argv[2]
     
     try:
-        pools_data = json.loads(pools_json)
-        disks_data = json.loads(disks_json)
+        pools_data = list(iter_json(pools_arg))
+        disks_data = iter_json(disks_arg)
         pools_info = build_pool_info(pools_data, disks_data)
         print(json.dumps(pools_info, indent=2))
     except Exception as e:
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Export the audit report data as tables, for loading fleet-wide audits in bulk.
+
+Each table is written to its own file, as line-delimited JSON or CSV:
+
+  datasets.<ext>     one row per dataset (from build_dataset_tree.py)
+  disks.<ext>        one row per disk (from build_disk_info.py)
+  acl_entries.<ext>  one row per ACL entry of a dataset (from simplify_acls.py)
+  shares.<ext>       one row per SMB or NFS share
+
+Every row starts with the hostname and timestamp of the audit, and all rows of
+a table have the same columns. Rows are generated and written one at a time.
+"""
+import csv
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from audit_io import load_json, write_file
+from merge_acls_datasets import SAME_AS_PARENT
+
+
+FORMATS = ('ndjson', 'csv')
+
+DATASET_COLUMNS = [
+    'hostname', 'timestamp', 'dataset', 'pool', 'parent', 'depth', 'children',
+    'type', 'mountpoint', 'compression', 'quota', 'reservation', 'description',
+    'recordsize', 'atime', 'readonly', 'deduplication', 'sync', 'snapdir',
+    'copies', 'refquota', 'refreservation', 'acl_type', 'acl_custom', 'acl_entries',
+]
+
+DISK_COLUMNS = [
+    'hostname', 'timestamp', 'name', 'serial', 'size', 'size_formatted', 'type',
+    'model', 'temperature', 'smart_enabled', 'pools', 'roles',
+]
+
+ACL_ENTRY_COLUMNS = [
+    'hostname', 'timestamp', 'dataset', 'acl_type', 'custom', 'position', 'who',
+    'access', 'flags', 'type',
+]
+
+SHARE_COLUMNS = [
+    'hostname', 'timestamp', 'protocol', 'name', 'path', 'enabled', 'readonly',
+    'comment',
+]
+
+
+def walk_datasets(trees: Dict[str, Any],
+                  acls: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Dict, int, Optional[Dict]]]:
+    """Yield (full name, node, depth, ACL) for every dataset of the trees,
+    parents before their children.
+    
+    ACLs deduplicated by merge_acls_datasets.dedup_acls() are looked up in
+    the 'acls' table, or taken from the parent dataset.
+    
+    The tree of a pool without a root dataset is the dict of its first
+    level of datasets (see build_dataset_tree.py), which start at depth 1.
+    """
+    stack = []
+    for pool_name, tree in reversed(list(trees.items())):
+        if 'datasets' in tree:
+            stack.append((pool_name, tree, 0, None))
+        else:
+            for child_name in reversed(list(tree)):
+                stack.append((f"{pool_name}/{child_name}", tree[child_name], 1, None))
+    while stack:
+        name, node, depth, parent_acl = stack.pop()
+        acl = node.get('acl')
+        if acl == SAME_AS_PARENT:
+            acl = parent_acl
+        elif isinstance(acl, str):
+            acl = (acls or {}).get(acl)
+        yield name, node, depth, acl
+        children = node.get('datasets') or {}
+        for child_name in reversed(list(children)):
+            stack.append((f"{name}/{child_name}", children[child_name], depth + 1, acl))
+
+
+def dataset_rows(trees: Dict[str, Any], acls: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    for name, node, depth, acl in walk_datasets(trees, acls):
+        row = {k: v for k, v in node.items() if k not in ('datasets', 'acl')}
+        row.update({
+            'dataset': name,
+            'pool': name.split('/', 1)[0],
+            'parent': name.rsplit('/', 1)[0] if depth else None,
+            'depth': depth,
+            'children': len(node.get('datasets') or {}),
+        })
+        if acl:
+            row['acl_type'] = acl.get('type')
+            row['acl_custom'] = bool(acl.get('custom'))
+            row['acl_entries'] = len(acl.get('permissions') or [])
+        yield row
+
+
+def acl_entry_rows(trees: Dict[str, Any], acls: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield one row per entry of the ACL of each dataset."""
+    for name, _, _, acl in walk_datasets(trees, acls):
+        if not acl:
+            continue
+        for position, entry in enumerate(acl.get('permissions') or []):
+            row = {
+                'dataset': name,
+                'acl_type': acl.get('type'),
+                'custom': bool(acl.get('custom')),
+                'position': position,
+            }
+            row.update(entry)
+            yield row
+
+
+def share_rows(smb_shares: Iterable[Dict], nfs_shares: Iterable[Dict]) -> Iterator[Dict[str, Any]]:
+    for share in smb_shares:
+        yield {
+            'protocol': 'smb',
+            'name': share.get('name'),
+            'path': share.get('path'),
+            'enabled': share.get('enabled'),
+            'readonly': share.get('ro'),
+            'comment': share.get('comment'),
+        }
+    for share in nfs_shares:
+        yield {
+            'protocol': 'nfs',
+            # Exports from before TrueNAS SCALE 22.12.2 have 'paths'
+            'path': share['path'] if 'path' in share else share.get('paths'),
+            'enabled': share.get('enabled'),
+            'readonly': share.get('ro'),
+            'comment': share.get('comment'),
+        }
+
+
+def csv_value(value: Any) -> Any:
+    """Convert a value to a CSV field."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ','.join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def write_table(rows: Iterable[Dict[str, Any]], columns: List[str], common: Dict[str, Any],
+                out: IO[str], fmt: str = 'ndjson') -> int:
+    """Write the rows of a table, with the 'common' fields added to each
+    one, and return the number of rows written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([csv_value(common[c] if c in common else row.get(c)) for c in columns])
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps({c: common[c] if c in common else row.get(c) for c in columns}))
+            out.write('\n')
+            count += 1
+    return count
+
+
+def report_tables(report: Dict[str, Any]) -> List[Tuple[str, List[str], Callable[[], Iterator[Dict]]]]:
+    """Return (name, columns, rows) of each table of the report data."""
+    datasets = report.get('datasets') or {}
+    acls = report.get('acls')
+    return [
+        ('datasets', DATASET_COLUMNS, lambda: dataset_rows(datasets, acls)),
+        ('disks', DISK_COLUMNS, lambda: iter(report.get('disks') or [])),
+        ('acl_entries', ACL_ENTRY_COLUMNS, lambda: acl_entry_rows(datasets, acls)),
+        ('shares', SHARE_COLUMNS, lambda: share_rows(report.get('smb_shares') or [],
+                                                     report.get('nfs_shares') or [])),
+    ]
+
+
+def export_tables(report: Dict[str, Any], export_dir: str, fmt: str = 'ndjson') -> Dict[str, int]:
+    """Write each table of the report data to export_dir, and return the
+    number of rows of each."""
+    os.makedirs(export_dir, exist_ok=True)
+    common = {'hostname': report.get('hostname'), 'timestamp': report.get('timestamp')}
+    counts = {}
+    for name, columns, rows in report_tables(report):
+        def write(f, rows=rows, columns=columns, name=name):
+            counts[name] = write_table(rows(), columns, common, f, fmt)
+        write_file(os.path.join(export_dir, f"{name}.{fmt}"), write)
+    return counts
+
+
+def main():
+    """Export the tables of report data in JSON (e.g. from audit_engine.py)."""
+    if len(sys.argv) not in (3, 4) or (len(sys.argv) == 4 and sys.argv[3] not in FORMATS):
+        print("Usage: columnar_export.py <report_json|file|-> <export_dir> [ndjson|csv]", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        report = load_json(sys.argv[1])
+        counts = export_tables(report, sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else 'ndjson')
+        print(json.dumps(counts))
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,12 @@
 """
 Merge ACL information into dataset tree structure.
 """
+import hashlib
 import json
 import sys
-from typing import Dict, Any
+from typing import Any, Dict, Optional
+
+from audit_io import load_json
 
 
 def merge_acls_into_tree(datasets_tree: Dict[str, Any], acls_by_dataset: Dict[str, Any]) -> Dict[str, Any]:
@@ -46,21 +49,64 @@ def merge_acls_into_tree(datasets_tree: Dict[str, Any], acls_by_dataset: Dict[st
     return merged_tree
 
 
+# Value of a node's 'acl' when its ACL is the same as its parent's
+SAME_AS_PARENT = 'inherit'
+
+
+def acl_id(acl: Dict[str, Any]) -> str:
+    """Return a short content hash identifying an ACL."""
+    canonical = json.dumps(acl, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def dedup_acls(datasets_tree: Dict[str, Any]) -> Dict[str, Any]:
+    """Move each distinct ACL of the merged tree into a table, in place.
+    
+    Each node's 'acl' becomes the id of its ACL in the table, or
+    SAME_AS_PARENT if it is identical to its parent dataset's ACL. Returns
+    the table of ACLs by id.
+    """
+    table = {}
+    
+    def dedup_recursive(tree_node: Dict, parent_id: Optional[str]) -> None:
+        own_id = None
+        acl = tree_node.get('acl')
+        if isinstance(acl, dict):
+            own_id = acl_id(acl)
+            table.setdefault(own_id, acl)
+            tree_node['acl'] = SAME_AS_PARENT if own_id == parent_id else own_id
+        
+        if 'datasets' in tree_node and isinstance(tree_node['datasets'], dict):
+            for child_node in tree_node['datasets'].values():
+                dedup_recursive(child_node, own_id)
+    
+    for pool_tree in datasets_tree.values():
+        dedup_recursive(pool_tree, None)
+    
+    return table
+
+
 def main():
     """Main function to merge ACLs into datasets tree."""
-    if len(sys.argv) != 3:
-        print("Usage: merge_acls_datasets.py <datasets_tree_json> <acls_by_dataset_json>", file=sys.stderr)
+    if len(sys.argv) not in (3, 4) or (len(sys.argv) == 4 and sys.argv[3] != '--dedup'):
+        print("Usage: merge_acls_datasets.py <datasets_tree_json|file|-> <acls_by_dataset_json|file|-> [--dedup]",
+              file=sys.stderr)
         sys.exit(1)
     
-    datasets_tree_json = sys.argv[1]
-    acls_by_dataset_json = sys.argv[2]
+    datasets_tree_arg = sys.argv[1]
+    acls_by_dataset_arg = sys.argv[2]
     
     try:
-        datasets_tree = json.loads(datasets_tree_json)
-        acls_by_dataset = json.loads(acls_by_dataset_json)
+        datasets_tree = load_json(datasets_tree_arg)
+        acls_by_dataset = load_json(acls_by_dataset_arg)
         
         merged_tree = merge_acls_into_tree(datasets_tree, acls_by_dataset)
-        print(json.dumps(merged_tree, indent=2))
+        if len(sys.argv) == 4:
+            # Print the tree along with the table of ACLs it refers to
+            acls = dedup_acls(merged_tree)
+            print(json.dumps({'datasets': merged_tree, 'acls': acls}, indent=2))
+        else:
+            print(json.dumps(merged_tree, indent=2))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
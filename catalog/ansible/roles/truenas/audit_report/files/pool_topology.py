@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Walk ZFS pool topologies once, for both the disk and the pool reports.
+"""
+from typing import Any, Dict, Iterator, List
+
+
+def vdev_leaves(vdev: Dict) -> Iterator[Dict]:
+    """Yield the leaf devices (disks) of a vdev, however deeply nested.
+
+    Mirrors and RAIDZ vdevs list their disks as children, which may
+    themselves have children (e.g. while a disk is being replaced or a
+    spare is in use). A single-disk vdev is its own leaf.
+    """
+    children = vdev.get('children') or []
+    if not children:
+        if vdev.get('type') == 'DISK' or vdev.get('disk'):
+            yield vdev
+        return
+    for child in children:
+        yield from vdev_leaves(child)
+
+
+def leaf_disk_name(leaf: Dict) -> str:
+    """Return the name of the physical disk behind a leaf device."""
+    # 'name' is the partition UUID; 'disk' is the device name, as in disk.query
+    return leaf.get('disk') or leaf.get('name', '')
+
+
+def index_topology(pools_data: List[Dict]) -> Dict[str, Any]:
+    """Walk the topology of every pool once.
+
+    Returns a dict with:
+      pools: pool name -> vdev role (data, log, cache, spare, special,
+        dedup...) -> list of {'type': vdev type, 'leaves': [leaf devices]}
+      disks: disk name -> list of {'pool': pool name, 'role': vdev role}
+    """
+    pools = {}
+    disks = {}
+
+    for pool in pools_data:
+        pool_name = pool['name']
+        roles = {}
+        for role, vdevs in (pool.get('topology') or {}).items():
+            if not vdevs:
+                continue
+            roles[role] = []
+            for vdev in vdevs:
+                leaves = list(vdev_leaves(vdev))
+                roles[role].append({'type': vdev.get('type', 'unknown'), 'leaves': leaves})
+                for leaf in leaves:
+                    usage = {'pool': pool_name, 'role': role}
+                    disk_usages = disks.setdefault(leaf_disk_name(leaf), [])
+                    if usage not in disk_usages:
+                        disk_usages.append(usage)
+        pools[pool_name] = roles
+
+    return {'pools': pools, 'disks': disks}
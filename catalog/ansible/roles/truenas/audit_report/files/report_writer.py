@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Write the TrueNAS state report as YAML or JSON.
+
+The report is written one section at a time, straight to the output file,
+with keys in a stable order: the order in which the stages build them.
+"""
+import json
+import sys
+from typing import Any, Dict, IO, Iterator, List, Tuple
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as BaseDumper
+except ImportError:
+    from yaml import SafeDumper as BaseDumper
+
+
+class SafeDumper(BaseDumper):
+    """Dump objects that appear more than once in full, rather than as
+    &anchors and *aliases, as to_nice_yaml did."""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+FORMATS = ('yaml', 'json')
+
+
+def _schedule(task: Dict) -> str:
+    """Format a task schedule as a crontab-style string."""
+    schedule = task.get('schedule') or {}
+    return ' '.join(str(schedule.get(field)) for field in ('minute', 'hour', 'dom', 'month', 'dow'))
+
+
+def system_section(system: Dict) -> Dict:
+    return {key: system.get(key) for key in ('hostname', 'version', 'uptime', 'datetime', 'timezone')}
+
+
+def disks_section(disks: List[Dict]) -> List[Dict]:
+    section = []
+    for disk in disks:
+        entry = {'name': disk['name']}
+        if 'serial' in disk:
+            entry['serial'] = disk['serial']
+        entry['size'] = disk.get('size_formatted', disk.get('size'))
+        for key in ('type', 'model', 'temperature', 'smart_enabled'):
+            if key in disk:
+                entry[key] = disk[key]
+        if disk.get('pools'):
+            entry['pools'] = disk['pools']
+        if 'roles' in disk:
+            entry['roles'] = disk['roles']
+        section.append(entry)
+    return section
+
+
+def backup_section(backup_config: Dict) -> Dict:
+    snapshot_tasks = [{
+        'dataset': task.get('dataset'),
+        'schedule': _schedule(task),
+        'lifetime_value': task.get('lifetime_value'),
+        'lifetime_unit': task.get('lifetime_unit'),
+        'enabled': task.get('enabled'),
+        'recursive': task.get('recursive'),
+    } for task in backup_config.get('snapshot_tasks') or []]
+
+    replication_tasks = [{
+        'name': task.get('name'),
+        'direction': task.get('direction'),
+        'source_datasets': task.get('source_datasets'),
+        'target_dataset': task.get('target_dataset') or '',
+        'transport': task.get('transport'),
+        'enabled': task.get('enabled'),
+        'auto': task.get('auto'),
+    } for task in backup_config.get('replication_tasks') or []]
+
+    cloudsync_tasks = [{
+        'description': task.get('description'),
+        'direction': task.get('direction'),
+        'path': task.get('path'),
+        'enabled': task.get('enabled'),
+        'schedule': _schedule(task),
+    } for task in backup_config.get('cloudsync_tasks') or []]
+
+    rsync_tasks = []
+    for task in backup_config.get('rsync_tasks') or []:
+        entry = {
+            'path': task.get('path'),
+            'user': task.get('user'),
+            'remotehost': task.get('remotehost') or '',
+            'remotemodule': task.get('remotemodule') or '',
+        }
+        if 'remotepath' in task:
+            entry['remotepath'] = task['remotepath']
+        entry['direction'] = task.get('direction')
+        entry['enabled'] = task.get('enabled')
+        rsync_tasks.append(entry)
+
+    return {
+        'snapshot_tasks': snapshot_tasks,
+        'replication_tasks': replication_tasks,
+        'cloudsync_tasks': cloudsync_tasks,
+        'rsync_tasks': rsync_tasks,
+    }
+
+
+def _share_path(share: Dict) -> Any:
+    # Exports from before TrueNAS SCALE 22.12.2 have 'paths'
+    return share['path'] if 'path' in share else share.get('paths')
+
+
+def report_sections(report: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """Yield the (name, content) of each report section, in order."""
+    yield 'system', system_section(report.get('system') or {})
+    yield 'disks', disks_section(report.get('disks') or [])
+    yield 'zpools', report.get('zpools') or {}
+    yield 'datasets', report.get('datasets') or {}
+    if 'acls' in report:
+        yield 'acls', report['acls']
+    yield 'backup_configuration', backup_section(report.get('backup_config') or {})
+    yield 'smb_shares', [{'name': share.get('name'), 'path': share.get('path'), 'enabled': share.get('enabled')}
+                         for share in report.get('smb_shares') or []]
+    yield 'nfs_shares', [{'path': _share_path(share), 'enabled': share.get('enabled')}
+                         for share in report.get('nfs_shares') or []]
+    yield 'services', [{'service': service.get('service'), 'enabled': service.get('enable'),
+                        'running': service.get('state') == 'RUNNING'}
+                       for service in report.get('services') or []]
+
+
+def write_yaml_sections(sections: Iterator[Tuple[str, Any]], out: IO[str]) -> None:
+    """Write sections as a YAML document, dumping each one to the stream as
+    it comes."""
+    for name, content in sections:
+        yaml.dump({name: content}, out, Dumper=SafeDumper, sort_keys=False,
+                  default_flow_style=False, allow_unicode=True, width=120)
+        out.write('\n')
+
+
+def write_json_sections(sections: Iterator[Tuple[str, Any]], out: IO[str]) -> None:
+    """Write sections as a JSON object, one section at a time."""
+    out.write('{')
+    for i, (name, content) in enumerate(sections):
+        out.write(',\n' if i else '\n')
+        out.write(f"{json.dumps(name)}: {json.dumps(content, indent=2)}")
+    out.write('\n}\n')
+
+
+def write_report(report: Dict[str, Any], out: IO[str], fmt: str = 'yaml') -> None:
+    """Write the state report to a stream."""
+    if fmt == 'json':
+        sections = [('timestamp', report.get('timestamp')), ('hostname', report.get('hostname'))]
+        write_json_sections(iter(sections + list(report_sections(report))), out)
+        return
+    out.write("---\n")
+    out.write("# TrueNAS State Report\n")
+    out.write(f"# Generated on: {report.get('timestamp')}\n")
+    out.write(f"# Hostname: {report.get('hostname')}\n\n")
+    write_yaml_sections(report_sections(report), out)
+
+
+def write_delta(delta: Dict[str, Any], out: IO[str], fmt: str = 'yaml') -> None:
+    """Write the delta report to a stream."""
+    if fmt == 'json':
+        write_json_sections(iter(delta.items()), out)
+        return
+    out.write("---\n")
+    out.write("# TrueNAS State Delta Report\n")
+    out.write(f"# Changes since: {delta.get('previous', {}).get('timestamp')}\n\n")
+    write_yaml_sections(iter(delta.items()), out)
+
+
+def main():
+    """Write the report for report data in JSON (e.g. from audit_engine.py)."""
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] not in FORMATS):
+        print("Usage: report_writer.py <report_json|file|-> [yaml|json]", file=sys.stderr)
+        sys.exit(1)
+
+    from audit_io import load_json
+
+    try:
+        report = load_json(sys.argv[1])
+        write_report(report, sys.stdout, sys.argv[2] if len(sys.argv) == 3 else 'yaml')
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,11 @@
 """
 Simplify ACL entries for better readability in reports.
 """
-import json
 import sys
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from audit_io import dump_json_array, iter_json
 
 
 def simplify_permissions(perms: Dict) -> str:
@@ -80,6 +82,70 @@ def simplify_tag(tag: str, acl_id: int, users_map: Dict, groups_map: Dict) -> st
         return tag.lower()
 
 
+EMPTY: Dict = {}
+
+
+def freeze(mapping: Dict) -> Tuple:
+    """Return a canonical, hashable form of a perms or flags dict."""
+    if not mapping:
+        return ()
+    return tuple(sorted(mapping.items()))
+
+
+# NFSv4 ACLs repeat the same few permission and flag sets over and over, so
+# each distinct set is simplified once, and the resulting strings interned.
+@lru_cache(maxsize=4096)
+def simplify_frozen_permissions(frozen_perms: Tuple) -> str:
+    """Cached simplify_permissions() for a frozen perms dict."""
+    return sys.intern(simplify_permissions(dict(frozen_perms)))
+
+
+@lru_cache(maxsize=4096)
+def simplify_frozen_flags(frozen_flags: Tuple) -> str:
+    """Cached simplify_flags() for a frozen flags dict."""
+    return sys.intern(simplify_flags(dict(frozen_flags)))
+
+
+def simplify_entry(entry: Dict, users_map: Dict, groups_map: Dict) -> Dict:
+    """Simplify a single ACL entry, or return None to leave it out."""
+    tag = entry.get("tag", "")
+    acl_id = entry.get("id", -1)
+    perms = entry.get("perms", {})
+    flags = entry.get("flags", {})
+    entry_type = entry.get("type", "ALLOW")
+    
+    # Skip inherited entries for cleaner output
+    if flags and flags.get("INHERITED", False):
+        return None
+    
+    # Skip entries with id: -1 unless they're meaningful
+    if acl_id == -1 and tag not in ["USER_OBJ", "GROUP_OBJ", "OTHER", "owner@", "group@", "everyone@"]:
+        return None
+    
+    try:
+        access = simplify_frozen_permissions(freeze(perms))
+        flag_str = simplify_frozen_flags(freeze(flags))
+    except TypeError:
+        # Unhashable values; not worth caching
+        access = simplify_permissions(perms)
+        flag_str = simplify_flags(flags)
+    
+    simplified_entry = {
+        "who": sys.intern(simplify_tag(tag, acl_id, users_map, groups_map)),
+        "access": access
+    }
+    
+    # Add flags if meaningful
+    if flag_str:
+        simplified_entry["flags"] = flag_str
+    
+    # Add type if not ALLOW (which is default)
+    if entry_type != "ALLOW":
+        simplified_entry["type"] = entry_type.lower()
+    
+    return simplified_entry
+
+
 def build_users_map(users_data: List[Dict]) -> Dict[int, str]:
     """Build mapping from UID to username."""
     users_map = {}
@@ -102,14 +168,22 @@ def build_groups_map(groups_data: List[Dict]) -> Dict[int, str]:
     return groups_map
 
 
-def simplify_acls(acls_data: List[Dict], users_data: List[Dict], groups_data: List[Dict]) -> List[Dict]:
+def simplify_acls(acls_data: Iterable[Dict], users_data: Iterable[Dict], groups_data: Iterable[Dict]) -> List[Dict]:
     """Simplify ACL entries for better readability with user/group name resolution."""
-    simplified = []
-    
+    return list(iter_simplified_acls(acls_data, users_data, groups_data))
+
+
+def iter_simplified_acls(acls_data: Iterable[Dict], users_data: Iterable[Dict],
+                         groups_data: Iterable[Dict]) -> Iterator[Dict]:
+    """Yield simplified ACLs one at a time, as acls_data is consumed."""
     # Build lookup maps
     users_map = build_users_map(users_data)
     groups_map = build_groups_map(groups_data)
     
+    # Simplified entry for each distinct (tag, id, perms, flags, type), so
+    # that an entry repeated across datasets is only simplified once
+    entry_cache = {}
+    
     for acl in acls_data:
         if not acl.get("entries"):
             # Skip ACLs without entries (trivial ones)
@@ -126,60 +200,50 @@ def simplify_acls(acls_data: List[Dict], users_data: List[Dict], groups_data: Li
         if not acl.get("trivial", True):
             simplified_acl["custom"] = True
         
+        permissions = simplified_acl["permissions"]
         for entry in acl.get("entries", []):
-            tag = entry.get("tag", "")
-            acl_id = entry.get("id", -1)
-            perms = entry.get("perms", {})
-            flags = entry.get("flags", {})
-            entry_type = entry.get("type", "ALLOW")
-            
-            # Skip inherited entries for cleaner output
-            if flags and flags.get("INHERITED", False):
-                continue
-            
-            # Skip entries with id: -1 unless they're meaningful
-            if acl_id == -1 and tag not in ["USER_OBJ", "GROUP_OBJ", "OTHER", "owner@", "group@", "everyone@"]:
+            perms = entry.get("perms") or EMPTY
+            flags = entry.get("flags") or EMPTY
+            if flags.get("INHERITED", False):
+                # Skip inherited entries for cleaner output
                 continue
             
-            simplified_entry = {
-                "who": simplify_tag(tag, acl_id, users_map, groups_map),
-                "access": simplify_permissions(perms)
-            }
+            # Keyed on only the fields simplify_entry() looks at, which is
+            # much cheaper than freezing full NFSv4 permission sets
+            key = (entry.get("tag"), entry.get("id"), entry.get("type"), bool(perms),
+                   perms.get("BASIC"), perms.get("READ"), perms.get("WRITE"), perms.get("EXECUTE"),
+                   flags.get("BASIC"), flags.get("FILE_INHERIT"), flags.get("DIRECTORY_INHERIT"))
+            try:
+                simplified_entry = entry_cache[key]
+            except KeyError:
+                simplified_entry = entry_cache[key] = simplify_entry(entry, users_map, groups_map)
+            except TypeError:
+                # Unhashable values; not worth caching
+                simplified_entry = simplify_entry(entry, users_map, groups_map)
             
-            # Add flags if meaningful
-            flag_str = simplify_flags(flags)
-            if flag_str:
-                simplified_entry["flags"] = flag_str
-            
-            # Add type if not ALLOW (which is default)
-            if entry_type != "ALLOW":
-                simplified_entry["type"] = entry_type.lower()
-            
-            simplified_acl["permissions"].append(simplified_entry)
+            # Each ACL gets its own copy of a cached entry, so that entries
+            # aren't shared between ACLs (or across the report)
+            if simplified_entry is not None:
+                permissions.append(dict(simplified_entry))
         
         # Only add if has meaningful permissions
         if simplified_acl["permissions"]:
-            simplified.append(simplified_acl)
-    
-    return simplified
+            yield simplified_acl
 
 
 def main():
     """Main function to process ACLs and simplify them."""
     if len(sys.argv) != 4:
-        print("Usage: simplify_acls.py <acls_json> <users_json> <groups_json>", file=sys.stderr)
+        print("Usage: simplify_acls.py <acls_json|file|-> <users_json|file|-> <groups_json|file|->", file=sys.stderr)
         sys.exit(1)
     
-    acls_json = sys.argv[1]
-    users_json = sys.argv[2]
-    groups_json = sys.argv[3]
+    acls_arg = sys.argv[1]
+    users_arg = sys.argv[2]
+    groups_arg = sys.argv[3]
     
     try:
-        acls_data = json.loads(acls_json)
-        users_data = json.loads(users_json)
-        groups_data = json.loads(groups_json)
-        simplified = simplify_acls(acls_data, users_data, groups_data)
-        print(json.dumps(simplified, indent=2))
+        # ACL records are read, simplified and written one at a time.
+        dump_json_array(iter_simplified_acls(iter_json(acls_arg), iter_json(users_arg), iter_json(groups_arg)))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
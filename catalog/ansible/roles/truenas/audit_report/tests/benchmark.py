@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Time the stage scripts on synthetic audit data.
+
+Usage: benchmark.py [--reference] [stage ...]
+
+With --reference, the stages are also timed in the versions they replaced
+(see synthetic.py), on the inputs small enough for them.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from build_dataset_tree import build_dataset_trees
+from simplify_acls import simplify_acls, simplify_frozen_flags, simplify_frozen_permissions
+from synthetic import (reference_dataset_tree, reference_simplify_acls, synthetic_accounts, synthetic_acls,
+                       synthetic_datasets)
+
+
+# Largest input the reference versions are timed on
+REFERENCE_LIMIT = 10000
+
+
+def timed(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def bench_build_dataset_tree(reference: bool) -> List[Tuple[int, float, Optional[float]]]:
+    """Time building the trees of two pools of 10k and 100k datasets."""
+    results = []
+    for count in (10000, 100000):
+        datasets = synthetic_datasets(count)
+        pools = ['tank', 'fast']
+        indexed = timed(lambda: build_dataset_trees(datasets, pools))
+        previous = None
+        if reference and count <= REFERENCE_LIMIT:
+            previous = timed(lambda: [reference_dataset_tree(datasets, pool) for pool in pools])
+        results.append((count, indexed, previous))
+    return results
+
+
+def bench_simplify_acls(reference: bool) -> List[Tuple[int, float, Optional[float]]]:
+    """Time simplifying the NFSv4 ACLs of 2k and 20k datasets, with 12
+    entries each, starting from empty caches."""
+    users, groups = synthetic_accounts()
+    results = []
+    for count in (2000, 20000):
+        acls = synthetic_acls(count)
+        simplify_frozen_permissions.cache_clear()
+        simplify_frozen_flags.cache_clear()
+        cached = timed(lambda: simplify_acls(acls, users, groups))
+        previous = None
+        if reference:
+            previous = timed(lambda: reference_simplify_acls(acls, users, groups))
+        results.append((count, cached, previous))
+    return results
+
+
+STAGES: Dict[str, Callable[[bool], List[Tuple[int, float, Optional[float]]]]] = {
+    'build_dataset_tree': bench_build_dataset_tree,
+    'simplify_acls': bench_simplify_acls,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the stage scripts on synthetic audit data.")
+    parser.add_argument('--reference', action='store_true', help="also time the versions the stages replaced")
+    parser.add_argument('stages', nargs='*', help=f"stages to time: {', '.join(STAGES)} (default: all)")
+    args = parser.parse_args()
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage: {', '.join(unknown)}")
+
+    for stage in args.stages or STAGES:
+        for count, current, previous in STAGES[stage](args.reference):
+            line = f"{stage:<20} {count:>7}  {current:8.3f}s"
+            if previous is not None:
+                line += f"  (reference: {previous:.3f}s)"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
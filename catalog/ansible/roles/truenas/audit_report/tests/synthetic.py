@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Synthetic audit data for the checks and benchmarks of the stage scripts,
+and reference versions of the stages they replaced.
+"""
+import os
+import random
+import sys
+from typing import Any, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from build_dataset_tree import dataset_properties
+from simplify_acls import build_groups_map, build_users_map, simplify_flags, simplify_permissions, simplify_tag
+
+
+def synthetic_datasets(count: int, pools: Sequence[str] = ('tank', 'fast'), seed: int = 1) -> List[Dict]:
+    """Return 'count' datasets (plus the root dataset of each pool) as
+    pool.dataset.query does, nested up to 12 levels deep.
+
+    About 2% of the datasets are left out, so that some of the others have
+    missing intermediate datasets.
+    """
+    rng = random.Random(seed)
+    datasets = [{'id': pool, 'name': pool, 'pool': pool, 'type': 'FILESYSTEM', 'mountpoint': f'/mnt/{pool}',
+                 'compression': {'value': 'LZ4'}} for pool in pools]
+    names = {pool: [pool] for pool in pools}
+    for i in range(count):
+        pool = rng.choice(pools)
+        name = f"{rng.choice(names[pool][-200:])}/d{i}"
+        if name.count('/') > 12:
+            name = f"{pool}/d{i}"
+        names[pool].append(name)
+        if rng.random() < 0.02:
+            continue
+        datasets.append({
+            'id': name,
+            'name': name,
+            'pool': pool,
+            'type': 'FILESYSTEM',
+            'mountpoint': f'/mnt/{name}',
+            'quota': {'parsed': str(rng.randint(0, 10**12))},
+            'properties': {'recordsize': {'value': rng.choice(['128K', '1M'])}},
+        })
+    datasets.sort(key=lambda d: d['name'].count('/'))
+    return datasets
+
+
+def reference_dataset_tree(datasets: List[Dict], pool_name: str) -> Dict[str, Any]:
+    """Build the tree of a pool as build_dataset_tree.py did before it
+    indexed the datasets: intermediate datasets are searched for in the
+    whole list. Quadratic, so only for small inputs.
+    
+    Like the original, it only finds the right intermediate datasets when
+    parents come before their children, as in pool.dataset.query.
+    """
+
+    def add_dataset_to_tree(tree: Dict, dataset: Dict, path_parts: List[str]) -> None:
+        current_name, remaining_parts = path_parts[0], path_parts[1:]
+        if current_name not in tree:
+            dataset_info = dataset
+            if remaining_parts:
+                intermediate_path = pool_name + '/' + '/'.join(path_parts[:len(path_parts) - len(remaining_parts)])
+                dataset_info = next((d for d in datasets if d['name'] == intermediate_path), None)
+            if dataset_info:
+                tree[current_name] = dataset_properties(dataset_info)
+            else:
+                tree[current_name] = {'type': 'filesystem', 'datasets': {}}
+        if remaining_parts:
+            add_dataset_to_tree(tree[current_name]['datasets'], dataset, remaining_parts)
+
+    pool_datasets = [d for d in datasets if d.get('pool') == pool_name]
+    root_dataset = next((d for d in pool_datasets if d['name'] == pool_name), None)
+    tree = dataset_properties(root_dataset, f'/mnt/{pool_name}') if root_dataset else {}
+    for dataset in pool_datasets:
+        if dataset['name'].startswith(pool_name + '/'):
+            path_parts = dataset['name'][len(pool_name) + 1:].split('/')
+            # Without a root dataset, the tree starts from the first level
+            add_dataset_to_tree(tree['datasets'] if root_dataset else tree, dataset, path_parts)
+    return tree
+
+
+# Permission and flag sets of the synthetic ACL entries, in both the BASIC
+# and the individual NFSv4 forms
+ACL_PERMS = [
+    {'BASIC': 'FULL_CONTROL'},
+    {'BASIC': 'MODIFY'},
+    {'BASIC': 'READ'},
+    {'READ_DATA': True, 'WRITE_DATA': True, 'EXECUTE': False, 'READ_ACL': True},
+    {'READ': True, 'WRITE': False, 'EXECUTE': True},
+    {},
+]
+ACL_FLAGS = [
+    {'BASIC': 'INHERIT'},
+    {'BASIC': 'NOINHERIT'},
+    {'FILE_INHERIT': True, 'DIRECTORY_INHERIT': True, 'INHERITED': False},
+    {'FILE_INHERIT': True, 'DIRECTORY_INHERIT': True, 'INHERITED': True},
+    {},
+]
+
+
+def synthetic_accounts(count: int = 200) -> Tuple[List[Dict], List[Dict]]:
+    """Return 'count' users and groups as user.query and group.query do."""
+    users = [{'uid': 1000 + i, 'username': f'u{i}'} for i in range(count)]
+    groups = [{'gid': 1000 + i, 'group': f'g{i}'} for i in range(count)]
+    return users, groups
+
+
+def synthetic_acls(count: int, entries: int = 12, seed: int = 1) -> List[Dict]:
+    """Return the NFSv4 ACLs of 'count' datasets, with 'entries' entries
+    each drawn from a few permission and flag sets, as on a real pool.
+
+    Some entries name IDs that are not in synthetic_accounts(), and some are
+    inherited or have no ID, so that they are left out.
+    """
+    rng = random.Random(seed)
+
+    def entry() -> Dict:
+        tag = rng.choice(['owner@', 'group@', 'everyone@', 'USER', 'GROUP'])
+        return {
+            'tag': tag,
+            'id': rng.choice([1000, 1001, 1002, 5000, -1]) if tag in ('USER', 'GROUP') else -1,
+            'perms': dict(rng.choice(ACL_PERMS)),
+            'flags': dict(rng.choice(ACL_FLAGS)),
+            'type': rng.choice(['ALLOW'] * 5 + ['DENY']),
+        }
+
+    return [{'dataset': f'tank/d{i}', 'mountpoint': f'/mnt/tank/d{i}', 'acltype': 'NFS4',
+             'trivial': rng.random() < 0.1, 'entries': [entry() for _ in range(entries)]}
+            for i in range(count)]
+
+
+def reference_simplify_acls(acls_data: List[Dict], users_data: List[Dict], groups_data: List[Dict]) -> List[Dict]:
+    """Simplify ACLs as simplify_acls.py did before it cached simplified
+    entries, permissions and flags: every entry is simplified on its own.
+    """
+    users_map = build_users_map(users_data)
+    groups_map = build_groups_map(groups_data)
+    simplified_acls = []
+    for acl in acls_data:
+        if not acl.get('entries'):
+            continue
+        simplified_acl = {
+            'dataset': acl.get('dataset', ''),
+            'mountpoint': acl.get('mountpoint', ''),
+            'type': acl.get('acltype', 'posix').lower(),
+            'permissions': []
+        }
+        if not acl.get('trivial', True):
+            simplified_acl['custom'] = True
+        for entry in acl.get('entries', []):
+            tag = entry.get('tag', '')
+            acl_id = entry.get('id', -1)
+            perms = entry.get('perms', {})
+            flags = entry.get('flags', {})
+            entry_type = entry.get('type', 'ALLOW')
+            if flags and flags.get('INHERITED', False):
+                continue
+            if acl_id == -1 and tag not in ['USER_OBJ', 'GROUP_OBJ', 'OTHER', 'owner@', 'group@', 'everyone@']:
+                continue
+            simplified_entry = {
+                'who': simplify_tag(tag, acl_id, users_map, groups_map),
+                'access': simplify_permissions(perms)
+            }
+            flag_str = simplify_flags(flags)
+            if flag_str:
+                simplified_entry['flags'] = flag_str
+            if entry_type != 'ALLOW':
+                simplified_entry['type'] = entry_type.lower()
+            simplified_acl['permissions'].append(simplified_entry)
+        if simplified_acl['permissions']:
+            simplified_acls.append(simplified_acl)
+    return simplified_acls
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Checks for audit_io.py.
+
+Run from the role directory with:
+
+  python3 -m unittest discover -s tests
+"""
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from audit_io import iter_json_array
+
+
+DOCUMENTS = [
+    '[]',
+    ' [ ] ',
+    '[12.5]',
+    '[1e10, -3, 0.25E-2, 7]',
+    '[true, false, null, -0.5]',
+    '["a,b]", {"a": [1.5, "]"]}, [[], {}]]',
+    '[\n  {"name": "tank/media", "quota": 1099511627776}\n, 42\n]\n',
+]
+
+
+class CountingDecoder(json.JSONDecoder):
+    calls = 0
+
+    def raw_decode(self, s, idx=0):
+        CountingDecoder.calls += 1
+        return super().raw_decode(s, idx)
+
+
+class IterJsonArrayTest(unittest.TestCase):
+
+    def test_chunk_boundaries(self):
+        for doc in DOCUMENTS:
+            for chunk_size in range(1, len(doc) + 2):
+                with self.subTest(doc=doc, chunk_size=chunk_size):
+                    self.assertEqual(list(iter_json_array(io.StringIO(doc), chunk_size=chunk_size)),
+                                     json.loads(doc))
+
+    def test_invalid_documents(self):
+        for doc in ('{}', '[12.]', '[1 2]', '[1,]', '[1'):
+            for chunk_size in (1, 2, 64):
+                with self.subTest(doc=doc, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        list(iter_json_array(io.StringIO(doc), chunk_size=chunk_size))
+
+    def test_large_element(self):
+        # One element of about 4 MB, like the root dataset of an unfiltered
+        # pool.dataset.query holding every child dataset
+        element = {'datasets': [{'name': f'tank/{i}', 'comments': 'x' * 40} for i in range(60000)]}
+        doc = json.dumps([element, 1])
+        CountingDecoder.calls = 0
+        with mock.patch('json.JSONDecoder', CountingDecoder):
+            self.assertEqual(list(iter_json_array(io.StringIO(doc), chunk_size=4096)), [element, 1])
+        # The buffer at least doubles between attempts, rather than growing
+        # by one chunk (about a thousand attempts)
+        self.assertLess(CountingDecoder.calls, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Checks for audit_state.py.
+
+Run from the role directory with:
+
+  python3 -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from audit_state import compute_delta, flatten_datasets
+from build_dataset_tree import build_dataset_trees
+
+
+def dataset(name: str, compression: str = 'LZ4') -> dict:
+    return {'name': name, 'pool': name.split('/', 1)[0], 'type': 'FILESYSTEM', 'mountpoint': f'/mnt/{name}',
+            'compression': {'value': compression}}
+
+
+class FlattenDatasetsTest(unittest.TestCase):
+
+    def test_pool_with_root_dataset(self):
+        trees = build_dataset_trees([dataset('tank'), dataset('tank/media'), dataset('tank/media/movies')], ['tank'])
+        trees['tank']['datasets']['media']['acl'] = 'media-acl'
+        properties, acls = flatten_datasets(trees)
+        self.assertEqual(list(properties), ['tank', 'tank/media', 'tank/media/movies'])
+        self.assertEqual(properties['tank/media'], {'type': 'FILESYSTEM', 'mountpoint': '/mnt/tank/media',
+                                                    'compression': 'LZ4'})
+        self.assertEqual(acls, {'tank/media': 'media-acl'})
+
+    def test_pool_without_root_dataset(self):
+        trees = build_dataset_trees([dataset('tank/media'), dataset('tank/media/movies'), dataset('tank/apps')],
+                                    ['tank'])
+        trees['tank']['apps']['acl'] = 'apps-acl'
+        properties, acls = flatten_datasets(trees)
+        self.assertEqual(list(properties), ['tank/media', 'tank/media/movies', 'tank/apps'])
+        self.assertEqual(properties['tank/apps'], {'type': 'FILESYSTEM', 'mountpoint': '/mnt/tank/apps',
+                                                   'compression': 'LZ4'})
+        self.assertEqual(acls, {'tank/apps': 'apps-acl'})
+
+    def test_delta_of_pool_without_root_dataset(self):
+        previous = {'datasets': build_dataset_trees([dataset('tank/media'), dataset('tank/apps')], ['tank'])}
+        current = {'datasets': build_dataset_trees([dataset('tank/media', 'ZSTD'), dataset('tank/backup')],
+                                                   ['tank'])}
+        delta = compute_delta(previous, {}, current)
+        self.assertTrue(delta['changed'])
+        self.assertEqual(delta['datasets'], {
+            'added': ['tank/backup'],
+            'removed': ['tank/apps'],
+            'changed': {'tank/media': {'compression': {'old': 'LZ4', 'new': 'ZSTD'}}},
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Checks for build_dataset_tree.py.
+
+Run from the role directory with:
+
+  python3 -m unittest discover -s tests
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from build_dataset_tree import build_dataset_tree, build_dataset_trees
+from synthetic import reference_dataset_tree, synthetic_datasets
+
+
+class BuildDatasetTreesTest(unittest.TestCase):
+
+    def assertSameTree(self, tree, expected):
+        # Compare the JSON, so that the order of children counts too
+        self.assertEqual(json.dumps(tree), json.dumps(expected))
+
+    def test_same_as_reference(self):
+        datasets = synthetic_datasets(3000)
+        trees = build_dataset_trees(datasets, ['tank', 'fast'])
+        for pool in ('tank', 'fast'):
+            with self.subTest(pool=pool):
+                self.assertSameTree(trees[pool], reference_dataset_tree(datasets, pool))
+
+    def test_pool_without_root_dataset(self):
+        datasets = [d for d in synthetic_datasets(500) if d['name'] != 'tank']
+        trees = build_dataset_trees(datasets, ['tank', 'fast'])
+        self.assertNotIn('datasets', trees['tank'])
+        self.assertSameTree(trees['tank'], reference_dataset_tree(datasets, 'tank'))
+        self.assertSameTree(trees['fast'], reference_dataset_tree(datasets, 'fast'))
+
+    def test_missing_intermediate_datasets(self):
+        datasets = [
+            {'name': 'tank', 'pool': 'tank', 'type': 'FILESYSTEM', 'mountpoint': '/mnt/tank'},
+            {'name': 'tank/a/b/c', 'pool': 'tank', 'type': 'FILESYSTEM', 'mountpoint': '/mnt/tank/a/b/c'},
+        ]
+        tree = build_dataset_tree(datasets, 'tank')
+        self.assertEqual(tree['datasets']['a'], {
+            'type': 'filesystem',
+            'datasets': {'b': {'type': 'filesystem', 'datasets': {
+                'c': {'type': 'FILESYSTEM', 'mountpoint': '/mnt/tank/a/b/c', 'datasets': {}},
+            }}},
+        })
+        self.assertSameTree(tree, reference_dataset_tree(datasets, 'tank'))
+
+    def test_children_before_parents(self):
+        datasets = synthetic_datasets(500)
+        trees = build_dataset_trees(list(reversed(datasets)), ['tank', 'fast'])
+        # The same datasets, with children in the opposite order
+        for pool in ('tank', 'fast'):
+            self.assertEqual(trees[pool], build_dataset_trees(datasets, [pool])[pool])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Checks for columnar_export.py.
+
+Run from the role directory with:
+
+  python3 -m unittest discover -s tests
+"""
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from build_dataset_tree import build_dataset_trees
+from columnar_export import DATASET_COLUMNS, dataset_rows, write_table
+
+
+def dataset(name: str) -> dict:
+    return {'name': name, 'pool': name.split('/', 1)[0], 'type': 'FILESYSTEM', 'mountpoint': f'/mnt/{name}'}
+
+
+class DatasetRowsTest(unittest.TestCase):
+
+    def test_pool_with_root_dataset(self):
+        trees = build_dataset_trees([dataset('tank'), dataset('tank/media'), dataset('tank/media/movies')], ['tank'])
+        rows = [(row['dataset'], row['parent'], row['depth'], row['children']) for row in dataset_rows(trees)]
+        self.assertEqual(rows, [
+            ('tank', None, 0, 1),
+            ('tank/media', 'tank', 1, 1),
+            ('tank/media/movies', 'tank/media', 2, 0),
+        ])
+
+    def test_pool_without_root_dataset(self):
+        trees = build_dataset_trees([dataset('tank/media'), dataset('tank/media/movies'), dataset('tank/apps')],
+                                    ['tank'])
+        rows = [(row['dataset'], row['pool'], row['parent'], row['depth'], row['children'])
+                for row in dataset_rows(trees)]
+        self.assertEqual(rows, [
+            ('tank/media', 'tank', 'tank', 1, 1),
+            ('tank/media/movies', 'tank', 'tank/media', 2, 0),
+            ('tank/apps', 'tank', 'tank', 1, 0),
+        ])
+
+    def test_export_pool_without_root_dataset(self):
+        trees = build_dataset_trees([dataset('tank/media'), dataset('tank/apps')], ['tank'])
+        out = io.StringIO()
+        count = write_table(dataset_rows(trees), DATASET_COLUMNS, {'hostname': 'nas', 'timestamp': 't'}, out)
+        self.assertEqual(count, 2)
+        names = [json.loads(line)['dataset'] for line in out.getvalue().splitlines()]
+        self.assertEqual(names, ['tank/media', 'tank/apps'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Checks for simplify_acls.py.
+
+Run from the role directory with:
+
+  python3 -m unittest discover -s tests
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))
+
+from simplify_acls import simplify_acls, simplify_frozen_flags, simplify_frozen_permissions
+from synthetic import reference_simplify_acls, synthetic_accounts, synthetic_acls
+
+
+class SimplifyAclsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.users, self.groups = synthetic_accounts()
+
+    def assertSameAcls(self, acls, expected):
+        # Compare the JSON, so that the order of keys counts too
+        self.assertEqual(json.dumps(acls), json.dumps(expected))
+
+    def test_same_as_reference(self):
+        acls = synthetic_acls(2000)
+        self.assertSameAcls(simplify_acls(acls, self.users, self.groups),
+                            reference_simplify_acls(acls, self.users, self.groups))
+
+    def test_same_with_warm_and_cold_caches(self):
+        acls = synthetic_acls(500)
+        simplify_frozen_permissions.cache_clear()
+        simplify_frozen_flags.cache_clear()
+        cold = simplify_acls(acls, self.users, self.groups)
+        warm = simplify_acls(acls, self.users, self.groups)
+        self.assertSameAcls(warm, cold)
+        self.assertGreater(simplify_frozen_permissions.cache_info().hits, 0)
+
+    def test_unhashable_values(self):
+        acls = synthetic_acls(50, seed=2)
+        for acl in acls[::5]:
+            acl['entries'][0]['perms']['EXTRA'] = ['READ_ACL']
+            acl['entries'][1]['flags']['EXTRA'] = {'INHERIT_ONLY': True}
+        self.assertSameAcls(simplify_acls(acls, self.users, self.groups),
+                            reference_simplify_acls(acls, self.users, self.groups))
+
+    def test_entries_are_not_shared(self):
+        acls = synthetic_acls(200)
+        simplified = simplify_acls(acls, self.users, self.groups)
+        entries = [entry for acl in simplified for entry in acl['permissions']]
+        self.assertEqual(len({id(entry) for entry in entries}), len(entries))
+
+        # Changing an entry of one ACL leaves the equal entries of the others alone
+        first = entries[0]
+        equal = [entry for entry in entries[1:] if entry == first]
+        self.assertTrue(equal)
+        first['access'] = 'changed'
+        self.assertTrue(all(entry['access'] != 'changed' for entry in equal))
+
+
+if __name__ == '__main__':
+    unittest.main()